@@ -1,4 +1,11 @@
 import os
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
 from datetime import datetime
 from pathlib import Path
 from threading import Lock
@@ -6,9 +13,21 @@ from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, Alignment
 from openpyxl.utils import get_column_letter
 
-LOCK = Lock()
+from engines.constants import (
+    ANALYTICS_DB,
+    ANALYTICS_FLUSH_S,
+    ANALYTICS_EXPORT_INTERVAL_S,
+    ANALYTICS_EXPORT_BATCH,
+)
 
-from pathlib import Path
+# Eventos (uso e feedback) vão para um banco local só de acréscimos
+# (ANALYTICS_DB), gravados em lote por uma thread de fundo: a requisição só
+# enfileira a linha. As planilhas no compartilhamento de rede viram uma
+# exportação periódica (start_exporter, no servidor web), que acrescenta de
+# uma vez todas as linhas ainda não exportadas. Dashboard e métricas leem o
+# banco local, nunca o compartilhamento.
+
+LOCK = Lock()
 
 # Onde o drive 'dtic' foi montado no Linux
 # MOUNT_POINT = Path("/mnt/z")
@@ -103,7 +122,8 @@ def _looks_like_ip(value):
     return True
 
 
-def _append_xlsx(path: str, values: list):
+def _append_xlsx(path: str, rows: list):
+    """Acrescenta várias linhas à planilha com um único load/save."""
     _ensure_parent_dir(path)
 
     with LOCK:
@@ -112,19 +132,378 @@ def _append_xlsx(path: str, values: list):
             ws = wb.active
             ws.title = "Dados"
             _setup_sheet(ws)
+        else:
+            wb = load_workbook(path)
+            ws = wb.active
+
+            if ws.max_row < 1 or (ws.max_row == 1 and ws["A1"].value != "Data"):
+                ws.delete_rows(1, ws.max_row)
+                _setup_sheet(ws)
+
+        for values in rows:
             ws.append(values)
-            wb.save(path)
+        wb.save(path)
+
+
+# =========================
+# BANCO LOCAL DE EVENTOS
+# =========================
+KIND_USO = "uso"
+KIND_FEEDBACK = "feedback"
+
+# Planilha de exportação de cada tipo de evento
+_XLSX_BY_KIND = {KIND_USO: USO_XLSX, KIND_FEEDBACK: FEEDBACK_XLSX}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind     TEXT NOT NULL,
+    row      TEXT NOT NULL,
+    exported INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_events_kind ON events (kind, id);
+CREATE INDEX IF NOT EXISTS idx_events_pending ON events (kind, id) WHERE exported = 0;
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    bucket TEXT NOT NULL,
+    key    TEXT NOT NULL,
+    count  INTEGER NOT NULL DEFAULT 0,
+    total  REAL NOT NULL DEFAULT 0,
+    min    REAL,
+    max    REAL,
+    PRIMARY KEY (bucket, key)
+) WITHOUT ROWID;
+"""
+
+# Agregados mantidos a cada gravação (tabela aggregates), na mesma transação
+# dos eventos: contador, soma, mínimo e máximo por métrica, no total geral
+# (bucket "") e por dia (bucket "AAAA-MM-DD"). O /admin lê só essas linhas e
+# a cauda pelo índice (kind, id): custo constante, qualquer que seja o histórico.
+_AGGREGATES_VERSION = "1"
+
+# Ação (normalizada) → contador
+_ACTION_COUNTERS = {
+    "upload": "uploads",
+    "download": "downloads",
+    "início": "inicios",
+    "inicio": "inicios",
+    "concluído": "concluidos",
+    "concluido": "concluidos",
+    "erro": "erros",
+    "cancelado": "cancelados",
+}
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+_pending: queue.Queue = queue.Queue()
+_writer: threading.Thread | None = None
+_writer_lock = threading.Lock()
+
+
+def _conn() -> sqlite3.Connection:
+    """Conexão da thread atual (sqlite3 não compartilha conexões entre threads)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(ANALYTICS_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
+
+def _norm(value) -> str:
+    return str(value or "").strip().lower()
+
+
+def _day_bucket(value) -> str | None:
+    """Coluna Data ("dd/mm/aaaa", datetime ou "aaaa-mm-dd ...") → "aaaa-mm-dd"."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    text = str(value or "").strip()
+    for fmt, size in (("%d/%m/%Y", 10), ("%Y-%m-%d", 10)):
+        try:
+            return datetime.strptime(text[:size], fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def _stars(row: dict):
+    stars_val = _parse_int(row.get("Estrelas"))
+    if not stars_val or stars_val not in range(1, 6):
+        stars_val = _parse_int(row.get("Tempo")) or 0
+    return stars_val
+
+
+def _samples(kind: str, row: dict) -> list:
+    """Contribuições de um evento para os agregados: [(métrica, valor | None)]."""
+    if kind == KIND_FEEDBACK:
+        out = [("feedback", None)]
+        stars_val = _stars(row)
+        if stars_val:
+            out.append(("stars", stars_val))
+            if stars_val >= 4:
+                out.append(("aprovacoes", None))
+        return out
+
+    acao = _norm(row.get("Ação"))
+    out = []
+    counter = _ACTION_COUNTERS.get(acao)
+    if counter:
+        out.append((counter, None))
+
+    observacao = row.get("Observação") or ""
+    if not observacao:
+        ip_col = row.get("IP")
+        if isinstance(ip_col, str) and "=" in ip_col:
+            observacao = ip_col
+    kv = _parse_kv(str(observacao))
+
+    if acao == "upload":
+        in_mb = _parse_float(kv.get("in_mb"))
+        if in_mb is None:
+            in_mb = _parse_float(kv.get("tamanho_mb"))
+        if in_mb:
+            out.append(("upload_mb", in_mb))
+
+    if counter == "concluidos":
+        in_mb = _parse_float(kv.get("in_mb"))
+        out_mb = _parse_float(kv.get("out_mb"))
+        if in_mb:
+            out.append(("input_mb", in_mb))
+        if out_mb:
+            out.append(("output_mb", out_mb))
+
+        tempo_val = _parse_float(row.get("Tempo"))
+        if tempo_val is None:
+            tempo_val = _parse_float(kv.get("secs"))
+        if tempo_val:
+            out.append(("time_sec", tempo_val))
+    return out
+
+
+def _accumulate(conn: sqlite3.Connection, items) -> None:
+    """Soma [(kind, values), ...] aos agregados (dentro da transação de quem chama)."""
+    acc = {}
+    for kind, values in items:
+        row = dict(zip(HEADERS, values))
+        buckets = ["", _day_bucket(row.get("Data"))]
+        for metric, value in _samples(kind, row):
+            for bucket in buckets:
+                if bucket is None:
+                    continue
+                entry = acc.setdefault((bucket, metric), [0, 0.0, None, None])
+                entry[0] += 1
+                if value is not None:
+                    entry[1] += value
+                    entry[2] = value if entry[2] is None else min(entry[2], value)
+                    entry[3] = value if entry[3] is None else max(entry[3], value)
+    if not acc:
+        return
+    conn.executemany(
+        """
+        INSERT INTO aggregates (bucket, key, count, total, min, max)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (bucket, key) DO UPDATE SET
+            count = count + excluded.count,
+            total = total + excluded.total,
+            min = CASE WHEN min IS NULL OR excluded.min < min THEN excluded.min ELSE min END,
+            max = CASE WHEN max IS NULL OR excluded.max > max THEN excluded.max ELSE max END
+        """,
+        [(bucket, metric, *entry) for (bucket, metric), entry in acc.items()],
+    )
+
+
+def _rebuild_aggregates(conn: sqlite3.Connection) -> None:
+    """Recalcula os agregados a partir de todos os eventos (banco anterior a eles)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        done = conn.execute(
+            "SELECT value FROM meta WHERE key = 'aggregates'"
+        ).fetchone()
+        if done and done[0] == _AGGREGATES_VERSION:
+            conn.execute("ROLLBACK")
             return
+        conn.execute("DELETE FROM aggregates")
+        cur = conn.execute("SELECT kind, row FROM events ORDER BY id")
+        while True:
+            chunk = cur.fetchmany(5000)
+            if not chunk:
+                break
+            _accumulate(conn, [(kind, json.loads(row)) for kind, row in chunk])
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('aggregates', ?)",
+            (_AGGREGATES_VERSION,),
+        )
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
 
-        wb = load_workbook(path)
-        ws = wb.active
 
-        if ws.max_row < 1 or (ws.max_row == 1 and ws["A1"].value != "Data"):
-            ws.delete_rows(1, ws.max_row)
-            _setup_sheet(ws)
+def init_db() -> None:
+    """Cria as tabelas (idempotente)."""
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _conn()
+        conn.executescript(_SCHEMA)
+        done = conn.execute("SELECT value FROM meta WHERE key = 'aggregates'").fetchone()
+        if not done or done[0] != _AGGREGATES_VERSION:
+            _rebuild_aggregates(conn)
+        _initialized = True
+
+
+def _insert_rows(items: list) -> None:
+    """Grava [(kind, values), ...] e os agregados numa única transação."""
+    init_db()
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO events (kind, row) VALUES (?, ?)",
+            [(kind, json.dumps(values, ensure_ascii=False, default=str)) for kind, values in items],
+        )
+        _accumulate(conn, items)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
 
-        ws.append(values)
-        wb.save(path)
+
+def flush() -> None:
+    """Grava agora os eventos ainda na fila (chamado também na saída do processo)."""
+    items = []
+    try:
+        while True:
+            items.append(_pending.get_nowait())
+    except queue.Empty:
+        pass
+    if items:
+        try:
+            _insert_rows(items)
+        except Exception as e:
+            logging.warning(f"[analytics] Falha ao gravar {len(items)} evento(s): {e}")
+
+
+def _writer_loop() -> None:
+    # Eventos de uma janela de ANALYTICS_FLUSH_S vão numa única transação
+    while True:
+        time.sleep(ANALYTICS_FLUSH_S)
+        flush()
+
+
+def _record(kind: str, values: list) -> None:
+    """Enfileira o evento para a thread de gravação (criada no primeiro uso)."""
+    global _writer
+    _pending.put((kind, values))
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(
+                    target=_writer_loop, name="analytics-writer", daemon=True
+                )
+                _writer.start()
+                atexit.register(flush)
+
+
+# =========================
+# EXPORTAÇÃO PARA XLSX
+# =========================
+def _import_legacy_xlsx(kind: str) -> None:
+    """
+    Migração única: copia para o banco as linhas que já estavam na planilha
+    (marcadas como exportadas). Só conclui com o compartilhamento acessível.
+    """
+    init_db()
+    conn = _conn()
+    key = f"imported_{kind}"
+    if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+        return
+
+    path = _XLSX_BY_KIND[kind]
+    if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+        return  # compartilhamento fora do ar: tenta de novo na próxima rodada
+
+    rows = _read_all_xlsx(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            conn.execute("ROLLBACK")
+            return
+        values = [[r.get(h, "") for h in HEADERS] for r in rows]
+        conn.executemany(
+            "INSERT INTO events (kind, row, exported) VALUES (?, ?, 1)",
+            [(kind, json.dumps(v, ensure_ascii=False, default=str)) for v in values],
+        )
+        _accumulate(conn, [(kind, v) for v in values])
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(len(rows))))
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    if rows:
+        logging.info(f"[analytics] {len(rows)} linha(s) importada(s) de {path}")
+
+
+def export_xlsx(kind: str) -> int:
+    """
+    Acrescenta à planilha os eventos ainda não exportados (até
+    ANALYTICS_EXPORT_BATCH por chamada). Devolve quantas linhas exportou.
+    Se o compartilhamento falhar, nada é marcado e a próxima rodada tenta de novo.
+    """
+    init_db()
+    conn = _conn()
+    pending = conn.execute(
+        "SELECT id, row FROM events WHERE kind = ? AND exported = 0 ORDER BY id LIMIT ?",
+        (kind, ANALYTICS_EXPORT_BATCH),
+    ).fetchall()
+    if not pending:
+        return 0
+
+    _append_xlsx(_XLSX_BY_KIND[kind], [json.loads(row) for _, row in pending])
+    conn.execute(
+        "UPDATE events SET exported = 1 WHERE kind = ? AND exported = 0 AND id <= ?",
+        (kind, pending[-1][0]),
+    )
+    return len(pending)
+
+
+def _exporter_loop() -> None:
+    while True:
+        for kind in _XLSX_BY_KIND:
+            try:
+                _import_legacy_xlsx(kind)
+                while export_xlsx(kind) >= ANALYTICS_EXPORT_BATCH:
+                    pass
+            except Exception as e:
+                logging.warning(f"[analytics] Exportação de {kind} falhou: {e}")
+        time.sleep(ANALYTICS_EXPORT_INTERVAL_S)
+
+
+def start_exporter() -> threading.Thread:
+    """
+    Inicia a exportação periódica para as planilhas. Deve rodar em um único
+    processo (o servidor web); os workers só gravam eventos no banco.
+
+    A migração das planilhas existentes roda aqui, antes dos primeiros
+    eventos, para o histórico antigo ficar à frente deles no banco.
+    """
+    for kind in _XLSX_BY_KIND:
+        try:
+            _import_legacy_xlsx(kind)
+        except Exception as e:
+            logging.warning(f"[analytics] Importação de {kind} falhou: {e}")
+
+    thread = threading.Thread(target=_exporter_loop, name="analytics-export", daemon=True)
+    thread.start()
+    return thread
 
 
 # =========================
@@ -153,7 +532,7 @@ def log_uso(
         ip or "",
         (observacao or "").strip(),
     ]
-    _append_xlsx(USO_XLSX, values)
+    _record(KIND_USO, values)
 
 
 # =========================
@@ -187,7 +566,7 @@ def log_feedback(
         ip or "",
         (observacao or "").strip(),
     ]
-    _append_xlsx(FEEDBACK_XLSX, values)
+    _record(KIND_FEEDBACK, values)
 
 
 def _read_all_xlsx(path: str):
@@ -213,14 +592,20 @@ def _read_all_xlsx(path: str):
     return out
 
 
+def _read_tail(kind: str, limit: int):
+    init_db()
+    cur = _conn().execute(
+        "SELECT row FROM events WHERE kind = ? ORDER BY id DESC LIMIT ?", (kind, limit)
+    )
+    return [dict(zip(HEADERS, json.loads(row))) for (row,) in cur][::-1]
+
+
 def read_tail_uso(limit: int = 200):
-    rows = _read_all_xlsx(USO_XLSX)
-    return _normalize_uso_rows(rows[-limit:])
+    return _normalize_uso_rows(_read_tail(KIND_USO, limit))
 
 
 def read_tail_feedback(limit: int = 200):
-    rows = _read_all_xlsx(FEEDBACK_XLSX)
-    return _normalize_feedback_rows(rows[-limit:])
+    return _normalize_feedback_rows(_read_tail(KIND_FEEDBACK, limit))
 
 
 def _normalize_uso_rows(rows):
@@ -306,81 +691,88 @@ def _normalize_feedback_rows(rows):
     return out
 
 
-def compute_metrics():
-    uso = _read_all_xlsx(USO_XLSX)
-    feedback = _read_all_xlsx(FEEDBACK_XLSX)
+def _read_aggregates(bucket: str = ""):
+    init_db()
+    cur = _conn().execute(
+        "SELECT key, count, total, min, max FROM aggregates WHERE bucket = ?", (bucket,)
+    )
+    return {key: (count, total, vmin, vmax) for key, count, total, vmin, vmax in cur}
 
-    def norm(x):
-        return (x or "").strip().lower()
 
-    uploads = sum(1 for r in uso if norm(r.get("Ação")) == "upload")
-    downloads = sum(1 for r in uso if norm(r.get("Ação")) == "download")
-    inicios = sum(1 for r in uso if norm(r.get("Ação")) in ["início", "inicio"])
-    concluidos = sum(1 for r in uso if norm(r.get("Ação")) in ["concluído", "concluido"])
-    erros = sum(1 for r in uso if norm(r.get("Ação")) == "erro")
-    cancelados = sum(1 for r in uso if norm(r.get("Ação")) == "cancelado")
+def _daily_metrics(days: int):
+    """Rollup por dia dos `days` dias mais recentes com eventos (mais recente primeiro)."""
+    init_db()
+    cur = _conn().execute(
+        """
+        SELECT bucket, key, count, total, max FROM aggregates
+        WHERE bucket IN (
+            SELECT DISTINCT bucket FROM aggregates
+            WHERE bucket != '' ORDER BY bucket DESC LIMIT ?
+        )
+        """,
+        (days,),
+    )
+    by_day = {}
+    for bucket, key, count, total, vmax in cur:
+        by_day.setdefault(bucket, {})[key] = (count, total, vmax)
 
-    estrelas_list = []
-    for r in feedback:
-        stars_val = _parse_int(r.get("Estrelas"))
-        if not stars_val or stars_val not in range(1, 6):
-            stars_val = _parse_int(r.get("Tempo")) or 0
-        if stars_val:
-            estrelas_list.append(stars_val)
+    out = []
+    for bucket in sorted(by_day, reverse=True):
+        agg = by_day[bucket]
+        times = agg.get("time_sec", (0, 0.0, None))
+        out.append(
+            {
+                "day": datetime.strptime(bucket, "%Y-%m-%d").strftime("%d/%m/%Y"),
+                "uploads": agg.get("uploads", (0,))[0],
+                "concluidos": agg.get("concluidos", (0,))[0],
+                "erros": agg.get("erros", (0,))[0],
+                "cancelados": agg.get("cancelados", (0,))[0],
+                "input_mb": round(agg.get("input_mb", (0, 0.0))[1], 2),
+                "output_mb": round(agg.get("output_mb", (0, 0.0))[1], 2),
+                "avg_time_sec": round(times[1] / times[0], 2) if times[0] else 0.0,
+            }
+        )
+    return out
 
-    media = round(sum(estrelas_list) / len(estrelas_list), 2) if estrelas_list else 0.0
-    aprovacoes = sum(1 for s in estrelas_list if s >= 4)
-    taxa_aprov = round((aprovacoes / len(estrelas_list)) * 100, 1) if estrelas_list else 0.0
 
-    upload_sizes = []
-    input_sizes = []
-    output_sizes = []
-    times = []
+def compute_metrics(days: int = 14):
+    agg = _read_aggregates()
 
-    for r in uso:
-        acao = norm(r.get("Ação"))
-        observacao = r.get("Observação") or ""
-        if not observacao:
-            ip_col = r.get("IP")
-            if isinstance(ip_col, str) and "=" in ip_col:
-                observacao = ip_col
+    def count(key):
+        return agg.get(key, (0, 0.0, None, None))[0]
 
-        kv = _parse_kv(observacao)
+    def total(key):
+        return agg.get(key, (0, 0.0, None, None))[1]
+
+    uploads = count("uploads")
+    downloads = count("downloads")
+    inicios = count("inicios")
+    concluidos = count("concluidos")
+    erros = count("erros")
+    cancelados = count("cancelados")
+
+    n_stars = count("stars")
+    media = round(total("stars") / n_stars, 2) if n_stars else 0.0
+    aprovacoes = count("aprovacoes")
+    taxa_aprov = round((aprovacoes / n_stars) * 100, 1) if n_stars else 0.0
+
+    n_upload = count("upload_mb")
+    total_upload_mb = round(total("upload_mb"), 2) if n_upload else 0.0
+    avg_upload_mb = round(total_upload_mb / n_upload, 2) if n_upload else 0.0
 
-        if acao == "upload":
-            in_mb = _parse_float(kv.get("in_mb"))
-            if in_mb is None:
-                in_mb = _parse_float(kv.get("tamanho_mb"))
-            if in_mb:
-                upload_sizes.append(in_mb)
-
-        if acao in ["concluído", "concluido"]:
-            in_mb = _parse_float(kv.get("in_mb"))
-            out_mb = _parse_float(kv.get("out_mb"))
-            if in_mb:
-                input_sizes.append(in_mb)
-            if out_mb:
-                output_sizes.append(out_mb)
-
-            tempo_val = _parse_float(r.get("Tempo"))
-            if tempo_val is None:
-                tempo_val = _parse_float(kv.get("secs"))
-            if tempo_val:
-                times.append(tempo_val)
-
-    total_upload_mb = round(sum(upload_sizes), 2) if upload_sizes else 0.0
-    avg_upload_mb = round(total_upload_mb / len(upload_sizes), 2) if upload_sizes else 0.0
-
-    total_input_mb = round(sum(input_sizes), 2) if input_sizes else 0.0
-    avg_input_mb = round(total_input_mb / len(input_sizes), 2) if input_sizes else 0.0
-    total_output_mb = round(sum(output_sizes), 2) if output_sizes else 0.0
-    avg_output_mb = round(total_output_mb / len(output_sizes), 2) if output_sizes else 0.0
+    n_input = count("input_mb")
+    n_output = count("output_mb")
+    total_input_mb = round(total("input_mb"), 2) if n_input else 0.0
+    avg_input_mb = round(total_input_mb / n_input, 2) if n_input else 0.0
+    total_output_mb = round(total("output_mb"), 2) if n_output else 0.0
+    avg_output_mb = round(total_output_mb / n_output, 2) if n_output else 0.0
 
     saved_total_mb = round(total_input_mb - total_output_mb, 2) if total_input_mb else 0.0
     reduction_pct = round((1 - (total_output_mb / total_input_mb)) * 100, 1) if total_input_mb else 0.0
 
-    avg_time_sec = round(sum(times) / len(times), 2) if times else 0.0
-    max_time_sec = round(max(times), 2) if times else 0.0
+    n_times = count("time_sec")
+    avg_time_sec = round(total("time_sec") / n_times, 2) if n_times else 0.0
+    max_time_sec = round(agg["time_sec"][3], 2) if n_times else 0.0
 
     return {
         "uploads": uploads,
@@ -389,7 +781,7 @@ def compute_metrics():
         "concluidos": concluidos,
         "erros": erros,
         "cancelados": cancelados,
-        "feedback_count": len(feedback),
+        "feedback_count": count("feedback"),
         "media_estrelas": media,
         "taxa_aprovacao_pct": taxa_aprov,
         "aprovacoes_4_ou_5": aprovacoes,
@@ -405,4 +797,5 @@ def compute_metrics():
         "reduction_pct": reduction_pct,
         "avg_time_sec": avg_time_sec,
         "max_time_sec": max_time_sec,
+        "daily": _daily_metrics(days),
     }
@@ -0,0 +1,250 @@
+"""
+Autoescala de workers dos motores por página (HP-OCR e HP-GS).
+
+A quantidade de workers deixa de ser uma constante (MAX_WORKERS) e passa a
+ser derivada em tempo de execução de:
+  - CPUs utilizáveis: afinidade do processo e cota de CPU do cgroup
+    (v2: cpu.max; v1: cpu.cfs_quota_us / cpu.cfs_period_us)
+  - memória disponível: o menor entre psutil (host) e limite − uso do cgroup
+    (o tmpfs do RAM Disk também conta no cgroup)
+  - espaço livre no RAM Disk
+
+O pool é criado com o teto de CPU; o WorkerGovernor limita quantas tarefas
+ficam em voo e ajusta esse limite durante o job: encolhe sob pressão de
+memória/RAM Disk e cresce quando os workers estão consumindo pouco
+(páginas leves). O ProcessPoolExecutor só cria processos conforme a demanda,
+então um limite menor também significa menos processos vivos.
+"""
+
+import os
+import math
+import time
+import shutil
+import logging
+
+import psutil
+
+from engines.constants import (
+    MAX_WORKERS,
+    BIG_FILE_PAGE_THRESHOLD,
+    BIG_FILE_MAX_WORKERS,
+    AUTOSCALE_WORKERS,
+    AUTOSCALE_MAX_WORKERS,
+    AUTOSCALE_WORKER_MEM_MB,
+    AUTOSCALE_MEM_RESERVE_MB,
+    AUTOSCALE_PAGE_DISK_MB,
+    AUTOSCALE_INTERVAL_S,
+)
+
+_CGROUP_ROOT = "/sys/fs/cgroup"
+# Valores de limite de memória acima disto significam "sem limite" no cgroup v1
+_CGROUP_UNLIMITED = 1 << 60
+_MB = 1024 * 1024
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path, encoding="ascii") as fp:
+            return fp.read().strip()
+    except (OSError, ValueError):
+        return None
+
+
+def cgroup_cpu_limit() -> float | None:
+    """Cota de CPU do cgroup em núcleos (ex.: 2.5), ou None se ilimitada."""
+    # cgroup v2: "<quota> <period>" ou "max <period>"
+    raw = _read(os.path.join(_CGROUP_ROOT, "cpu.max"))
+    if raw:
+        quota, _, period = raw.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1
+    for sub in ("cpu", "cpu,cpuacct"):
+        quota = _read(os.path.join(_CGROUP_ROOT, sub, "cpu.cfs_quota_us"))
+        period = _read(os.path.join(_CGROUP_ROOT, sub, "cpu.cfs_period_us"))
+        if quota and period and int(quota) > 0:
+            return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> int:
+    """CPUs realmente utilizáveis: afinidade do processo limitada pela cota do cgroup."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Windows/macOS
+        cpus = os.cpu_count() or 1
+
+    quota = cgroup_cpu_limit()
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def _cgroup_memory_headroom() -> int | None:
+    """Limite − uso do cgroup (bytes), descontando page cache inativo; None sem limite."""
+    # cgroup v2
+    limit = _read(os.path.join(_CGROUP_ROOT, "memory.max"))
+    usage = _read(os.path.join(_CGROUP_ROOT, "memory.current"))
+    stat_path = os.path.join(_CGROUP_ROOT, "memory.stat")
+    inactive_key = "inactive_file"
+
+    if limit is None:
+        # cgroup v1
+        base = os.path.join(_CGROUP_ROOT, "memory")
+        limit = _read(os.path.join(base, "memory.limit_in_bytes"))
+        usage = _read(os.path.join(base, "memory.usage_in_bytes"))
+        stat_path = os.path.join(base, "memory.stat")
+        inactive_key = "total_inactive_file"
+
+    if not limit or limit == "max" or not usage:
+        return None
+    limit_b = int(limit)
+    if limit_b >= _CGROUP_UNLIMITED:
+        return None
+
+    used_b = int(usage)
+    for line in (_read(stat_path) or "").splitlines():
+        key, _, value = line.partition(" ")
+        if key == inactive_key:
+            used_b -= int(value)
+            break
+    return max(0, limit_b - used_b)
+
+
+def available_memory_mb() -> float:
+    """Memória disponível (MB): o menor entre o host e o cgroup do container."""
+    avail = psutil.virtual_memory().available
+    headroom = _cgroup_memory_headroom()
+    if headroom is not None:
+        avail = min(avail, headroom)
+    return avail / _MB
+
+
+def free_disk_mb(path: str) -> float:
+    try:
+        return shutil.disk_usage(path).free / _MB
+    except OSError:
+        return float("inf")
+
+
+def _workers_by_resources(work_dir: str, per_worker_mb: float) -> int:
+    usable_mem = available_memory_mb() - AUTOSCALE_MEM_RESERVE_MB
+    by_mem = int(usable_mem // per_worker_mb)
+    by_disk = int(free_disk_mb(work_dir) // AUTOSCALE_PAGE_DISK_MB)
+    return max(1, min(by_mem, by_disk))
+
+
+def plan_workers(kind: str, total_pages: int | None, work_dir: str) -> tuple[int, int]:
+    """
+    Dimensiona o pool de um job.
+
+    Args:
+        kind:        "ocr" (HP-OCR) ou "gs" (HP-GS) — define a estimativa
+                     inicial de memória por worker (AUTOSCALE_WORKER_MEM_MB).
+        total_pages: Páginas do job (acima de BIG_FILE_PAGE_THRESHOLD o teto
+                     cai para BIG_FILE_MAX_WORKERS). None para um pool
+                     compartilhado entre jobs (engines.scheduler).
+        work_dir:    Diretório de trabalho no RAM Disk.
+
+    Returns:
+        (max_workers, initial): tamanho do pool (teto de CPU) e limite inicial
+        de tarefas em voo (restrito por memória e RAM Disk).
+    """
+    if not AUTOSCALE_WORKERS:
+        return MAX_WORKERS, MAX_WORKERS
+
+    max_workers = min(available_cpus(), AUTOSCALE_MAX_WORKERS)
+    if total_pages is not None:
+        max_workers = min(max_workers, max(1, total_pages))
+        if total_pages > BIG_FILE_PAGE_THRESHOLD:
+            max_workers = min(max_workers, BIG_FILE_MAX_WORKERS)
+
+    per_worker = AUTOSCALE_WORKER_MEM_MB.get(kind, max(AUTOSCALE_WORKER_MEM_MB.values()))
+    initial = min(max_workers, _workers_by_resources(work_dir, per_worker))
+    return max_workers, initial
+
+
+class WorkerGovernor:
+    """
+    Limite dinâmico de tarefas em voo para um pool já criado.
+
+    Chame `update()` a cada tarefa concluída (a reavaliação real acontece no
+    máximo a cada AUTOSCALE_INTERVAL_S). O consumo por worker é medido pelo
+    RSS dos processos filhos e suavizado, então páginas leves liberam mais
+    workers e páginas pesadas reduzem o limite.
+
+    `worker_pids` (opcional) devolve os PIDs dos workers do pool. Com
+    forkserver os workers são netos deste processo, e entre os descendentes
+    também estão o forkserver e o resource_tracker, que não contam.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        total_pages: int | None,
+        work_dir: str,
+        tag: str = "",
+        worker_pids=None,
+    ):
+        self.kind = kind
+        self.work_dir = work_dir
+        self.tag = tag or f"[{kind.upper()}]"
+        self._worker_pids = worker_pids
+        self.max_workers, self.limit = plan_workers(kind, total_pages, work_dir)
+        self.per_worker_mb = float(
+            AUTOSCALE_WORKER_MEM_MB.get(kind, max(AUTOSCALE_WORKER_MEM_MB.values()))
+        )
+        self._last_check = time.monotonic()
+        logging.info(
+            f"{self.tag} Autoescala | pool={self.max_workers} | em voo={self.limit} | "
+            f"cpus={available_cpus()} | memória livre={available_memory_mb():.0f} MB | "
+            f"RAM Disk livre={free_disk_mb(work_dir):.0f} MB"
+        )
+
+    def _observe_worker_mb(self) -> None:
+        try:
+            procs = psutil.Process().children(recursive=True)
+            if self._worker_pids is not None:
+                pids = set(self._worker_pids())
+                procs = [p for p in procs if p.pid in pids]
+            rss = [p.memory_info().rss for p in procs]
+        except psutil.Error:
+            return
+        if rss:
+            observed = sum(rss) / len(rss) / _MB
+            self.per_worker_mb = 0.7 * self.per_worker_mb + 0.3 * observed
+
+    def update(self) -> int:
+        """Reavalia os recursos e devolve o limite atual de tarefas em voo."""
+        if not AUTOSCALE_WORKERS:
+            return self.limit
+
+        now = time.monotonic()
+        if now - self._last_check < AUTOSCALE_INTERVAL_S:
+            return self.limit
+        self._last_check = now
+
+        self._observe_worker_mb()
+        usable_mem = available_memory_mb() - AUTOSCALE_MEM_RESERVE_MB
+        free_disk = free_disk_mb(self.work_dir)
+        previous = self.limit
+
+        if usable_mem < 0 or free_disk < AUTOSCALE_PAGE_DISK_MB * 2:
+            # Pressão crítica: corta pela metade
+            self.limit = max(1, self.limit // 2)
+        elif usable_mem < self.per_worker_mb or free_disk < AUTOSCALE_PAGE_DISK_MB * self.limit:
+            self.limit = max(1, self.limit - 1)
+        elif (self.limit < self.max_workers
+              and usable_mem > self.per_worker_mb * 2
+              and free_disk > AUTOSCALE_PAGE_DISK_MB * (self.limit + 1) * 2):
+            self.limit += 1
+
+        if self.limit != previous:
+            logging.info(
+                f"{self.tag} Autoescala: em voo {previous} → {self.limit} | "
+                f"memória livre={usable_mem + AUTOSCALE_MEM_RESERVE_MB:.0f} MB | "
+                f"~{self.per_worker_mb:.0f} MB/worker | RAM Disk livre={free_disk:.0f} MB"
+            )
+        return self.limit
@@ -0,0 +1,115 @@
+"""
+Detecção de página em branco sobre o raster da página.
+
+Substitui a verificação estrutural antiga (texto/imagens via pikepdf + fitz,
+que reabria o arquivo a cada página e só olhava a primeira): aqui a decisão
+é visual, feita com NumPy sobre uma amostra reduzida do raster.
+
+Uma página é considerada em branco quando a fração de pixels de "tinta"
+(que se afastam do nível do papel por mais de BLANK_INK_DELTA, para mais
+escuro ou para mais claro) fica abaixo de BLANK_MAX_INK_RATIO. O nível do
+papel é estimado pela mediana, então scans com fundo acinzentado ou
+amarelado também são reconhecidos — e páginas invertidas (texto claro sobre
+fundo escuro, capas escuras) não passam por brancas.
+
+A redução é feita por passo (slicing), sem reamostragem nem cópia: para um
+pixmap já renderizado o custo é de microssegundos. A amostragem por passo
+preserva, em média, a fração de tinta do raster original.
+"""
+
+import logging
+
+import numpy as np
+import fitz  # PyMuPDF
+
+from engines.constants import (
+    BLANK_SAMPLE_SIZE,
+    BLANK_INK_DELTA,
+    BLANK_MAX_INK_RATIO,
+)
+
+
+def _sample(arr: np.ndarray) -> np.ndarray:
+    """Reduz o array (h, w[, c]) por passo até ~BLANK_SAMPLE_SIZE no maior lado."""
+    step = max(1, max(arr.shape[0], arr.shape[1]) // BLANK_SAMPLE_SIZE)
+    return arr[::step, ::step]
+
+
+def _ink_count(gray: np.ndarray, darker: bool) -> int:
+    """
+    Pixels que se afastam da mediana (nível do papel) por mais de
+    BLANK_INK_DELTA, para baixo (darker=True) ou para cima.
+
+    Histograma de 256 níveis: mediana e contagem saem da mesma soma
+    acumulada, sem ordenar os pixels.
+    """
+    cumulative = np.cumsum(np.bincount(gray.ravel(), minlength=256))
+    paper = int(np.searchsorted(cumulative, gray.size / 2))
+    if darker:
+        level = paper - BLANK_INK_DELTA
+        return int(cumulative[level - 1]) if level > 0 else 0
+    level = paper + BLANK_INK_DELTA
+    return gray.size - int(cumulative[level]) if level < 255 else 0
+
+
+def pixels_blank(arr: np.ndarray) -> bool:
+    """
+    Decide se o raster (uint8, cinza (h, w) ou cor (h, w, c)) está em branco.
+    """
+    arr = _sample(arr)
+    if arr.size == 0:
+        return True
+    if arr.ndim == 3:
+        # Tinta escura pelo canal mais escuro (ex.: carimbo azul sobre papel
+        # branco) e tinta clara pelo canal mais claro (ex.: texto amarelo
+        # sobre fundo preto). np.minimum/np.maximum canal a canal é bem mais
+        # rápido que .min(axis=2) na view com passo.
+        dark = arr[:, :, 0].copy()
+        light = arr[:, :, 0].copy()
+        for channel in range(1, arr.shape[2]):
+            np.minimum(dark, arr[:, :, channel], out=dark)
+            np.maximum(light, arr[:, :, channel], out=light)
+    else:
+        dark = light = arr
+
+    ink = _ink_count(dark, darker=True) + _ink_count(light, darker=False)
+    return ink / dark.size < BLANK_MAX_INK_RATIO
+
+
+def pixmap_is_blank(pix) -> bool:
+    """Verifica um fitz.Pixmap já renderizado (sem copiar os samples)."""
+    if pix.width <= 0 or pix.height <= 0:
+        return True
+    arr = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(
+        pix.height, pix.width, pix.n
+    )
+    if pix.alpha:
+        arr = arr[:, :, :-1]
+    return pixels_blank(arr)
+
+
+def page_is_blank(page) -> bool:
+    """Renderiza a página (fitz) em baixa resolução e verifica."""
+    longest = max(page.rect.width, page.rect.height)
+    if longest <= 0:
+        return True
+    zoom = min(1.0, BLANK_SAMPLE_SIZE / longest)
+    pix = page.get_pixmap(
+        matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False
+    )
+    return pixmap_is_blank(pix)
+
+
+def pdf_is_blank(pdf_path: str) -> bool:
+    """
+    True se TODAS as páginas do PDF estão em branco.
+    Abre o arquivo uma única vez; para na primeira página com conteúdo.
+    """
+    with fitz.open(pdf_path) as doc:
+        if doc.page_count == 0:
+            return True
+        for page in doc:
+            if not page_is_blank(page):
+                return False
+    logging.debug(f"[blank] Todas as páginas em branco: {pdf_path}")
+    return True
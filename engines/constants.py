@@ -5,6 +5,13 @@ Todos os limites e configurações globais devem ser definidos aqui
 para garantir consistência entre os módulos.
 """
 
+import os
+
+# Diretório do app (raiz do repositório): caches e bancos locais ficam aqui,
+# qualquer que seja o diretório de trabalho de quem importa (ex.: um
+# `python worker.py` iniciado de outra pasta abre o mesmo jobs.db)
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  LIMITES DE TAMANHO
 # ══════════════════════════════════════════════════════════════════════════════
@@ -23,6 +30,16 @@ SAFETY_MARGIN = 0.90  # 10% de folga
 MAX_DOC_MB_SAFE = MAX_DOC_MB * SAFETY_MARGIN  # ~4.39 MB
 MAX_DOC_BYTES_SAFE = int(MAX_DOC_BYTES * SAFETY_MARGIN)
 
+# Upload em /processar: tamanho máximo do lote (todos os arquivos somados) e
+# tamanho do bloco da cópia em fluxo para o disco (engines.upload)
+MAX_UPLOAD_MB = 499
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # 1 MB
+
+# Downloads (/download): True → o Flask responde só com o cabeçalho
+# X-Sendfile e o proxy reverso (Apache/lighttpd) envia o arquivo. Deixe False
+# servindo direto pelo waitress.
+DOWNLOAD_X_SENDFILE = False
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  LIMITES POR MODO DE OPERAÇÃO
 # ══════════════════════════════════════════════════════════════════════════════
@@ -72,10 +89,33 @@ DPI_PASSES_SPLIT = [
 
 # Workers para processamento paralelo
 # REDUZIDO: PDFs com 400+ páginas precisam menos paralelismo para evitar OOM
-MAX_WORKERS = 10  # Base, mas será limitado a 8 em execute_gs.py para PDFs grandes
+MAX_WORKERS = 10  # Usado apenas com AUTOSCALE_WORKERS=False
 
 # Limite de páginas para ativar modo "big file" (reduz workers automaticamente)
-BIG_FILE_PAGE_THRESHOLD = 350  # Acima disto, limita a 8 workers
+BIG_FILE_PAGE_THRESHOLD = 350  # Acima disto, limita a BIG_FILE_MAX_WORKERS
+BIG_FILE_MAX_WORKERS = 8
+
+# Autoescala de workers (engines.autoscale): pool dimensionado pela cota de CPU
+# do cgroup, memória disponível e espaço livre no RAM Disk, com ajuste durante
+# o job. False → MAX_WORKERS fixo.
+AUTOSCALE_WORKERS = True
+AUTOSCALE_MAX_WORKERS = 32  # teto absoluto por pool
+AUTOSCALE_WORKER_MEM_MB = {"ocr": 400, "gs": 300}  # estimativa inicial por worker
+AUTOSCALE_MEM_RESERVE_MB = 1024  # memória mantida livre para o servidor e o SO
+AUTOSCALE_PAGE_DISK_MB = 40  # RAM Disk estimado por página em voo
+AUTOSCALE_INTERVAL_S = 2.0  # intervalo mínimo entre reavaliações
+
+# Documentos de origem mantidos abertos por worker do pool compartilhado
+# (engines.source_cache / engines.scheduler)
+SOURCE_CACHE_MAX_DOCS = 4
+
+# Pool de workers compartilhado (engines.scheduler)
+#   "forkserver" → workers nascem de um servidor com os módulos já importados
+#   "fork" / "spawn" → métodos padrão do multiprocessing
+WORKER_START_METHOD = "forkserver"
+WORKER_PRELOAD_MODULES = ["engines.high_performance_ocr", "engines.execute_gs"]
+WORKER_MAX_TASKS = 200  # recicla o worker após N tarefas (limita vazamentos)
+WORKER_POOL_WARM_START = True  # cria e aquece o pool na subida do worker (worker.py)
 
 # GC agressivo para PDFs grandes
 GC_AGGRESSIVE_LARGE_FILES = True  # Force gc.collect() a cada página (não a cada 10)
@@ -84,10 +124,98 @@ GC_AGGRESSIVE_LARGE_FILES = True  # Force gc.collect() a cada página (não a ca
 TESSERACT_LANG = "por+eng"
 TESSERACT_DPI = 200
 
+# Backend de OCR por página no HP-OCR:
+#   "auto"       → tesserocr (API C, modelos carregados uma vez por worker),
+#                  com fallback para o binário tesseract
+#   "tesserocr"  → idem, mas registra aviso se o tesserocr não estiver disponível
+#   "subprocess" → sempre o binário tesseract (um processo por página)
+OCR_BACKEND = "auto"
+
+# Timeout do OCR de uma página (em segundos)
+TESSERACT_TIMEOUT = 180
+
+# Pipeline em memória no HP-OCR: fragmento e pixmap da página vão direto do
+# fitz para o OCR (sem PDF/PNG intermediários no RAM Disk).
+OCR_IN_MEMORY = True
+
+# Renderiza a página em tons de cinza para o OCR (imagem embutida no PDF final
+# também fica em cinza). Desligado para preservar páginas coloridas.
+OCR_RENDER_GRAYSCALE = False
+
+# Montagem final no HP-OCR:
+#   "passthrough" → concatena os fragmentos com pikepdf sem recodificar as
+#                   imagens; só páginas que precisam (imagem sem compressão
+#                   com perdas ou acima de 1.5× o DPI do nível escolhido)
+#                   passam pelo Ghostscript, uma a uma, no pool
+#   "ghostscript" → re-destila o documento inteiro num único pdfwrite
+#                   (comportamento original, ajusta todas as páginas para A4)
+HP_MERGE_MODE = "passthrough"
+
+# Montagem passthrough: ajusta cada página ao A4 (escala + centraliza, como o
+# -dPDFFitPage do merge Ghostscript) sem recodificar o conteúdo
+HP_FIT_A4 = True
+
+# Montagem passthrough: fragmentos mantidos em memória (o qpdf copia os
+# streams só no save) até o documento montado ser gravado num checkpoint
+# em disco e reaberto; limita a memória do processo em documentos grandes
+HP_ASSEMBLER_BUFFER_MB = 64
+
 # Configurações do Ghostscript
 GS_RENDERING_THREADS = 10
 GS_BUFFER_SPACE = 1_000_000_000  # 1 GB
 
+# ══════════════════════════════════════════════════════════════════════════════
+#  CACHE DE RESULTADOS
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Cache por conteúdo (SHA-256 da entrada + parâmetros de compressão resolvidos)
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_DIR = os.path.join(APP_DIR, "result_cache")
+RESULT_CACHE_MAX_MB = 2048  # evicção LRU acima deste tamanho
+
+# Assinatura digital (engines.signature): resultados em cache por SHA-256
+SIGNATURE_CACHE_SIZE = 4096  # entradas (LRU em memória, por processo)
+
+# Perfil de páginas (engines.page_profile): texto, imagens e bytes por página,
+# calculado numa passada e guardado por SHA-256 do PDF
+PAGE_PROFILE_DIR = os.path.join(APP_DIR, "page_profile_cache")
+PAGE_PROFILE_CACHE_MAX_MB = 256  # evicção LRU em disco acima deste tamanho
+PAGE_PROFILE_MEMORY_ENTRIES = 32  # perfis mantidos em memória (por processo)
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  FILA DE JOBS
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Fila durável (job_queue.py) consumida por processos worker (worker.py).
+# O servidor web só enfileira e lê o estado; um reinício não perde jobs.
+JOB_QUEUE_DB = os.path.join(APP_DIR, "jobs.db")  # SQLite
+JOB_WORKERS = 1  # processos worker iniciados pelo app.py (0 = iniciados à parte)
+JOB_WORKER_CONCURRENCY = 4  # jobs simultâneos por processo worker
+JOB_POLL_INTERVAL_S = 1.0  # espera entre consultas com a fila vazia
+JOB_HEARTBEAT_S = 5.0  # intervalo do heartbeat dos jobs em execução
+JOB_STALE_S = 60.0  # sem heartbeat por este tempo → job volta para a fila
+JOB_MAX_ATTEMPTS = 3  # tentativas antes de marcar o job como falho
+
+# Canal de progresso (progress_hub.py): o worker agrupa as atualizações e
+# grava no máximo a cada PROGRESS_FLUSH_S; no servidor web uma única thread
+# consulta as versões dos jobs acompanhados e acorda só os assinantes do job
+# que mudou. Conexões SSE ociosas ficam bloqueadas, sem consultar nada.
+PROGRESS_FLUSH_S = 0.25
+PROGRESS_POLL_S = 0.25
+PROGRESS_LOG_RING = 500  # linhas de log mantidas por tarefa (novos assinantes)
+PROGRESS_KEEPALIVE_S = 15.0  # comentário SSE para manter a conexão aberta
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ANALYTICS
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Eventos de uso/feedback (analytics.py) vão para um banco local só de
+# acréscimos; as planilhas no compartilhamento de rede são exportadas em lote.
+ANALYTICS_DB = os.path.join(APP_DIR, "analytics.db")  # SQLite
+ANALYTICS_FLUSH_S = 1.0  # janela de agrupamento da gravação em segundo plano
+ANALYTICS_EXPORT_INTERVAL_S = 300.0  # exportação periódica para uso.xlsx/feedback.xlsx
+ANALYTICS_EXPORT_BATCH = 5000  # linhas por load/save da planilha
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  VALIDAÇÃO DE PDF E IMAGENS
 # ══════════════════════════════════════════════════════════════════════════════
@@ -104,6 +232,16 @@ PNG_VALIDATION_TIMEOUT = 5
 # Timeout para validação de PDF (em segundos)
 PDF_VALIDATION_TIMEOUT = 5
 
+# Detecção de página em branco (engines.blank_page), feita sobre o raster:
+# amostra de até BLANK_SAMPLE_SIZE px no maior lado; "tinta" = pixel que se
+# afasta do nível do papel (mediana) por mais de BLANK_INK_DELTA, nos dois sentidos
+BLANK_SAMPLE_SIZE = 512
+BLANK_INK_DELTA = 48
+BLANK_MAX_INK_RATIO = 0.0001  # < 0,01% de tinta → página em branco
+
+# HP-OCR: páginas em branco (pelo raster já renderizado) não passam pelo OCR
+HP_SKIP_BLANK_PAGES = True
+
 
 # ══════════════════════════════════════════════════════════════════════════════
 #  OCR
@@ -112,5 +250,14 @@ PDF_VALIDATION_TIMEOUT = 5
 # Limite de caracteres para decidir se página precisa de OCR
 LIMITE_CHARS_OCR = 50
 
+# HP-OCR: reaproveita a camada de texto de páginas já pesquisáveis (sem
+# rasterizar nem passar pelo Tesseract). Opt-in; pode ser ligado por requisição.
+HP_REUSE_TEXT_LAYER = False
+
 # Percentual mínimo de área de imagem para considerar página como scan
 MIN_IMAGE_AREA_RATIO = 0.30  # 30% da área da página
+
+# Chave no /Info do PDF gravada pelo HP-OCR com as páginas já cobertas
+# (OCR aplicado, texto nativo conferido ou página em branco). A divisão em
+# volumes confia nela e não repete o OCR dessas páginas.
+OCR_MARKER_KEY = "/ComprimaOCR"
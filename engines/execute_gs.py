@@ -2,7 +2,7 @@
 Motor de compressão GS de alta performance para PDFs.
 
 Usa a mesma estratégia do HP-OCR:
-- ProcessPoolExecutor com workers otimizados para Xeon E5-2620 v4
+- Pool de processos compartilhado do servidor (engines.scheduler)
 - RAM Disk para I/O zero-latência
 - Ghostscript com -dNumRenderingThreads e -dBufferSpace para merge
 - subprocess puro (sem dependência de fitz nos workers)
@@ -21,8 +21,11 @@ import psutil
 from engines.locate_gs import localizar_gs
 from engines.force_ocr import ocr
 from engines.ramdisk import temp_dir
+from engines.source_cache import get_source_pdf
+from engines.scheduler import get_scheduler
 from engines.constants import (
-    MAX_WORKERS,
+    BIG_FILE_PAGE_THRESHOLD,
+    GC_AGGRESSIVE_LARGE_FILES,
     GS_RENDERING_THREADS,
     GS_BUFFER_SPACE,
     EXTRA_COMPRESS_THRESHOLD_MB,
@@ -227,6 +230,8 @@ def _worker_gs_page(args):
     """
     Worker de alta performance executado em processo separado.
     Pipeline por página: extrair → OCR → comprimir → recomprimir até ≤500 KB → retornar caminho.
+    A extração usa o handle pikepdf do documento em cache no worker
+    (engines.source_cache), aberto uma vez por processo.
     """
     if len(args) >= 5:
         page_idx, input_path, nivel, work_dir, selected_extra = args
@@ -248,31 +253,21 @@ def _worker_gs_page(args):
     t_ocr = os.path.join(work_dir, f"ocr_{page_num:05d}_{uid}.pdf")
     t_out = os.path.join(work_dir, f"out_{page_num:05d}_{uid}.pdf")
 
-    doc_fitz = None
-    doc_pike = None
-
     try:
         gs_exe     = localizar_gs()
         mem_inicio = _get_memoria_processo()
 
-        # 1. Extração de página
+        # 1. Extração de página (handle do documento em cache no worker)
         try:
-            with fitz.open(input_path) as doc_fitz:
-                with pikepdf.open(input_path) as src:
-                    out = pikepdf.Pdf.new()
-                    out.pages.append(src.pages[page_idx])
-                    out.save(t_raw)
-                    del out
+            src = get_source_pdf(input_path)
+            out = pikepdf.Pdf.new()
+            out.pages.append(src.pages[page_idx])
+            out.save(t_raw)
+            del out
         except Exception as triage_err:
-            logging.warning(f"[HP-GS] PyMuPDF falhou pág {page_num}, fallback GS: {triage_err}")
+            logging.warning(f"[HP-GS] pikepdf falhou pág {page_num}, fallback GS: {triage_err}")
             _gs_extract_page(gs_exe, input_path, page_num, t_raw)
         finally:
-            if doc_fitz is not None:
-                try: doc_fitz.close()
-                except: pass
-            if doc_pike is not None:
-                try: doc_pike.close()
-                except: pass
             _limpar_memoria_worker()
 
         if not os.path.isfile(t_raw):
@@ -321,12 +316,6 @@ def _worker_gs_page(args):
         return {"page": page_idx, "pdf": None, "success": False, "error": str(e)}
 
     finally:
-        if doc_fitz is not None:
-            try: doc_fitz.close()
-            except: pass
-        if doc_pike is not None:
-            try: doc_pike.close()
-            except: pass
         for f in [t_raw, t_ocr]:
             if os.path.isfile(f) and f != t_out:
                 try: os.remove(f)
@@ -482,7 +471,7 @@ def processar_pdf_custom(
     extra_compress_pages=None,
 ):
     """
-    Motor GS de alta performance com ProcessPoolExecutor.
+    Motor GS de alta performance sobre o pool compartilhado (engines.scheduler).
     """
     doc_fitz = None
     work_dir = None
@@ -504,7 +493,7 @@ def processar_pdf_custom(
 
         mem_inicio = _get_memoria_processo()
         logging.info(
-            f"[HP-GS] Processando {total} páginas com 8 workers | "
+            f"[HP-GS] Processando {total} páginas | "
             f"ramdisk={work_dir} | Memória inicial: {mem_inicio:.1f} MB"
         )
 
@@ -539,46 +528,60 @@ def processar_pdf_custom(
             completed    = 0
             failed_pages = []
 
-            max_workers_safe = max(4, min(8, MAX_WORKERS - 4))
+            # GC no processo pai: a cada página em arquivos grandes
+            # (GC_AGGRESSIVE_LARGE_FILES), senão a cada 10
+            gc_every = (
+                1 if GC_AGGRESSIVE_LARGE_FILES and total > BIG_FILE_PAGE_THRESHOLD
+                else 10
+            )
 
-            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers_safe) as executor:
+            # Pool compartilhado do processo (engines.scheduler): concorrência
+            # global limitada e páginas intercaladas com as de outras tarefas
+            with get_scheduler().open_job(
+                f"HP-GS {os.path.basename(input_path)}", total_pages=total
+            ) as job:
                 future_to_page = {
-                    executor.submit(_worker_gs_page, t): t[0]
+                    job.submit(_worker_gs_page, t): t[0]
                     for t in tarefas
                 }
 
-                for future in concurrent.futures.as_completed(future_to_page):
+                while future_to_page:
+                    done, _ = concurrent.futures.wait(
+                        future_to_page, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
                     if check_cancelled and check_cancelled():
-                        executor.shutdown(wait=False, cancel_futures=True)
+                        job.close()
                         logging.info("[HP-GS] Processamento cancelado pelo usuário.")
                         return
 
-                    page_idx = future_to_page[future]
-                    try:
-                        result = future.result(timeout=300)
-                        results_map[page_idx] = result
-                        if not result["success"]:
+                    for future in done:
+                        page_idx = future_to_page.pop(future)
+                        try:
+                            result = future.result()
+                            results_map[page_idx] = result
+                            if not result["success"]:
+                                failed_pages.append(page_idx)
+                                logging.warning(f"[HP-GS] Página {page_idx} falhou: {result['error']}")
+                        except Exception as e:
                             failed_pages.append(page_idx)
-                            logging.warning(f"[HP-GS] Página {page_idx} falhou: {result['error']}")
-                    except Exception as e:
-                        failed_pages.append(page_idx)
-                        results_map[page_idx] = {
-                            "page": page_idx, "pdf": None,
-                            "success": False, "error": str(e),
-                        }
-                        logging.error(f"[HP-GS] Exceção no worker da página {page_idx}: {e}")
-                    finally:
-                        completed += 1
-                        if callback:
-                            try: callback(completed - 1, total)
-                            except Exception: pass
-                        _limpar_memoria_worker()
-                        if completed % 50 == 0:
-                            mem_atual = _get_memoria_processo()
-                            logging.info(
-                                f"[HP-GS] Progresso: {completed}/{total} páginas | "
-                                f"Memória: {mem_atual:.1f} MB | Falhas: {len(failed_pages)}"
-                            )
+                            results_map[page_idx] = {
+                                "page": page_idx, "pdf": None,
+                                "success": False, "error": str(e),
+                            }
+                            logging.error(f"[HP-GS] Exceção no worker da página {page_idx}: {e}")
+                        finally:
+                            completed += 1
+                            if callback:
+                                try: callback(completed - 1, total)
+                                except Exception: pass
+                            if completed % gc_every == 0:
+                                _limpar_memoria_worker()
+                            if completed % 50 == 0:
+                                mem_atual = _get_memoria_processo()
+                                logging.info(
+                                    f"[HP-GS] Progresso: {completed}/{total} páginas | "
+                                    f"Memória: {mem_atual:.1f} MB | Falhas: {len(failed_pages)}"
+                                )
 
             mem_pos_workers = _get_memoria_processo()
             logging.info(f"[HP-GS] Término workers: {completed}/{total} | Memória: {mem_pos_workers:.1f} MB")
@@ -2,10 +2,10 @@ import pathlib
 import subprocess
 import os
 import logging
-import fitz  # PyMuPDF
 import pikepdf
 import shutil
 from engines.ramdisk import temp_dir
+from engines.page_profile import get_page_profile, measure_page, needs_ocr
 from engines.constants import (
     MAX_PAGE_KB,
     MAX_PAGE_BYTES,
@@ -14,7 +14,7 @@ from engines.constants import (
     MAX_DOC_MB_SAFE,
     LIMITE_CHARS_OCR,
     TESSERACT_LANG,
-    MIN_IMAGE_AREA_RATIO,
+    OCR_MARKER_KEY,
 )
 
 # Aliases para compatibilidade com código existente
@@ -32,42 +32,69 @@ def run(cmd):
         logging.error(f"STDERR: {e.stderr}")
         raise
 
+def pagina_precisa_ocr(page, limite=LIMITE_CHARS_OCR):
+    """
+    Decide se uma página (fitz.Page) precisa de OCR: imagem dominante
+    (> MIN_IMAGE_AREA_RATIO da área) e pouco texto nativo.
+    """
+    _, palavras, imagens, imagem_area, page_area = measure_page(page)
+    return needs_ocr(palavras, imagens, imagem_area, page_area, limite)
+
+
 def get_paginas_necessitam_ocr(input_pdf, limite=LIMITE_CHARS_OCR):
-    """Analisa o PDF e identifica páginas com imagens dominantes e pouco texto."""
-    paginas_alvo = []
+    """
+    Analisa o PDF e identifica páginas com imagens dominantes e pouco texto.
+    Lê o perfil de páginas (engines.page_profile), em cache por conteúdo.
+    """
     try:
-        doc = fitz.open(str(input_pdf))
-        for i, page in enumerate(doc):
-            texto = page.get_text().strip()
-            palavra_count = len(texto.split())
-
-            # Detecta imagens na página
-            imagens = page.get_images(full=True)
-            tem_imagem = len(imagens) > 0
-
-            # Calcula área das imagens vs área da página
-            page_area = page.rect.width * page.rect.height
-            imagem_area_total = 0
-            for img in imagens:
-                try:
-                    xref = img[0]
-                    img_rects = page.get_image_rects(xref)
-                    for rect in img_rects:
-                        imagem_area_total += rect.width * rect.height
-                except:
-                    pass
-
-            # Imagem dominante: ocupa mais de 30% da página
-            imagem_dominante = imagem_area_total > (page_area * MIN_IMAGE_AREA_RATIO) if page_area > 0 else False
-
-            # Precisa OCR se: tem imagem dominante E pouco texto
-            if tem_imagem and imagem_dominante and palavra_count < 50:
-                paginas_alvo.append(i + 1)
-        doc.close()
+        profile = get_page_profile(input_pdf)
     except Exception as e:
         logging.error(f"Erro ao analisar texto: {e}")
         return None
-    return paginas_alvo
+    return [i + 1 for i in range(profile.count) if profile.needs_ocr(i, limite)]
+
+
+def marcar_ocr(pdf, paginas):
+    """
+    Grava no /Info do PDF (pikepdf.Pdf, antes do save) o marcador de OCR:
+    total de páginas e faixas cobertas, ex.: "total=800;paginas=1-800".
+    """
+    faixas = []
+    for p in sorted(set(paginas)):
+        if faixas and faixas[-1][1] == p - 1:
+            faixas[-1][1] = p
+        else:
+            faixas.append([p, p])
+    valor = ",".join(f"{a}-{b}" if a != b else str(a) for a, b in faixas)
+    pdf.docinfo[OCR_MARKER_KEY] = f"total={len(pdf.pages)};paginas={valor}"
+
+
+def get_paginas_com_ocr(input_pdf):
+    """
+    Páginas (1-based) que o marcador de OCR declara cobertas, ou None se o
+    PDF não tem marcador válido — ou se o número de páginas mudou depois
+    que ele foi gravado.
+
+    O marcador vem do próprio arquivo e qualquer PDF enviado pode trazê-lo:
+    quem o usa para dispensar OCR confere antes a camada de texto de cada
+    página (split_only._paginas_marcadas_validas).
+    """
+    try:
+        with pikepdf.open(str(input_pdf)) as pdf:
+            valor = pdf.docinfo.get(OCR_MARKER_KEY)
+            if valor is None:
+                return None
+            campos = dict(c.split("=", 1) for c in str(valor).split(";"))
+            if int(campos["total"]) != len(pdf.pages):
+                return None
+        paginas = set()
+        for faixa in filter(None, campos["paginas"].split(",")):
+            a, _, b = faixa.partition("-")
+            paginas.update(range(int(a), int(b or a) + 1))
+        return paginas
+    except Exception as e:
+        logging.warning(f"Marcador de OCR ilegível em {input_pdf}: {e}")
+        return None
 
 
 def get_paginas_seguras_para_ocr(input_pdf, paginas_candidatas):
@@ -77,6 +104,9 @@ def get_paginas_seguras_para_ocr(input_pdf, paginas_candidatas):
     Calcula: tamanho_atual + 30% para cada página
     Se resultado > 500KB, a página é ignorada (para evitar explosão de tamanho)
 
+    O tamanho atual é o da página isolada estimado no perfil de páginas
+    (engines.page_profile), sem salvar um PDF temporário por página.
+
     Args:
         input_pdf: caminho do PDF
         paginas_candidatas: lista de números de páginas a analisar
@@ -93,30 +123,18 @@ def get_paginas_seguras_para_ocr(input_pdf, paginas_candidatas):
     result = {"paginas_seguras": [], "puladas": {}}
 
     try:
-        doc = fitz.open(str(input_pdf))
+        profile = get_page_profile(input_pdf)
 
         for page_num in paginas_candidatas:
-            if page_num < 1 or page_num > len(doc):
+            if page_num < 1 or page_num > profile.count:
                 logging.warning(f"Página {page_num} inválida (fora do intervalo)")
                 result["puladas"][page_num] = "página inválida"
                 continue
 
-            page = doc[page_num - 1]
-
-            # Extrai página para estimar tamanho
             try:
-                page_pdf = pathlib.Path(temp_dir()) / f"page_{page_num}_temp.pdf"
-                single_page_doc = fitz.open()
-                single_page_doc.insert_pdf(doc, from_page=page_num - 1, to_page=page_num - 1)
-                single_page_doc.save(str(page_pdf))
-                single_page_doc.close()
-
-                actual_size = page_pdf.stat().st_size
+                actual_size = profile.isolated(page_num - 1)
                 estimated_size = actual_size * OCR_OVERHEAD
 
-                # Remove arquivo temporário
-                page_pdf.unlink()
-
                 if estimated_size > MAX_PAGE_BYTES:
                     logging.info(
                         f"Página {page_num} PULADA: "
@@ -133,8 +151,6 @@ def get_paginas_seguras_para_ocr(input_pdf, paginas_candidatas):
             except Exception as e:
                 logging.warning(f"Erro ao analisar tamanho da página {page_num}: {e}")
                 result["puladas"][page_num] = str(e)
-
-        doc.close()
     except Exception as e:
         logging.error(f"Erro ao processar PDF: {e}")
         return {"paginas_seguras": [], "puladas": {"erro": str(e)}}
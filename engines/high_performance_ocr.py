@@ -2,15 +2,20 @@
 Motor de OCR de alta performance para PDFs.
 
 Otimizado para Intel Xeon E5-2620 v4 (8 núcleos / 16 threads @ 2.10GHz).
-Usa ProcessPoolExecutor com 14 workers para paralelização massiva,
-pipeline direto pikepdf → fitz → tesseract → merge com ghostscript,
+Usa o pool de processos compartilhado do servidor (engines.scheduler),
+dimensionado em tempo de execução (engines.autoscale: cota de CPU do cgroup,
+memória e RAM Disk livres), para paralelização massiva,
+pipeline direto pikepdf → fitz → tesseract → montagem pikepdf (ghostscript só nas
+páginas que precisam),
+Tesseract persistente por worker (engines.ocr_backend)
 e RAM Disk em /mnt/ramdisk para I/O zero-latência.
 
 Variável OMP_THREAD_LIMIT=1 deve ser definida ANTES de qualquer import
 (já feito em app.py) para evitar contenção de threads do Tesseract.
 
 Compressão por página:
-  Páginas acima de 500 KB são rasterizadas via pdftoppm → PIL (JPEG) → pikepdf.
+  Páginas acima de 500 KB são rasterizadas uma vez via fitz → PIL (JPEG) → pikepdf,
+  com as passadas de qualidade derivadas em memória.
   Isso elimina vetores pesados gerados pelo Tesseract e reduz ~73% em scans.
 """
 
@@ -29,10 +34,20 @@ import pikepdf
 from PIL import Image
 import fitz  # PyMuPDF — usado apenas em fragmentos isolados (1 página cada)
 
+from engines.ocr_backend import ocr_image_to_pdf, ocr_pixmap_to_pdf
+from engines.source_cache import get_source_pdf
+from engines.force_ocr import pagina_precisa_ocr, marcar_ocr
+from engines.blank_page import pdf_is_blank, pixmap_is_blank
+from engines.scheduler import get_scheduler
 from engines.constants import (
-    MAX_WORKERS,
-    TESSERACT_LANG,
     TESSERACT_DPI,
+    OCR_IN_MEMORY,
+    OCR_RENDER_GRAYSCALE,
+    HP_REUSE_TEXT_LAYER,
+    HP_MERGE_MODE,
+    HP_FIT_A4,
+    HP_ASSEMBLER_BUFFER_MB,
+    HP_SKIP_BLANK_PAGES,
     GS_RENDERING_THREADS,
     GS_BUFFER_SPACE,
     PAGE_SIZE_LIMIT,
@@ -57,6 +72,14 @@ _DPI_PASSES_SPLIT = DPI_PASSES_SPLIT
 # Preset equivalente ao modo 72 DPI (/screen, qfactor ~0.45).
 _EXTRA_SELECTED_DPI_72 = 72
 _EXTRA_SELECTED_QUALITY_72 = 45
+# Filtros de imagem já comprimidos de forma eficiente: passam direto na
+# montagem passthrough (sem recodificação pelo Ghostscript)
+_PASSTHROUGH_IMAGE_FILTERS = {"DCTDecode", "JPXDecode", "JBIG2Decode", "CCITTFaxDecode"}
+# Mesmo limiar padrão do pdfwrite (ImageDownsampleThreshold): só reamostra
+# imagens acima de 1.5× o DPI alvo
+_DOWNSAMPLE_THRESHOLD = 1.5
+# Página A4 em pontos (mesmo papel do -sPAPERSIZE=a4 do merge Ghostscript)
+_A4_POINTS = (595.0, 842.0)
 # ─────────────────────────────────────────────────────────────────────────────
 
 
@@ -195,10 +218,9 @@ def _detect_blank_pdf(pdf_path: str) -> bool:
     """
     Detecta se um PDF está em branco (sem conteúdo visual).
 
-    Verifica:
-    - Se há texto suficiente (> 10 caracteres)
-    - Se há imagens/conteúdo visual
-    - Se o tamanho é suspeito (muito pequeno para página com OCR)
+    Verificação visual via engines.blank_page: cada página é renderizada em
+    baixa resolução e analisada com NumPy. O PDF só é considerado em branco
+    se TODAS as páginas estiverem em branco (o arquivo é aberto uma vez).
 
     Args:
         pdf_path: Caminho do PDF para verificar
@@ -207,24 +229,10 @@ def _detect_blank_pdf(pdf_path: str) -> bool:
         True se PDF está em branco, False caso tenha conteúdo
     """
     try:
-        with pikepdf.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                try:
-                    # Tenta extrair texto com fitz
-                    with fitz.open(pdf_path) as doc:
-                        page_fitz = doc[0]
-                        text = page_fitz.get_text().strip()
-                        images = page_fitz.get_images(full=True)
-
-                        # Se tem texto substancial OU imagens, não está branca
-                        if len(text) > 10 or images:
-                            return False
-                except:
-                    pass
-
-        # Se passou por todas as páginas sem encontrar conteúdo, está branca
-        logging.warning(f"[HP-OCR] PDF detectado como BRANCA (sem conteúdo): {pdf_path}")
-        return True
+        if pdf_is_blank(pdf_path):
+            logging.warning(f"[HP-OCR] PDF detectado como BRANCA (sem conteúdo): {pdf_path}")
+            return True
+        return False
 
     except Exception as e:
         logging.warning(f"[HP-OCR] Falha ao detectar PDF branca: {e}")
@@ -339,15 +347,116 @@ def _emit_progress(
         pass
 
 
+def _render_page_pixmap(page):
+    """Renderiza a página no DPI do OCR (sem alpha; cinza se configurado)."""
+    zoom = TESSERACT_DPI / 72
+    colorspace = fitz.csGRAY if OCR_RENDER_GRAYSCALE else fitz.csRGB
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+
+
+def _extract_page_bytes(pdf_path: str, page_num: int) -> bytes:
+    """Extrai a página (1-based) como PDF de página única em memória."""
+    src = get_source_pdf(pdf_path)
+    single = pikepdf.Pdf.new()
+    single.pages.append(src.pages[page_num - 1])
+    buf = io.BytesIO()
+    single.save(buf)
+    return buf.getvalue()
+
+
+def _ocr_page_in_memory(page, page_num: int, ocr_output_pdf: str) -> bool:
+    """
+    Pipeline sem arquivos temporários: recebe a página (fitz) já aberta a
+    partir do fragmento em memória e entrega o pixmap direto ao OCR.
+    Só o PDF resultante vai ao disco.
+
+    Returns:
+        False se a página está em branco (HP_SKIP_BLANK_PAGES) e o OCR foi
+        pulado; True se o OCR gerou `ocr_output_pdf`.
+    """
+    try:
+        pix = _render_page_pixmap(page)
+        if pix.width <= 0 or pix.height <= 0 or not pix.samples:
+            raise RuntimeError(f"Pixmap vazio ({pix.width}x{pix.height})")
+    except Exception as img_err:
+        raise RuntimeError(f"Falha ao renderizar página: {img_err}")
+
+    if HP_SKIP_BLANK_PAGES and pixmap_is_blank(pix):
+        return False
+
+    ocr_pixmap_to_pdf(pix, ocr_output_pdf, page_num)
+    return True
+
+
+def _ocr_page_via_files(
+    pdf_path: str,
+    page_num: int,
+    page_pdf: str,
+    img_path: str,
+    ocr_output_base: str,
+) -> bool:
+    """
+    Pipeline original com fragmento PDF e PNG intermediários no RAM Disk.
+    Retorna False se a página está em branco e o OCR foi pulado (o fragmento
+    `page_pdf` fica como resultado).
+    """
+    # ── 1. Extrai página isolada via pikepdf ─────────────────────────
+    # Handle do documento em cache no worker (aberto uma vez por processo).
+    # A partir daqui cada worker opera no seu próprio fragmento.
+    src = get_source_pdf(pdf_path)
+    single = pikepdf.Pdf.new()
+    single.pages.append(src.pages[page_num - 1])
+    single.save(page_pdf)
+
+    # ── 2. Converter para PNG via PyMuPDF (seguro — abre apenas fragmento) ──
+    try:
+        with fitz.open(page_pdf) as doc:
+            page = doc[0]
+            zoom = TESSERACT_DPI / 72
+            mat = fitz.Matrix(zoom, zoom)
+            pix = page.get_pixmap(matrix=mat, alpha=False)
+            if HP_SKIP_BLANK_PAGES and pixmap_is_blank(pix):
+                return False
+            pix.save(img_path)
+            if not os.path.isfile(img_path):
+                raise FileNotFoundError(f"PyMuPDF não gerou imagem: {img_path}")
+
+            # Validar PNG antes de passar para Tesseract
+            if not _validate_png_image(img_path):
+                raise RuntimeError(f"PNG gerado é inválido/corrompido: {img_path}")
+
+    except Exception as img_err:
+        raise RuntimeError(f"Falha ao gerar imagem PNG: {img_err}")
+
+    # ── 3. OCR via Tesseract (API persistente ou binário) ────────────
+    ocr_image_to_pdf(img_path, ocr_output_base, page_num)
+    return True
+
+
 def _ocr_page(args: tuple) -> dict:
     """
     Worker executado em processo separado (ProcessPoolExecutor).
-    Recebe (pdf_path, page_num, work_dir) e retorna dict com resultado.
+    Recebe (pdf_path, page_num, work_dir[, reuse_text_layer]) e retorna dict
+    com resultado.
 
     Pipeline por página:
-        1. Extrai página isolada com pikepdf (seguro para acesso concorrente)
-        2. PyMuPDF → PNG (imagem da página)
-        3. Tesseract → PDF pesquisável
+        1. Extrai página isolada com pikepdf a partir do handle do documento
+           em cache no worker (engines.source_cache)
+        2. PyMuPDF → pixmap da página
+        3. Tesseract → PDF pesquisável (API persistente do worker via
+           tesserocr; binário tesseract como fallback)
+
+    Com OCR_IN_MEMORY (padrão) o fragmento fica em BytesIO e o pixmap vai
+    direto ao OCR, sem PNG; só o PDF resultante toca o RAM Disk. Com
+    OCR_IN_MEMORY=False usa o pipeline original fragmento.pdf → PNG → tesseract.
+
+    Com HP_SKIP_BLANK_PAGES, páginas em branco (engines.blank_page sobre o
+    pixmap já renderizado) não passam pelo Tesseract: o fragmento original é
+    mantido e o resultado traz "blank": True.
+
+    Com reuse_text_layer (4º item opcional de `args`), páginas que já têm
+    camada de texto (force_ocr.pagina_precisa_ocr == False) não passam pelo
+    Tesseract: o fragmento original é mantido, preservando o texto vetorial.
 
     Por que NOT OCRmyPDF:
         OCRmyPDF pode gerar PDFs vazios/brancos em cenários de alta carga ou
@@ -356,63 +465,56 @@ def _ocr_page(args: tuple) -> dict:
 
     Todo I/O acontece no RAM Disk para latência mínima.
     """
-    pdf_path, page_num, work_dir = args
+    pdf_path, page_num, work_dir = args[:3]
+    reuse_text_layer = len(args) > 3 and bool(args[3])
     uid            = uuid.uuid4().hex[:12]
     page_pdf       = os.path.join(work_dir, f"page_{page_num:05d}_{uid}.pdf")
     img_prefix     = os.path.join(work_dir, f"img_{page_num:05d}_{uid}")
     img_path       = f"{img_prefix}.png"
     ocr_output_base = os.path.join(work_dir, f"ocr_{page_num:05d}_{uid}")
     ocr_output_pdf = f"{ocr_output_base}.pdf"
+    native_pdf     = os.path.join(work_dir, f"native_{page_num:05d}_{uid}.pdf")
     result_pdf     = None  # Arquivo que deve ser mantido (não deletar)
 
     try:
-        # ── 1. Extrai página isolada via pikepdf ─────────────────────────
-        # pikepdf é seguro para leitura concorrente do mesmo arquivo.
-        # A partir daqui cada worker opera no seu próprio fragmento.
-        with pikepdf.open(pdf_path) as src:
-            single = pikepdf.Pdf.new()
-            single.pages.append(src.pages[page_num - 1])
-            single.save(page_pdf)
-
-        # ── 2. Converter para PNG via PyMuPDF (seguro — abre apenas fragmento) ──
-        try:
-            with fitz.open(page_pdf) as doc:
-                page = doc[0]
-                zoom = TESSERACT_DPI / 72
-                mat = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=mat, alpha=False)
-                pix.save(img_path)
-                if not os.path.isfile(img_path):
-                    raise FileNotFoundError(f"PyMuPDF não gerou imagem: {img_path}")
-
-                # Validar PNG antes de passar para Tesseract
-                if not _validate_png_image(img_path):
-                    raise RuntimeError(f"PNG gerado é inválido/corrompido: {img_path}")
-
-        except Exception as img_err:
-            raise RuntimeError(f"Falha ao gerar imagem PNG: {img_err}")
-
-        # ── 3. OCR via Tesseract ──────────────────────────────────────────
-        cmd_tess = [
-            "tesseract",
-            img_path,
-            ocr_output_base,
-            "-l", TESSERACT_LANG,
-            "--dpi", str(TESSERACT_DPI),
-            "--psm", "3",
-            "pdf",
-        ]
-        result = subprocess.run(cmd_tess, capture_output=True, text=True, timeout=180)
+        if OCR_IN_MEMORY or reuse_text_layer:
+            page_bytes = _extract_page_bytes(pdf_path, page_num)
+            with fitz.open(stream=page_bytes, filetype="pdf") as doc:
+                # ── Triagem: página com camada de texto nativa dispensa OCR ──
+                if reuse_text_layer and not pagina_precisa_ocr(doc[0]):
+                    with open(native_pdf, "wb") as fp:
+                        fp.write(page_bytes)
+                    result_pdf = native_pdf
+                    logging.debug(
+                        f"[HP-OCR] Página {page_num}: texto nativo reaproveitado (sem OCR)"
+                    )
+                    return {
+                        "page": page_num, "pdf": native_pdf,
+                        "success": True, "error": None, "ocr": False,
+                    }
 
-        if result.returncode != 0:
-            raise RuntimeError(
-                f"Tesseract falhou na página {page_num} "
-                f"(exit {result.returncode}): {result.stderr.strip()}"
-            )
-        if not os.path.isfile(ocr_output_pdf):
-            raise FileNotFoundError(
-                f"Tesseract não gerou PDF: {ocr_output_pdf}"
-            )
+                # ── Página em branco: mantém o fragmento, sem OCR ──────────
+                if OCR_IN_MEMORY and not _ocr_page_in_memory(
+                    doc[0], page_num, ocr_output_pdf
+                ):
+                    with open(native_pdf, "wb") as fp:
+                        fp.write(page_bytes)
+                    result_pdf = native_pdf
+                    logging.debug(f"[HP-OCR] Página {page_num}: em branco (sem OCR)")
+                    return {
+                        "page": page_num, "pdf": native_pdf,
+                        "success": True, "error": None, "ocr": False, "blank": True,
+                    }
+
+        if not OCR_IN_MEMORY and not _ocr_page_via_files(
+            pdf_path, page_num, page_pdf, img_path, ocr_output_base
+        ):
+            result_pdf = page_pdf
+            logging.debug(f"[HP-OCR] Página {page_num}: em branco (sem OCR)")
+            return {
+                "page": page_num, "pdf": page_pdf,
+                "success": True, "error": None, "ocr": False, "blank": True,
+            }
 
         logging.debug(f"[HP-OCR] Página {page_num}: OCR concluído com sucesso")
 
@@ -424,7 +526,10 @@ def _ocr_page(args: tuple) -> dict:
 
         # IMPORTANTE: marcamos como resultado para não deletar no finally
         result_pdf = ocr_output_pdf
-        return {"page": page_num, "pdf": ocr_output_pdf, "success": True, "error": None}
+        return {
+            "page": page_num, "pdf": ocr_output_pdf,
+            "success": True, "error": None, "ocr": True,
+        }
 
     except Exception as e:
         logging.error(f"[HP-OCR] Erro na página {page_num}: {e}")
@@ -443,8 +548,9 @@ def _ocr_page(args: tuple) -> dict:
                 except OSError:
                     pass
 
-        # 2. Limpar arquivos PDF e PNG (exceto o resultado)
-        for temp_file in [page_pdf, img_path]:
+        # 2. Limpar arquivos PDF e PNG (exceto o resultado): inclui o
+        # fragmento nativo e a saída do OCR se uma exceção veio depois de gravá-los
+        for temp_file in [page_pdf, img_path, native_pdf, ocr_output_pdf]:
             # Pula o arquivo que contém o resultado
             if temp_file == result_pdf:
                 continue
@@ -455,6 +561,63 @@ def _ocr_page(args: tuple) -> dict:
                     pass
 
 
+def _build_jpeg_page_pdf(
+    jpg_bytes: bytes,
+    w_px: int,
+    h_px: int,
+    w_pt: float,
+    h_pt: float,
+) -> bytes:
+    """Monta em memória um PDF de página única contendo apenas o JPEG."""
+    pdf_out   = pikepdf.Pdf.new()
+    # Dicionário explícito: com **kwargs o pikepdf recente grava "//Subtype"
+    image_obj = pdf_out.make_stream(
+        jpg_bytes,
+        pikepdf.Dictionary({
+            "/Type":             pikepdf.Name("/XObject"),
+            "/Subtype":          pikepdf.Name("/Image"),
+            "/Width":            w_px,
+            "/Height":           h_px,
+            "/ColorSpace":       pikepdf.Name("/DeviceRGB"),
+            "/BitsPerComponent": 8,
+            "/Filter":           pikepdf.Name("/DCTDecode"),
+        })
+    )
+    img_ref     = pdf_out.make_indirect(image_obj)
+    content_obj = pdf_out.make_indirect(
+        pdf_out.make_stream(
+            f"q {w_pt} 0 0 {h_pt} 0 0 cm /Im0 Do Q".encode()
+        )
+    )
+    page_dict = pikepdf.Dictionary(
+        Type=pikepdf.Name("/Page"),
+        MediaBox=pikepdf.Array(
+            [0, 0, Decimal(str(w_pt)), Decimal(str(h_pt))]
+        ),
+        Resources=pikepdf.Dictionary(
+            XObject=pikepdf.Dictionary(Im0=img_ref)
+        ),
+        Contents=content_obj,
+    )
+    pdf_out.pages.append(pikepdf.Page(pdf_out.make_indirect(page_dict)))
+
+    buf = io.BytesIO()
+    pdf_out.save(buf)
+    return buf.getvalue()
+
+
+def _ladder_is_monotonic(evaluated: dict[int, bytes | None]) -> bool:
+    """
+    Se as passadas avaliadas (índice → PDF, None = falhou) encolhem
+    estritamente ao longo da escada. Uma passada que falhou entre as
+    avaliadas também quebra a suposição da busca binária.
+    """
+    sizes = [evaluated[idx] for idx in sorted(evaluated)]
+    if any(data is None for data in sizes):
+        return False
+    return all(len(a) > len(b) for a, b in zip(sizes, sizes[1:]))
+
+
 def _compress_page_extra(
     page_pdf: str,
     gs_cfg: dict,
@@ -465,16 +628,20 @@ def _compress_page_extra(
 ) -> str:
     """
     Comprime uma página individual para ≤ PAGE_SIZE_LIMIT (500 KB) ou
-    PAGE_SIZE_LIMIT_SPLIT (1.5 MB) no modo light_mode.
+    PAGE_SIZE_LIMIT_SPLIT (1 MB) no modo light_mode.
+
+    Estratégia raster in-process (sem pdftoppm nem Ghostscript):
+        fitz renderiza a página UMA vez, no maior DPI da escada
+        → cada passada deriva sua imagem por downsampling em memória (PIL)
+        → JPEG em memória → pikepdf monta PDF de página única em BytesIO
 
-    Estratégia raster (sem Ghostscript):
-        pdftoppm renderiza a página como PNG
-        → PIL recomprime como JPEG
-        → pikepdf monta novo PDF de página única
+    As passadas (_DPI_PASSES ou _DPI_PASSES_SPLIT) vão da menos para a mais
+    agressiva. Em vez de percorrê-las em sequência, faz busca binária pela
+    passada menos agressiva que cabe no limite — o tamanho cai de forma
+    monotônica ao longo da escada. Se as passadas avaliadas contradizem essa
+    ordem, percorre a escada em sequência. Sem passada que caiba, fica a menor.
 
     Age em páginas acima do limite ou quando force_compress=True.
-    Tenta passadas progressivas
-    (_DPI_PASSES ou _DPI_PASSES_SPLIT) até atingir o limite ou esgotar as opções.
     Sobrescreve o arquivo original se a versão comprimida for menor.
 
     Nota: esta função opera sobre fragmentos de página única pós-OCR.
@@ -511,38 +678,52 @@ def _compress_page_extra(
 
     tmp_dir   = Path(work_dir or os.path.dirname(page_pdf))
     page_name = Path(page_pdf).name
-    best_path: str | None = None
-    best_size = current_size
-    last_valid_path: str | None = None  # ← Rastreia última versão não-branca boa
-
-    for pass_idx, (dpi, quality) in enumerate(dpi_passes, 1):
-        prefix = str(tmp_dir / f"_raster_{pass_idx}_{page_name}")
-
-        # Rasteriza via pdftoppm (sempre página 1 — fragmento é página única)
-        result = subprocess.run(
-            ["pdftoppm", "-f", "1", "-l", "1",
-             "-r", str(dpi), "-png", page_pdf, prefix],
-            capture_output=True, text=True, timeout=60,
-        )
-        if result.returncode != 0:
-            logging.warning(
-                f"[HP-OCR] pdftoppm falhou (passada {pass_idx}): "
-                f"{result.stderr[:120]}"
+
+    # ── 1. Renderiza uma única vez, no maior DPI da escada ───────────────
+    render_dpi = max(dpi for dpi, _ in dpi_passes)
+    try:
+        with fitz.open(page_pdf) as doc:
+            page = doc[0]
+            w_pt = round(page.rect.width, 2)
+            h_pt = round(page.rect.height, 2)
+            zoom = render_dpi / 72
+            pix = page.get_pixmap(
+                matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False
             )
-            continue
+        # Página já em branco na origem: a checagem de página branca nas
+        # candidatas não distingue nada e descartaria todas
+        source_blank = pixmap_is_blank(pix)
+        base_img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        del pix
+    except Exception as e:
+        logging.warning(
+            f"[HP-OCR] Falha ao renderizar {page_name} para compressão: {e}. "
+            f"Mantendo original ({current_size // 1024}KB)"
+        )
+        return page_pdf
 
-        png_files = sorted(tmp_dir.glob(f"_raster_{pass_idx}_{page_name}-*.png"))
-        if not png_files:
-            logging.warning(f"[HP-OCR] pdftoppm não gerou PNG (passada {pass_idx})")
-            continue
+    # ── 2. Avaliação de uma passada (downsampling + JPEG em memória) ─────
+    evaluated: dict[int, bytes | None] = {}
 
+    def _evaluate(idx: int) -> bytes | None:
+        if idx in evaluated:
+            return evaluated[idx]
+
+        pass_idx = idx + 1
+        dpi, quality = dpi_passes[idx]
+        pdf_bytes = None
         try:
-            img = Image.open(png_files[0]).convert("RGB")
+            if dpi == render_dpi:
+                img = base_img
+            else:
+                scale = dpi / render_dpi
+                img = base_img.resize(
+                    (max(1, round(base_img.width * scale)),
+                     max(1, round(base_img.height * scale))),
+                    Image.LANCZOS,
+                )
             w_px, h_px = img.size
-            w_pt = round(w_px * 72 / dpi, 2)
-            h_pt = round(h_px * 72 / dpi, 2)
 
-            # Recomprime como JPEG em memória
             buf = io.BytesIO()
             img.save(buf, format="JPEG", quality=quality, optimize=True)
             jpg_bytes = buf.getvalue()
@@ -553,157 +734,396 @@ def _compress_page_extra(
                     f"[HP-OCR] JPEG inválido gerado na passada {pass_idx}. "
                     f"Descartando passada."
                 )
-                continue
-
             # Sanity check: rejeita JPEG suspeito (< 1 KB = imagem corrompida/vazia)
-            if len(jpg_bytes) < 1024:
+            elif len(jpg_bytes) < 1024:
                 logging.warning(
                     f"[HP-OCR] JPEG gerado na passada {pass_idx} é suspeito "
                     f"({len(jpg_bytes)} bytes). Descartando passada."
                 )
-                continue
+            else:
+                pdf_bytes = _build_jpeg_page_pdf(jpg_bytes, w_px, h_px, w_pt, h_pt)
+                logging.info(
+                    f"[HP-OCR] Passada {pass_idx} ({dpi}dpi q{quality}): "
+                    f"{current_size // 1024}KB → {len(pdf_bytes) // 1024}KB"
+                )
+        except Exception as e:
+            logging.warning(f"[HP-OCR] Falha na passada {pass_idx}: {e}")
 
-            # Monta PDF de página única com pikepdf
-            pdf_out   = pikepdf.Pdf.new()
-            image_obj = pdf_out.make_stream(
-                jpg_bytes,
-                **{
-                    "/Type":             pikepdf.Name("/XObject"),
-                    "/Subtype":          pikepdf.Name("/Image"),
-                    "/Width":            w_px,
-                    "/Height":           h_px,
-                    "/ColorSpace":       pikepdf.Name("/DeviceRGB"),
-                    "/BitsPerComponent": 8,
-                    "/Filter":           pikepdf.Name("/DCTDecode"),
-                }
+        evaluated[idx] = pdf_bytes
+        return pdf_bytes
+
+    def _fits(idx: int) -> bool:
+        pdf_bytes = _evaluate(idx)
+        return pdf_bytes is not None and len(pdf_bytes) <= size_limit
+
+    # ── 3. Escolha da passada ────────────────────────────────────────────
+    if force_compress and not aggressive_selected:
+        # Recompressão forçada: avalia toda a escada e fica com a menor
+        for idx in range(len(dpi_passes)):
+            _evaluate(idx)
+    else:
+        # Busca binária pela passada menos agressiva que cabe no limite
+        lo, hi = 0, len(dpi_passes) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _fits(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        if not _fits(lo):
+            # Nenhuma cabe: garante a mais agressiva como candidata
+            _evaluate(len(dpi_passes) - 1)
+
+        # A busca supõe tamanho decrescente ao longo da escada. Se a passada
+        # escolhida não ficou menor que a vizinha menos agressiva (ou alguma
+        # avaliada contradiz a ordem), volta ao percurso linear da escada.
+        if lo > 0:
+            _evaluate(lo - 1)
+        if not _ladder_is_monotonic(evaluated):
+            logging.info(
+                f"[HP-OCR] {page_name}: tamanhos fora de ordem na escada. "
+                f"Percorrendo as passadas em sequência."
             )
-            img_ref     = pdf_out.make_indirect(image_obj)
-            content_obj = pdf_out.make_indirect(
-                pdf_out.make_stream(
-                    f"q {w_pt} 0 0 {h_pt} 0 0 cm /Im0 Do Q".encode()
-                )
+            for idx in range(len(dpi_passes)):
+                if _fits(idx):
+                    break
+
+    del base_img
+
+    fitting = sorted(
+        idx for idx, data in evaluated.items()
+        if data is not None and len(data) <= size_limit
+    )
+    others = sorted(
+        (idx for idx, data in evaluated.items()
+         if data is not None and idx not in fitting),
+        key=lambda i: len(evaluated[i]),
+    )
+    if force_compress and not aggressive_selected:
+        fitting.sort(key=lambda i: len(evaluated[i]))
+    candidates = [
+        idx for idx in fitting + others if len(evaluated[idx]) < current_size
+    ]
+
+    # ── 4. Aplica a melhor candidata válida (íntegra, ≥ 1 KB, não-branca) ─
+    for idx in candidates:
+        pass_idx = idx + 1
+        compressed_path = str(tmp_dir / f"_comp_{pass_idx}_{page_name}")
+        with open(compressed_path, "wb") as fp:
+            fp.write(evaluated[idx])
+        final_size = len(evaluated[idx])
+
+        # Validar integridade do PDF antes de sobrescrever
+        if not _validate_pdf_integrity(compressed_path):
+            logging.warning(
+                f"[HP-OCR] PDF comprimido inválido na passada {pass_idx}. "
+                f"Descartando."
             )
-            page_dict = pikepdf.Dictionary(
-                Type=pikepdf.Name("/Page"),
-                MediaBox=pikepdf.Array(
-                    [0, 0, Decimal(str(w_pt)), Decimal(str(h_pt))]
-                ),
-                Resources=pikepdf.Dictionary(
-                    XObject=pikepdf.Dictionary(Im0=img_ref)
-                ),
-                Contents=content_obj,
+            os.remove(compressed_path)
+            continue
+
+        # Sanity check final antes de sobrescrever (< 1 KB = suspeito)
+        if final_size < 1024:
+            logging.warning(
+                f"[HP-OCR] PDF comprimido na passada {pass_idx} é suspeito "
+                f"({final_size} bytes). Descartando."
             )
-            pdf_out.pages.append(pikepdf.Page(pdf_out.make_indirect(page_dict)))
+            os.remove(compressed_path)
+            continue
 
-            compressed_path = str(tmp_dir / f"_comp_{pass_idx}_{page_name}")
-            pdf_out.save(compressed_path)
-            new_size = os.path.getsize(compressed_path)
+        # ⚠️ CRÍTICO: Validar se NÃO ficou branca após compressão
+        if not source_blank and _detect_blank_pdf(compressed_path):
+            logging.warning(
+                f"[HP-OCR] PDF comprimido ficou BRANCA na passada {pass_idx}. "
+                f"Tentando próxima candidata."
+            )
+            os.remove(compressed_path)
+            continue
 
-            # Validar PDF comprimido antes de usar
-            if not _validate_pdf_integrity(compressed_path):
-                logging.warning(
-                    f"[HP-OCR] PDF comprimido inválido na passada {pass_idx}. "
-                    f"Descartando."
-                )
+        try:
+            os.replace(compressed_path, page_pdf)
+            limit_kb = size_limit // 1024
+            logging.info(
+                f"[HP-OCR] Compressão final: {current_size // 1024}KB → "
+                f"{final_size // 1024}KB (passada {pass_idx}/{len(dpi_passes)}, "
+                f"{len(evaluated)} avaliada(s)) "
+                f"({'OK ≤' + str(limit_kb) + 'KB' if final_size <= size_limit else 'AINDA >' + str(limit_kb) + 'KB'})"
+            )
+        except Exception as replace_err:
+            logging.error(f"[HP-OCR] Falha ao aplicar compressão: {replace_err}")
+            # Mantém original se sobrescrita falhar
+            if os.path.exists(compressed_path):
                 os.remove(compressed_path)
-                continue
+        return page_pdf
 
-            # ⚠️ CRÍTICO: Validar se NÃO ficou branca após compressão
-            if _detect_blank_pdf(compressed_path):
-                logging.warning(
-                    f"[HP-OCR] PDF comprimido ficou BRANCA na passada {pass_idx}. "
-                    f"VOLTANDO para última versão válida (passada anterior)."
-                )
-                os.remove(compressed_path)
-                # ⚠️ Se uma passada fica branca, usa a última válida que funcionou
-                # e para aqui (não tenta passadas mais agressivas)
-                if last_valid_path:
-                    logging.info(
-                        f"[HP-OCR] Usando passada anterior (não-branca): "
-                        f"{best_size // 1024}KB"
-                    )
-                    break
-                else:
-                    # Se nenhuma passada anterior funcionou, continua tentando outras
-                    continue
+    logging.warning(
+        f"[HP-OCR] Nenhuma passada reduziu o arquivo. "
+        f"Mantendo original ({current_size // 1024}KB)"
+    )
+    return page_pdf
 
-            # Sanity check: rejeita PDF comprimido suspeito (< 1 KB)
-            if new_size < 1024:
-                logging.warning(
-                    f"[HP-OCR] PDF comprimido na passada {pass_idx} é suspeito "
-                    f"({new_size} bytes). Descartando."
-                )
-                os.remove(compressed_path)
-                continue
 
-            logging.info(
-                f"[HP-OCR] Passada {pass_idx} ({dpi}dpi q{quality}): "
-                f"{current_size // 1024}KB → {new_size // 1024}KB"
+def _page_needs_distill(page_pdf: str, gs_cfg: dict) -> bool:
+    """
+    Decide se o fragmento precisa passar pelo Ghostscript na montagem
+    passthrough, pelo ganho real esperado:
+      - alguma imagem sem compressão com perdas (Flate, sem filtro): a
+        recodificação em JPEG reduz muito o tamanho
+      - alguma imagem com resolução efetiva acima de 1.5× o DPI do perfil
+        escolhido (mesmo limiar de reamostragem do pdfwrite) — ex.: página
+        renderizada para o OCR a TESSERACT_DPI num nível de 100 DPI
+
+    Imagens JPEG/JPX/JBIG2/CCITT até esse limiar seguem direto: o
+    Ghostscript não as reamostraria, e destilar cada uma num processo
+    custaria mais do que o ganho.
+    """
+    max_dpi = gs_cfg["dpi"] * _DOWNSAMPLE_THRESHOLD
+    with fitz.open(page_pdf) as doc:
+        page = doc[0]
+        for img in page.get_images(full=True):
+            xref, width, img_filter = img[0], img[2], img[8]
+            if img_filter not in _PASSTHROUGH_IMAGE_FILTERS:
+                return True
+            for rect in page.get_image_rects(xref):
+                if rect.width > 0 and width / (rect.width / 72) > max_dpi:
+                    return True
+    return False
+
+
+def _distill_page(page_pdf: str, gs_cfg: dict, work_dir: str) -> bool:
+    """
+    Passa um fragmento isolado pelo Ghostscript com o perfil escolhido.
+    Sobrescreve o fragmento apenas se o resultado for válido, não-branco e
+    menor. Retorna True se o fragmento foi substituído.
+    """
+    distilled = os.path.join(work_dir, f"_gs_{Path(page_pdf).name}")
+    try:
+        _merge_pdfs_ghostscript([page_pdf], distilled, gs_cfg, fit_a4=False)
+        if _detect_blank_pdf(distilled):
+            logging.warning(
+                f"[HP-OCR] Destilação GS gerou página BRANCA: {page_pdf}. "
+                f"Mantendo fragmento original."
             )
+            return False
+        if os.path.getsize(distilled) >= os.path.getsize(page_pdf):
+            return False
+        os.replace(distilled, page_pdf)
+        return True
+    finally:
+        if os.path.isfile(distilled):
+            os.remove(distilled)
 
-            # ⚠️ Registra esta passada como válida (não-branca)
-            if new_size < best_size:
-                if best_path and os.path.exists(best_path):
-                    os.remove(best_path)
-                best_path = compressed_path
-                best_size = new_size
-                last_valid_path = compressed_path  # ← Marca como versão válida
-                logging.debug(
-                    f"[HP-OCR] Nova melhor versão encontrada (não-branca): "
-                    f"passada {pass_idx}, tamanho {best_size // 1024}KB"
-                )
-            else:
-                os.remove(compressed_path)
 
-        except Exception as e:
-            logging.warning(f"[HP-OCR] Falha na passada {pass_idx}: {e}")
+def _compress_page_task(args: tuple) -> dict:
+    """
+    Worker da etapa de compressão por página (ProcessPoolExecutor).
+    Recebe (page_pdf, page_num, gs_cfg, work_dir, light_mode, selected_extra,
+    distill) e aplica no próprio worker:
+        1. _compress_page_extra (acima do limite ou marcada pelo usuário)
+        2. com distill=True (montagem passthrough), Ghostscript só se a
+           página precisar (_page_needs_distill)
 
-        finally:
-            for f in png_files:
-                f.unlink(missing_ok=True)
+    Returns:
+        dict com page, orig_kb, new_kb, compressed e distilled.
+    """
+    (page_pdf, page_num, gs_cfg, work_dir,
+     light_mode, selected_extra, distill) = args
+    size_limit = PAGE_SIZE_LIMIT_SPLIT if light_mode else PAGE_SIZE_LIMIT
+    orig_size  = os.path.getsize(page_pdf)
 
-        if best_size <= size_limit and (not force_compress or aggressive_selected):
-            break  # limite atingido — para aqui
+    compressed = orig_size > size_limit or selected_extra
+    if compressed:
+        _compress_page_extra(
+            page_pdf,
+            gs_cfg,
+            work_dir=work_dir,
+            light_mode=light_mode,
+            aggressive_selected=selected_extra,
+            force_compress=selected_extra,
+        )
 
-    # Aplica o melhor resultado (somente se houve melhora E arquivo é válido)
-    if best_path and os.path.exists(best_path):
-        final_size = os.path.getsize(best_path)
+    distilled = False
+    if distill and _page_needs_distill(page_pdf, gs_cfg):
+        distilled = _distill_page(page_pdf, gs_cfg, work_dir)
 
-        # Validar integridade do PDF melhor antes de sobrescrever
-        if not _validate_pdf_integrity(best_path):
-            logging.error(
-                f"[HP-OCR] Arquivo comprimido inválido/corrompido. "
-                f"Mantendo original para evitar página branca."
-            )
-            os.remove(best_path)
-            return page_pdf
+    return {
+        "page": page_num,
+        "orig_kb": orig_size // 1024,
+        "new_kb": os.path.getsize(page_pdf) // 1024,
+        "compressed": compressed,
+        "distilled": distilled,
+    }
 
-        if final_size >= 1024:  # sanity check final antes de sobrescrever
-            try:
-                os.replace(best_path, page_pdf)
-                limit_kb = size_limit // 1024
-                logging.info(
-                    f"[HP-OCR] Compressão final: {current_size // 1024}KB → "
-                    f"{final_size // 1024}KB "
-                    f"({'OK ≤' + str(limit_kb) + 'KB' if final_size <= size_limit else 'AINDA >' + str(limit_kb) + 'KB'})"
-                )
-            except Exception as replace_err:
-                logging.error(f"[HP-OCR] Falha ao aplicar compressão: {replace_err}")
-                # Mantém original se sobrescrita falhar
-                os.remove(best_path)
-        else:
-            logging.error(
-                f"[HP-OCR] Arquivo comprimido final suspeito ({final_size}B). "
-                f"Mantendo original para evitar página branca."
-            )
-            os.remove(best_path)
-    else:
-        logging.warning(
-            f"[HP-OCR] Nenhuma passada reduziu o arquivo. "
-            f"Mantendo original ({current_size // 1024}KB)"
+
+def _rotation_matrix(rotate: int, x0: float, y0: float, x1: float, y1: float) -> tuple:
+    """Matriz que leva a caixa da página, girada por /Rotate, para a origem."""
+    if rotate == 90:
+        return (0, -1, 1, 0, -y0, x1)
+    if rotate == 180:
+        return (-1, 0, 0, -1, x1, y1)
+    if rotate == 270:
+        return (0, 1, -1, 0, y1, -x0)
+    return (1, 0, 0, 1, -x0, -y0)
+
+
+def _apply_matrix(m: tuple, x: float, y: float) -> tuple[float, float]:
+    a, b, c, d, e, f = m
+    return a * x + c * y + e, b * x + d * y + f
+
+
+def _fit_page_a4(page: pikepdf.Page) -> None:
+    """
+    Ajusta a página ao A4 retrato como o -dPDFFitPage do Ghostscript: escala
+    para caber, centraliza e incorpora o /Rotate — só com um "cm" em volta
+    do conteúdo (nada é recodificado). Anotações acompanham a transformação.
+    """
+    x0, y0, x1, y1 = (float(v) for v in page.mediabox)
+    x0, x1 = min(x0, x1), max(x0, x1)
+    y0, y1 = min(y0, y1), max(y0, y1)
+    rotate = int(page.obj.get("/Rotate", 0)) % 360
+    w, h = (y1 - y0, x1 - x0) if rotate in (90, 270) else (x1 - x0, y1 - y0)
+    if w <= 0 or h <= 0:
+        return
+
+    a4_w, a4_h = _A4_POINTS
+    if rotate == 0 and x0 == 0 and y0 == 0 and abs(w - a4_w) < 1 and abs(h - a4_h) < 1:
+        return  # já é A4
+
+    scale = min(a4_w / w, a4_h / h)
+    tx, ty = (a4_w - w * scale) / 2, (a4_h - h * scale) / 2
+    rot = _rotation_matrix(rotate, x0, y0, x1, y1)
+    # Matriz final (rotação, depois escala + centralização)
+    m = tuple(v * scale for v in rot[:4]) + (rot[4] * scale + tx, rot[5] * scale + ty)
+
+    page.contents_add(
+        (
+            f"q {scale:.6f} 0 0 {scale:.6f} {tx:.4f} {ty:.4f} cm "
+            f"{' '.join(str(v) for v in rot)} cm\n"
+        ).encode(),
+        prepend=True,
+    )
+    page.contents_add(b"\nQ")
+
+    for annot in page.obj.get("/Annots", []):
+        rect = annot.get("/Rect") if isinstance(annot, pikepdf.Dictionary) else None
+        if not isinstance(rect, pikepdf.Array) or len(rect) != 4:
+            continue
+        ax0, ay0, ax1, ay1 = (float(v) for v in rect)
+        (px0, py0), (px1, py1) = _apply_matrix(m, ax0, ay0), _apply_matrix(m, ax1, ay1)
+        annot.Rect = pikepdf.Array([min(px0, px1), min(py0, py1), max(px0, px1), max(py0, py1)])
+
+    page.obj.MediaBox = pikepdf.Array([0, 0, a4_w, a4_h])
+    for key in ("/CropBox", "/TrimBox", "/BleedBox", "/ArtBox", "/Rotate"):
+        if key in page.obj:
+            del page.obj[key]
+
+
+class _OrderedAssembler:
+    """
+    Monta o documento em ordem de página à medida que os fragmentos ficam
+    prontos (OCR + compressão), em vez de esperar todas as páginas.
+
+    Fragmentos que chegam fora de ordem aguardam em `pending` até a sequência
+    ficar contígua. Ao ser anexado, o fragmento é lido para memória e removido
+    do RAM Disk. Os documentos de origem ficam abertos até o save porque o
+    qpdf copia os streams de forma preguiçosa — então, a cada
+    HP_ASSEMBLER_BUFFER_MB de fragmentos em memória, o documento montado é
+    gravado num checkpoint em work_dir e reaberto do arquivo, e as origens
+    são fechadas. A memória do processo fica limitada ao buffer, não ao
+    número de páginas.
+
+    Com fit_a4, cada página anexada é ajustada ao A4 (_fit_page_a4), como o
+    merge Ghostscript fazia no documento inteiro.
+    """
+
+    def __init__(self, total_pages: int, work_dir: str, fit_a4: bool = False):
+        self.total_pages = total_pages
+        self.fit_a4      = fit_a4
+        self.next_page   = 1
+        self.pending: dict[int, str] = {}
+        self._pdf        = pikepdf.Pdf.new()
+        self._sources: list[pikepdf.Pdf] = []
+        self._buffered   = 0  # bytes dos fragmentos abertos em memória
+        self._buffer_limit = int(HP_ASSEMBLER_BUFFER_MB * 1024 * 1024)
+        # Dois arquivos alternados: o checkpoint aberto não pode ser sobrescrito
+        self._checkpoints = [
+            os.path.join(work_dir, f"assembler_{i}_{uuid.uuid4().hex[:8]}.pdf")
+            for i in range(2)
+        ]
+        self._checkpoint_count = 0
+
+    @property
+    def assembled(self) -> int:
+        """Quantidade de páginas já anexadas (prefixo contíguo)."""
+        return self.next_page - 1
+
+    def add(self, page_num: int, fragment: str) -> None:
+        """Registra o fragmento da página e anexa o prefixo contíguo disponível."""
+        self.pending[page_num] = fragment
+        while self.next_page in self.pending:
+            self._append(self.pending.pop(self.next_page))
+            self.next_page += 1
+
+    def _append(self, fragment: str) -> None:
+        with open(fragment, "rb") as fp:
+            data = fp.read()
+        src = pikepdf.open(io.BytesIO(data))
+        first = len(self._pdf.pages)
+        self._pdf.pages.extend(src.pages)
+        self._sources.append(src)
+        self._buffered += len(data)
+        if self.fit_a4:
+            for idx in range(first, len(self._pdf.pages)):
+                _fit_page_a4(self._pdf.pages[idx])
+        try:
+            os.remove(fragment)
+        except OSError:
+            pass
+        if self._buffered >= self._buffer_limit and self.assembled + 1 < self.total_pages:
+            self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        """Grava o documento montado em disco, reabre do arquivo e fecha as origens."""
+        path = self._checkpoints[self._checkpoint_count % 2]
+        self._pdf.save(path)
+        self._close_documents()
+        self._pdf = pikepdf.open(path)
+        self._checkpoint_count += 1
+        self._buffered = 0
+        previous = self._checkpoints[self._checkpoint_count % 2]
+        if os.path.isfile(previous):
+            os.remove(previous)
+        logging.debug(
+            f"[HP-OCR] Montagem: checkpoint com {len(self._pdf.pages)} página(s)"
         )
 
-    return page_pdf
+    def finalize(self, output_path: str) -> None:
+        """
+        Grava o documento montado. Exige todas as páginas anexadas.
+
+        Toda página anexada passou pelo OCR (ou pela triagem de texto nativo
+        / página em branco): o documento sai com o marcador de OCR. No mesmo
+        job a divisão usa ocr_coverage; num reenvio, confere o marcador com a
+        camada de texto de cada página.
+        """
+        if self.assembled != self.total_pages:
+            raise RuntimeError(
+                f"Montagem incompleta: {self.assembled}/{self.total_pages} páginas"
+            )
+        marcar_ocr(self._pdf, range(1, self.total_pages + 1))
+        self._pdf.save(output_path)
+
+    def _close_documents(self) -> None:
+        for src in self._sources:
+            src.close()
+        self._sources.clear()
+        self._pdf.close()
+
+    def close(self) -> None:
+        self._close_documents()
+        for path in self._checkpoints:
+            if os.path.isfile(path):
+                os.remove(path)
 
 
 def _merge_pdfs_ghostscript(
@@ -711,11 +1131,15 @@ def _merge_pdfs_ghostscript(
     output_path: str,
     gs_cfg: dict,
     progress_callback=None,
+    fit_a4: bool = True,
 ) -> None:
     """
     Merge final de todos os fragmentos PDF usando Ghostscript com
     compressão agressiva. As imagens são re-comprimidas para reduzir
     drasticamente o tamanho.
+
+    fit_a4=False preserva o tamanho original das páginas (usado na destilação
+    de páginas isoladas da montagem passthrough).
     """
     gs = _locate_gs()
     cmd = [
@@ -730,9 +1154,10 @@ def _merge_pdfs_ghostscript(
         f"-dNumRenderingThreads={GS_RENDERING_THREADS}",
         f"-dBufferSpace={GS_BUFFER_SPACE}",
         "-dAutoRotatePages=/None",
-        "-sPAPERSIZE=a4",
-        "-dFIXEDMEDIA",
-        "-dPDFFitPage",
+    ]
+    if fit_a4:
+        cmd += ["-sPAPERSIZE=a4", "-dFIXEDMEDIA", "-dPDFFitPage"]
+    cmd += [
         "-dEmbedAllFonts=true",
         "-dSubsetFonts=true",
         "-dDownsampleColorImages=true",
@@ -789,7 +1214,10 @@ def _merge_pdfs_ghostscript(
                 "Ghostscript merge excedeu timeout de 600s. "
                 f"stderr: {(stderr or '').strip()[:300]}"
             )
-        time.sleep(1)
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
 
     _, stderr = proc.communicate()
     if proc.returncode != 0:
@@ -907,16 +1335,23 @@ def process_pdf_high_performance(
     compression_level: int | None = None,
     extra_compress_pages: list[int] | None = None,
     skip_extra_compression: bool = False,
+    reuse_text_layer: bool | None = None,
+    ocr_coverage: set | None = None,
 ) -> str:
     """
     Processa um PDF com OCR de alta performance usando paralelização massiva.
 
     Pipeline:
         1. Conta páginas do PDF de entrada
-        2. Cada worker (ProcessPoolExecutor) extrai sua página via pikepdf,
+        2. Cada worker (pool compartilhado, engines.scheduler) extrai sua página via pikepdf,
            faz triagem de texto e aplica OCR via fitz→PNG→tesseract se necessário
-        3. Comprime páginas acima de 500 KB via rasterização (pdftoppm + PIL)
-        4. Faz merge final (ghostscript) com flags otimizadas para Xeon
+        3. Em fluxo, página a página: assim que o OCR termina, páginas acima
+           de 500 KB são comprimidas via rasterização (fitz + PIL) no mesmo
+           pool, e cada fragmento pronto é anexado em ordem ao documento
+           montado (pikepdf), saindo do RAM Disk
+        4. Finaliza o documento montado: por padrão (HP_MERGE_MODE="passthrough")
+           sem recodificar imagens — só páginas que precisam passaram pelo
+           ghostscript no passo 3; no modo "ghostscript", re-destila tudo
         5. Passo extra de compressão GS se arquivo final > threshold
 
     Por que fitz→PNG→Tesseract (não OCRmyPDF):
@@ -928,12 +1363,23 @@ def process_pdf_high_performance(
         de compressão extra pós-merge — o chamador será responsável por dividir o
         arquivo em volumes, preservando qualidade.
 
+    reuse_text_layer: quando True, faz triagem por página (mesmo critério de
+        force_ocr.get_paginas_necessitam_ocr) e páginas que já são pesquisáveis
+        pulam o Tesseract, seguindo direto para a compressão com o texto
+        vetorial intacto. None usa HP_REUSE_TEXT_LAYER.
+
+    ocr_coverage: se informado, recebe (ao concluir com sucesso) as páginas
+        1-based do PDF final que passaram pelo OCR ou pela triagem nesta
+        execução — o chamador repassa ao split_pdf_only do mesmo job.
+
     Args:
         input_path:             Caminho absoluto do PDF de entrada.
         callback:               Função opcional callback(current_page, total_pages).
         compression_level:      Nível de compressão GS (1–7 ou DPI direto).
         extra_compress_pages:   Lista de páginas para compressão extra pelo usuário.
         skip_extra_compression: Se True, omite o passo GS extra pós-merge.
+        reuse_text_layer:       Se True, reaproveita texto nativo (sem OCR).
+        ocr_coverage:           Conjunto preenchido com as páginas cobertas.
 
     Returns:
         Caminho absoluto do PDF final otimizado (no diretório do input).
@@ -971,16 +1417,20 @@ def process_pdf_high_performance(
     output_path = os.path.join(input_dir, f"{input_stem}_hp_ocr.pdf")
 
     logging.info(
-        f"[HP-OCR] Início | input={input_path} | workers={MAX_WORKERS} | "
+        f"[HP-OCR] Início | input={input_path} | "
         f"ramdisk={work_dir}"
     )
 
+    if reuse_text_layer is None:
+        reuse_text_layer = HP_REUSE_TEXT_LAYER
+
     gs_cfg          = _resolve_gs_compression(compression_level)
     extra_pages_set = set(extra_compress_pages) if extra_compress_pages else set()
     logging.info(
         f"[HP-OCR] Compressão GS | nível={compression_level} | "
         f"dpi={gs_cfg['dpi']} | perfil={gs_cfg['pdf_settings']} | "
-        f"páginas_extra={sorted(extra_pages_set) if extra_pages_set else 'nenhuma'}"
+        f"páginas_extra={sorted(extra_pages_set) if extra_pages_set else 'nenhuma'} | "
+        f"reaproveitar_texto={reuse_text_layer}"
     )
 
     try:
@@ -1001,201 +1451,251 @@ def process_pdf_high_performance(
             logging.warning("[HP-OCR] PDF com 0 páginas. Retornando cópia.")
             return output_path
 
-        # ── 2. Processamento paralelo (pikepdf + OCRmyPDF) ─────────────
+        # ── 2. Pipeline em fluxo: OCR → compressão → montagem ──────────
+        #
+        # Cada página segue adiante assim que termina a etapa anterior:
+        # OCR concluído → compressão no mesmo pool (se acima do limite ou
+        # marcada pelo usuário) → montagem incremental em ordem. O escalonador
+        # limita as tarefas em voo (engines.autoscale) e a compressão fura a
+        # fila de OCR, então o RAM Disk não acumula fragmentos.
+        #
+        # Compressão aplicada em DUAS situações (união):
+        #   a) Páginas selecionadas explicitamente pelo usuário (extra_pages_set)
+        #   b) TODAS as páginas — qualquer fragmento acima do limite
+        #
+        # No modo dividir (skip_extra_compression=True), usa compressão mais leve
+        # (limite 1 MB) pois a divisão em volumes vai distribuir o tamanho.
+        #
+        # Na montagem passthrough toda página passa pela tarefa de compressão,
+        # que também decide se ela precisa de Ghostscript (_page_needs_distill).
+        light_mode  = skip_extra_compression
+        page_limit  = PAGE_SIZE_LIMIT_SPLIT if light_mode else PAGE_SIZE_LIMIT
+        passthrough = HP_MERGE_MODE == "passthrough"
+        logging.info(
+            f"[HP-OCR] Pipeline em fluxo | compressão por página "
+            f"(limite {page_limit // 1024} KB, light_mode={light_mode}) | "
+            f"montagem={HP_MERGE_MODE}"
+        )
+
         tasks = [
-            (input_path, page_num, work_dir)
+            (input_path, page_num, work_dir, reuse_text_layer)
             for page_num in range(1, total_pages + 1)
         ]
 
-        results      = [None] * total_pages
-        completed    = 0
-        failed_pages = []
+        results           = [None] * total_pages
+        failed_pages      = []
+        ocr_done          = 0
+        pages_prontas     = 0  # OCR + compressão concluídos
+        pages_comprimidas = 0
+        pages_destiladas  = 0
+        # No modo "ghostscript" o merge final já ajusta ao A4
+        assembler         = _OrderedAssembler(
+            total_pages, work_dir, fit_a4=passthrough and HP_FIT_A4
+        )
+        assembled_path    = os.path.join(work_dir, "assembled.pdf")
 
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=MAX_WORKERS
-        ) as executor:
-            future_to_page = {
-                executor.submit(_ocr_page, task): task[1]
-                for task in tasks
-            }
+        def _report_pipeline() -> None:
+            detail = (
+                f"{ocr_done}/{total_pages} OCR, {pages_comprimidas} comprimidas, "
+                f"{assembler.assembled} montadas"
+            )
+            if ocr_done < total_pages:
+                _emit_progress(
+                    callback, ocr_done, total_pages,
+                    stage="ocr_pages", label="OCR por página", detail=detail,
+                )
+            else:
+                _emit_progress(
+                    callback, pages_prontas, total_pages,
+                    stage="page_compress", label="Compressão por página", detail=detail,
+                )
 
-            for future in concurrent.futures.as_completed(future_to_page):
-                page_num = future_to_page[future]
-                try:
-                    result = future.result(timeout=300)
-                    results[page_num - 1] = result
-                    if not result["success"]:
-                        failed_pages.append(page_num)
-                        logging.warning(
-                            f"[HP-OCR] Página {page_num} falhou: {result['error']}"
-                        )
-                except Exception as e:
-                    failed_pages.append(page_num)
-                    results[page_num - 1] = {
-                        "page": page_num, "pdf": None,
-                        "success": False, "error": str(e),
-                    }
-                    logging.error(
-                        f"[HP-OCR] Exceção no worker da página {page_num}: {e}"
-                    )
-                finally:
-                    completed += 1
-                    _emit_progress(
-                        callback,
-                        completed,
-                        total_pages,
-                        stage="ocr_pages",
-                        label="OCR por página",
-                        detail=f"{completed}/{total_pages} páginas processadas",
+        try:
+            # Pool compartilhado do processo (engines.scheduler): concorrência
+            # global limitada e páginas intercaladas com as de outras tarefas.
+            # A compressão entra com prioridade para o pipeline seguir em fluxo.
+            with get_scheduler().open_job(
+                f"HP-OCR {Path(input_path).name}", total_pages=total_pages
+            ) as job:
+                in_flight = {
+                    job.submit(_ocr_page, task): ("ocr", task[1])
+                    for task in tasks
+                }  # future → ("ocr" | "compress", page_num)
+
+                while in_flight:
+                    done, _ = concurrent.futures.wait(
+                        in_flight, return_when=concurrent.futures.FIRST_COMPLETED
                     )
+                    for future in done:
+                        kind, page_num = in_flight.pop(future)
+
+                        if kind == "ocr":
+                            ocr_done += 1
+                            try:
+                                result = future.result()
+                            except Exception as e:
+                                result = {
+                                    "page": page_num, "pdf": None,
+                                    "success": False, "error": str(e),
+                                }
+                                logging.error(
+                                    f"[HP-OCR] Exceção no worker da página {page_num}: {e}"
+                                )
+                            results[page_num - 1] = result
+
+                            if not (result["success"] and result["pdf"]
+                                    and os.path.isfile(result["pdf"])):
+                                failed_pages.append(page_num)
+                                logging.warning(
+                                    f"[HP-OCR] Página {page_num} falhou: {result['error']}"
+                                )
+                                continue
+
+                            selected_extra = page_num in extra_pages_set
+                            if (passthrough or selected_extra
+                                    or os.path.getsize(result["pdf"]) > page_limit):
+                                compress_task = (
+                                    result["pdf"], page_num, gs_cfg, work_dir,
+                                    light_mode, selected_extra, passthrough,
+                                )
+                                in_flight[
+                                    job.submit(_compress_page_task, compress_task, priority=True)
+                                ] = ("compress", page_num)
+                                continue
+                        else:
+                            try:
+                                info = future.result()
+                                pages_comprimidas += info["compressed"]
+                                pages_destiladas  += info["distilled"]
+                                if info["compressed"] or info["distilled"]:
+                                    logging.info(
+                                        f"[HP-OCR] Pág. {page_num}: "
+                                        f"{info['orig_kb']}KB → {info['new_kb']}KB"
+                                        f"{' (GS)' if info['distilled'] else ''}"
+                                    )
+                            except Exception as e:
+                                # Fragmento original continua válido: segue sem compressão
+                                logging.error(
+                                    f"[HP-OCR] Falha ao comprimir página {page_num}: {e}. "
+                                    f"Mantendo fragmento original."
+                                )
+
+                        pages_prontas += 1
+                        assembler.add(page_num, results[page_num - 1]["pdf"])
+
+                    _report_pipeline()
+
+            # ── 3. Diagnóstico e montagem final (em ordem) ──────────────
+            page_statuses = [
+                (r["page"], "OK" if r["success"] else "FALHA")
+                for r in results if r
+            ]
+            if len(failed_pages) == total_pages:
+                raise RuntimeError(
+                    f"Nenhuma página foi processada com sucesso. "
+                    f"Falhas: {len(failed_pages)}/{total_pages}"
+                )
 
-        # ── 3. Coleta dos fragmentos bem-sucedidos (na ordem) ───────────
-        pdf_fragments      = []
-        page_statuses      = []  # (page_num, status) para diagnóstico
+            blank_pages = sum(1 for r in results if r and r.get("blank"))
+            if blank_pages:
+                logging.info(
+                    f"[HP-OCR] {blank_pages}/{total_pages} página(s) em branco "
+                    f"mantidas sem OCR"
+                )
 
-        for r in results:
-            if r and r["success"] and r["pdf"] and os.path.isfile(r["pdf"]):
-                pdf_fragments.append(r["pdf"])
-                page_statuses.append((r["page"], "OK"))
-            elif r:
-                page_num = r["page"]
-                failed_pages.append(page_num)
-                page_statuses.append((page_num, "FALHA"))
+            if reuse_text_layer:
+                native_pages = sum(
+                    1 for r in results
+                    if r and r.get("ocr") is False and not r.get("blank")
+                )
+                logging.info(
+                    f"[HP-OCR] Texto nativo reaproveitado em {native_pages}/{total_pages} "
+                    f"página(s); OCR em {total_pages - native_pages}"
+                )
 
-        if not pdf_fragments:
-            raise RuntimeError(
-                f"Nenhuma página foi processada com sucesso. "
-                f"Falhas: {len(failed_pages)}/{total_pages}"
-            )
+            # Log de diagnóstico completo
+            statuses_str = ", ".join(f"pág{p}:{s}" for p, s in sorted(page_statuses))
+            logging.info(f"[HP-OCR] Status de páginas: {statuses_str}")
 
-        # Log de diagnóstico completo
-        statuses_str = ", ".join(f"pág{p}:{s}" for p, s in sorted(page_statuses))
-        logging.info(f"[HP-OCR] Status de páginas: {statuses_str}")
+            if failed_pages:
+                raise RuntimeError(
+                    f"[HP-OCR] {len(failed_pages)} página(s) falharam no OCR: "
+                    f"{sorted(failed_pages)}"
+                )
 
-        if failed_pages:
-            raise RuntimeError(
-                f"[HP-OCR] {len(failed_pages)} página(s) falharam no OCR: {failed_pages}"
+            logging.info(
+                f"[HP-OCR] Compressão de páginas concluída: "
+                f"{pages_comprimidas} de {total_pages} fragmentos processados"
+                f"{f', {pages_destiladas} destilados via GS' if passthrough else ''}"
             )
+            assembler.finalize(assembled_path)
+        finally:
+            assembler.close()
 
-        # ── 3b. Compressão por página ───────────────────────────────────
-        #
-        # Aplica em DUAS situações (união):
-        #   a) Páginas selecionadas explicitamente pelo usuário (extra_pages_set)
-        #   b) TODAS as páginas — qualquer fragmento acima do limite
-        #
-        # No modo dividir (skip_extra_compression=True), usa compressão mais leve
-        # (limite 1.5 MB) pois a divisão em volumes vai distribuir o tamanho.
-        light_mode = skip_extra_compression
-        page_limit = PAGE_SIZE_LIMIT_SPLIT if light_mode else PAGE_SIZE_LIMIT
-        logging.info(
-            f"[HP-OCR] Compressão por página "
-            f"(limite {page_limit // 1024} KB, light_mode={light_mode})..."
-        )
-        pages_comprimidas = 0
-        pages_avaliadas = 0
-        total_avaliacoes = len(results)
-
-        for r in results:
-            if not (r and r["success"] and r["pdf"] and os.path.isfile(r["pdf"])):
-                pages_avaliadas += 1
-                _emit_progress(
-                    callback,
-                    pages_avaliadas,
-                    max(1, total_avaliacoes),
-                    stage="page_compress",
-                    label="Compressão por página",
-                    detail=(
-                        f"{pages_avaliadas}/{total_avaliacoes} páginas avaliadas "
-                        f"({pages_comprimidas} comprimidas)"
-                    ),
-                )
-                continue
+        # ── 4. Finalização ──────────────────────────────────────────────
+        # O documento já chega montado. Na montagem passthrough ele é o
+        # resultado (imagens intactas, sem recodificação); o Ghostscript
+        # sobre o documento inteiro fica como modo "ghostscript" e como
+        # fallback caso a montagem gere um PDF inválido.
+        merged_tmp = os.path.join(work_dir, "merged_final.pdf")
+        merge_eta = max(12, min(180, int(total_pages * 0.7)))
 
-            frag           = r["pdf"]
-            frag_size      = os.path.getsize(frag)
-            selected_extra = r["page"] in extra_pages_set
-            needs_compress = (
-                frag_size > page_limit
-                or selected_extra
+        if passthrough:
+            _emit_progress(
+                callback,
+                0,
+                1,
+                stage="merge",
+                label="Mesclando páginas",
+                detail="Montagem sem recodificação",
             )
-
-            if not needs_compress:
-                pages_avaliadas += 1
+            if _validate_pdf_integrity(assembled_path):
+                os.replace(assembled_path, merged_tmp)
                 _emit_progress(
                     callback,
-                    pages_avaliadas,
-                    max(1, total_avaliacoes),
-                    stage="page_compress",
-                    label="Compressão por página",
-                    detail=(
-                        f"{pages_avaliadas}/{total_avaliacoes} páginas avaliadas "
-                        f"({pages_comprimidas} comprimidas)"
-                    ),
+                    1,
+                    1,
+                    stage="merge",
+                    label="Mesclando páginas",
+                    detail="Mesclagem concluída",
                 )
-                continue
+            else:
+                logging.warning(
+                    "[HP-OCR] Montagem passthrough inválida. "
+                    "Usando merge Ghostscript como fallback."
+                )
+                passthrough = False
 
-            orig_kb = frag_size // 1024
-            _compress_page_extra(
-                frag,
-                gs_cfg,
-                work_dir=work_dir,
-                light_mode=light_mode,
-                aggressive_selected=selected_extra,
-                force_compress=selected_extra,
-            )
-            new_kb = os.path.getsize(frag) // 1024
-            pages_comprimidas += 1
-            pages_avaliadas += 1
-            logging.info(f"[HP-OCR] Pág. {r['page']}: {orig_kb}KB → {new_kb}KB")
+        if not passthrough:
             _emit_progress(
                 callback,
-                pages_avaliadas,
-                max(1, total_avaliacoes),
-                stage="page_compress",
-                label="Compressão por página",
-                detail=(
-                    f"{pages_avaliadas}/{total_avaliacoes} páginas avaliadas "
-                    f"({pages_comprimidas} comprimidas)"
+                0,
+                merge_eta,
+                stage="merge",
+                label="Mesclando páginas",
+                detail="Finalizando documento montado",
+            )
+            _merge_pdfs_ghostscript(
+                [assembled_path],
+                merged_tmp,
+                gs_cfg,
+                progress_callback=lambda elapsed: _emit_progress(
+                    callback,
+                    min(elapsed, merge_eta),
+                    merge_eta,
+                    stage="merge",
+                    label="Mesclando páginas",
+                    detail=f"Mesclagem em andamento ({elapsed}s)",
                 ),
             )
-
-        logging.info(
-            f"[HP-OCR] Compressão de páginas concluída: "
-            f"{pages_comprimidas} de {len(pdf_fragments)} fragmentos processados"
-        )
-
-        # ── 4. Merge final com Ghostscript ─────────────────────────────
-        merged_tmp = os.path.join(work_dir, "merged_final.pdf")
-        merge_eta = max(12, min(180, int(total_pages * 0.7)))
-        _emit_progress(
-            callback,
-            0,
-            merge_eta,
-            stage="merge",
-            label="Mesclando páginas",
-            detail="Unificando fragmentos do OCR",
-        )
-        _merge_pdfs_ghostscript(
-            pdf_fragments,
-            merged_tmp,
-            gs_cfg,
-            progress_callback=lambda elapsed: _emit_progress(
+            _emit_progress(
                 callback,
-                min(elapsed, merge_eta),
+                merge_eta,
                 merge_eta,
                 stage="merge",
                 label="Mesclando páginas",
-                detail=f"Mesclagem em andamento ({elapsed}s)",
-            ),
-        )
-        _emit_progress(
-            callback,
-            merge_eta,
-            merge_eta,
-            stage="merge",
-            label="Mesclando páginas",
-            detail="Mesclagem concluída",
-        )
+                detail="Mesclagem concluída",
+            )
 
         # Validar PDF após merge (função _merge_pdfs_ghostscript já valida, mas dupla-check)
         if not _validate_pdf_integrity(merged_tmp):
@@ -1204,6 +1704,9 @@ def process_pdf_high_performance(
         if not os.path.isfile(merged_tmp):
             raise RuntimeError("Ghostscript não gerou o arquivo de merge final.")
 
+        if os.path.isfile(assembled_path):
+            os.remove(assembled_path)
+
         merged_size_mb = os.path.getsize(merged_tmp) / (1024 * 1024)
         logging.info(f"[HP-OCR] Merge concluído: {merged_size_mb:.2f} MB")
 
@@ -1294,6 +1797,10 @@ def process_pdf_high_performance(
             detail=f"{total_pages} páginas processadas",
         )
 
+        # Qualquer falha de página aborta acima: todas passaram pelo OCR/triagem
+        if ocr_coverage is not None:
+            ocr_coverage.update(range(1, total_pages + 1))
+
         return output_path
 
     except Exception:
@@ -0,0 +1,239 @@
+"""
+Backends de OCR por página usados pelo motor HP-OCR.
+
+O binário `tesseract` recarrega os modelos (por+eng) a cada chamada — em
+páginas leves isso custa tanto quanto o próprio reconhecimento. Quando o
+tesserocr (API C do Tesseract) está instalado, cada processo worker mantém
+uma instância persistente da API, criada uma única vez no initializer do
+pool, e gera o mesmo PDF pesquisável de página única via renderer PDF.
+
+Sem tesserocr (ou se a API falhar), o OCR volta para o binário via
+subprocess, exatamente como antes.
+
+`ocr_pixmap_to_pdf` recebe o pixmap já renderizado pelo fitz e o entrega ao
+OCR em memória (PIL para a API; PNM sem compressão via stdin para o binário),
+sem PNG intermediário em disco.
+"""
+
+import os
+import logging
+import subprocess
+
+from PIL import Image
+
+from engines.constants import (
+    OCR_BACKEND,
+    TESSERACT_LANG,
+    TESSERACT_DPI,
+    TESSERACT_TIMEOUT,
+)
+
+try:
+    import tesserocr  # opcional: OCR in-process com modelos persistentes
+except ImportError:
+    tesserocr = None
+
+# Estado por processo worker (cada worker tem sua própria instância)
+_api = None
+_api_failed = False
+
+
+def _get_api():
+    """Retorna a instância persistente da API do Tesseract (ou None)."""
+    global _api, _api_failed
+
+    if _api is not None or _api_failed:
+        return _api
+
+    if OCR_BACKEND == "subprocess":
+        _api_failed = True
+        return None
+
+    if tesserocr is None:
+        _api_failed = True
+        if OCR_BACKEND == "tesserocr":
+            logging.warning(
+                "[HP-OCR] OCR_BACKEND=tesserocr, mas o módulo não está instalado. "
+                "Usando binário tesseract."
+            )
+        return None
+
+    try:
+        api = tesserocr.PyTessBaseAPI(lang=TESSERACT_LANG, psm=tesserocr.PSM.AUTO)
+        api.SetVariable("tessedit_create_pdf", "1")
+        api.SetVariable("user_defined_dpi", str(TESSERACT_DPI))
+        _api = api
+        logging.info(
+            f"[HP-OCR] Worker {os.getpid()}: API Tesseract carregada "
+            f"(lang={TESSERACT_LANG}, tesserocr)"
+        )
+    except Exception as e:
+        _api_failed = True
+        logging.warning(
+            f"[HP-OCR] Falha ao inicializar tesserocr ({e}). Usando binário tesseract."
+        )
+
+    return _api
+
+
+def init_ocr_worker() -> None:
+    """
+    Initializer do ProcessPoolExecutor.
+    Carrega os modelos do Tesseract uma única vez por processo worker.
+    """
+    _get_api()
+
+
+def warm_up() -> None:
+    """
+    Reconhecimento mínimo numa imagem em branco para tocar os modelos (LSTM)
+    na subida do worker, antes da primeira página real.
+    """
+    api = _get_api()
+    if api is None:
+        return
+    try:
+        api.SetImage(Image.new("L", (64, 32), 255))
+        api.GetUTF8Text()
+        api.Clear()
+    except Exception as e:
+        logging.debug(f"[HP-OCR] Aquecimento do tesserocr falhou: {e}")
+
+
+def backend_name() -> str:
+    """Nome do backend efetivo neste processo ("tesserocr" ou "subprocess")."""
+    return "tesserocr" if _get_api() is not None else "subprocess"
+
+
+def _ocr_tesserocr(api, img_path: str, output_base: str) -> None:
+    """OCR via API persistente. Gera `{output_base}.pdf`."""
+    ok = api.ProcessPages(output_base, img_path, timeout=TESSERACT_TIMEOUT * 1000)
+    if not ok:
+        raise RuntimeError("tesserocr.ProcessPages retornou falha")
+
+
+def _tess_cmd(input_arg: str, output_arg: str) -> list:
+    return [
+        "tesseract",
+        input_arg,
+        output_arg,
+        "-l", TESSERACT_LANG,
+        "--dpi", str(TESSERACT_DPI),
+        "--psm", "3",
+        "pdf",
+    ]
+
+
+def _ocr_subprocess(img_path: str, output_base: str, page_num: int) -> None:
+    """OCR via binário tesseract (um processo por página). Gera `{output_base}.pdf`."""
+    cmd_tess = _tess_cmd(img_path, output_base)
+    result = subprocess.run(
+        cmd_tess, capture_output=True, text=True, timeout=TESSERACT_TIMEOUT
+    )
+
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"Tesseract falhou na página {page_num} "
+            f"(exit {result.returncode}): {result.stderr.strip()}"
+        )
+
+
+def ocr_image_to_pdf(img_path: str, output_base: str, page_num: int) -> str:
+    """
+    Executa OCR de uma imagem e gera um PDF pesquisável de página única.
+
+    Tenta a API persistente (tesserocr) e, em caso de falha, o binário
+    tesseract via subprocess.
+
+    Args:
+        img_path:    Caminho da imagem da página.
+        output_base: Caminho de saída sem extensão.
+        page_num:    Número da página (apenas para logs/erros).
+
+    Returns:
+        Caminho do PDF gerado (`{output_base}.pdf`).
+    """
+    output_pdf = f"{output_base}.pdf"
+
+    api = _get_api()
+    if api is not None:
+        try:
+            _ocr_tesserocr(api, img_path, output_base)
+            if os.path.isfile(output_pdf):
+                return output_pdf
+            logging.warning(
+                f"[HP-OCR] Página {page_num}: tesserocr não gerou PDF. "
+                f"Tentando binário tesseract."
+            )
+        except Exception as e:
+            logging.warning(
+                f"[HP-OCR] Página {page_num}: tesserocr falhou ({e}). "
+                f"Tentando binário tesseract."
+            )
+
+    _ocr_subprocess(img_path, output_base, page_num)
+
+    if not os.path.isfile(output_pdf):
+        raise FileNotFoundError(f"Tesseract não gerou PDF: {output_pdf}")
+    return output_pdf
+
+
+def _pixmap_to_pil(pix) -> Image.Image:
+    """Converte um fitz.Pixmap (sem alpha) em PIL.Image sem recodificar."""
+    mode = "L" if pix.n == 1 else "RGB"
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+
+def ocr_pixmap_to_pdf(pix, output_pdf: str, page_num: int) -> str:
+    """
+    Executa OCR de um pixmap em memória e grava o PDF pesquisável de página única.
+
+    O pixmap nunca passa por PNG: a API persistente recebe um PIL.Image
+    construído sobre os samples, e o binário recebe PNM (PGM/PPM, sem
+    compressão) via stdin, devolvendo o PDF via stdout.
+
+    Args:
+        pix:        fitz.Pixmap sem canal alpha (cinza ou RGB).
+        output_pdf: Caminho do PDF de saída (deve terminar em .pdf).
+        page_num:   Número da página (apenas para logs/erros).
+
+    Returns:
+        Caminho do PDF gerado (`output_pdf`).
+    """
+    output_base = output_pdf[:-4] if output_pdf.endswith(".pdf") else output_pdf
+
+    api = _get_api()
+    if api is not None:
+        try:
+            ok = api.ProcessPage(
+                output_base, _pixmap_to_pil(pix), 0, "",
+                timeout=TESSERACT_TIMEOUT * 1000,
+            )
+            if ok and os.path.isfile(output_pdf):
+                return output_pdf
+            logging.warning(
+                f"[HP-OCR] Página {page_num}: tesserocr não gerou PDF. "
+                f"Tentando binário tesseract."
+            )
+        except Exception as e:
+            logging.warning(
+                f"[HP-OCR] Página {page_num}: tesserocr falhou ({e}). "
+                f"Tentando binário tesseract."
+            )
+
+    result = subprocess.run(
+        _tess_cmd("stdin", "stdout"),
+        input=pix.tobytes("pnm"),
+        capture_output=True,
+        timeout=TESSERACT_TIMEOUT,
+    )
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(
+            f"Tesseract falhou na página {page_num} "
+            f"(exit {result.returncode}): "
+            f"{result.stderr.decode(errors='replace').strip()}"
+        )
+
+    with open(output_pdf, "wb") as fp:
+        fp.write(result.stdout)
+    return output_pdf
@@ -0,0 +1,326 @@
+"""
+Perfil das páginas de um PDF, calculado numa única passada.
+
+Antes, cada análise reabria o documento e recalculava os mesmos fatos:
+a triagem de OCR (force_ocr.get_paginas_necessitam_ocr) extraía texto e
+imagens, o filtro de tamanho (get_paginas_seguras_para_ocr) salvava um PDF
+temporário por página, a análise de /test/analisar e os pesos da divisão em
+volumes percorriam o grafo de objetos. O PageProfile reúne tudo:
+
+  - texto: caracteres e palavras (texto nativo, sem espaços nas pontas)
+  - imagens: quantidade e área ocupada, área da página
+  - bytes: tamanho estimado da página isolada (único + compartilhado) e os
+    objetos alcançados por ela (engines.page_weights), para somar volumes
+
+Os dados ficam em arrays (módulo array), um por campo. O perfil é guardado
+por SHA-256 do conteúdo: em memória (LRU por processo) e em disco
+(PAGE_PROFILE_DIR, um arquivo por hash, evicção LRU por tamanho). Qualquer
+alteração no PDF muda o hash, então uma entrada nunca fica desatualizada.
+
+Formato em disco: 4 bytes (tamanho do cabeçalho, little-endian), cabeçalho
+JSON com versão e {campo: [typecode, itens]}, e os arrays na mesma ordem.
+"""
+
+import os
+import io
+import json
+import uuid
+import array
+import logging
+import threading
+import collections
+
+import fitz
+
+from engines.page_weights import page_object_sets, _DOC_OVERHEAD
+from engines.result_cache import file_sha256
+from engines.constants import (
+    LIMITE_CHARS_OCR,
+    MIN_IMAGE_AREA_RATIO,
+    PAGE_PROFILE_DIR,
+    PAGE_PROFILE_CACHE_MAX_MB,
+    PAGE_PROFILE_MEMORY_ENTRIES,
+)
+
+# Versão do formato/critério: incremente para invalidar perfis em disco
+PROFILE_VERSION = 2
+
+# Campos por página ("I" = inteiro sem sinal de 4 bytes, "d" = double).
+# obj_offsets tem count + 1 itens: os objetos da página i são
+# obj_index[obj_offsets[i]:obj_offsets[i + 1]], índices em obj_size.
+_FIELDS = (
+    ("text_chars", "I"),
+    ("words", "I"),
+    ("image_count", "I"),
+    ("image_area", "d"),
+    ("page_area", "d"),
+    ("page_bytes", "I"),
+    ("unique_bytes", "I"),
+    ("shared_bytes", "I"),
+    ("obj_offsets", "I"),
+    ("obj_index", "I"),
+    ("obj_size", "I"),
+)
+
+_memory: collections.OrderedDict[str, "PageProfile"] = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def measure_page(page: fitz.Page) -> tuple[int, int, int, float, float]:
+    """
+    Fatos de uma página usados na triagem de OCR.
+
+    Returns:
+        (caracteres de texto, palavras, imagens, área das imagens, área da página)
+    """
+    texto = page.get_text().strip()
+
+    imagens = page.get_images(full=True)
+    imagem_area = 0.0
+    for img in imagens:
+        try:
+            for rect in page.get_image_rects(img[0]):
+                imagem_area += rect.width * rect.height
+        except Exception:
+            pass
+
+    page_area = page.rect.width * page.rect.height
+    return len(texto), len(texto.split()), len(imagens), imagem_area, page_area
+
+
+def needs_ocr(
+    words: int,
+    image_count: int,
+    image_area: float,
+    page_area: float,
+    limite: int = LIMITE_CHARS_OCR,
+) -> bool:
+    """
+    Critério de OCR: imagem dominante (> MIN_IMAGE_AREA_RATIO da área da
+    página) e pouco texto nativo (menos de `limite` palavras).
+    """
+    dominante = page_area > 0 and image_area > page_area * MIN_IMAGE_AREA_RATIO
+    return image_count > 0 and dominante and words < limite
+
+
+class PageProfile:
+    """Fatos de todas as páginas de um PDF, em arrays indexados pela página (0-based)."""
+
+    __slots__ = ("count",) + tuple(name for name, _ in _FIELDS)
+
+    def __init__(self, count: int, **fields: array.array):
+        self.count = count
+        for name, code in _FIELDS:
+            setattr(self, name, fields.get(name, array.array(code)))
+
+    def needs_ocr(self, i: int, limite: int = LIMITE_CHARS_OCR) -> bool:
+        """Se a página i (0-based) precisa de OCR (mesmo critério de force_ocr)."""
+        return needs_ocr(
+            self.words[i], self.image_count[i], self.image_area[i], self.page_area[i], limite
+        )
+
+    def isolated(self, i: int) -> int:
+        """Tamanho estimado, em bytes, de um PDF só com a página i."""
+        return _DOC_OVERHEAD + self.unique_bytes[i] + self.shared_bytes[i]
+
+    def objects(self, i: int) -> array.array:
+        """Objetos alcançados pela página i (índices em obj_size)."""
+        return self.obj_index[self.obj_offsets[i]:self.obj_offsets[i + 1]]
+
+    # ── Serialização ─────────────────────────────────────────────────────
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps(
+            {
+                "v": PROFILE_VERSION,
+                "count": self.count,
+                "fields": {name: [code, len(getattr(self, name))] for name, code in _FIELDS},
+            },
+            separators=(",", ":"),
+        ).encode()
+        buf = io.BytesIO()
+        buf.write(len(header).to_bytes(4, "little"))
+        buf.write(header)
+        for name, _ in _FIELDS:
+            buf.write(getattr(self, name).tobytes())
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PageProfile":
+        size = int.from_bytes(data[:4], "little")
+        header = json.loads(data[4:4 + size])
+        if header.get("v") != PROFILE_VERSION:
+            raise ValueError(f"versão {header.get('v')} != {PROFILE_VERSION}")
+
+        pos = 4 + size
+        fields = {}
+        for name, code in _FIELDS:
+            stored_code, items = header["fields"][name]
+            if stored_code != code:
+                raise ValueError(f"campo {name}: typecode {stored_code} != {code}")
+            arr = array.array(code)
+            end = pos + items * arr.itemsize
+            arr.frombytes(data[pos:end])
+            if len(arr) != items:
+                raise ValueError(f"campo {name} truncado")
+            fields[name] = arr
+            pos = end
+        return cls(header["count"], **fields)
+
+
+def build_page_profile(doc: fitz.Document) -> PageProfile:
+    """Percorre o documento uma vez e monta o perfil de todas as páginas."""
+    graph, page_xrefs, sets = page_object_sets(doc)
+
+    users: dict[int, int] = {}
+    for objs in sets:
+        for xref in objs:
+            users[xref] = users.get(xref, 0) + 1
+
+    fields = {name: array.array(code) for name, code in _FIELDS}
+    fields["obj_offsets"].append(0)
+    obj_slot: dict[int, int] = {}  # xref → índice em obj_size
+
+    for page, page_xref, objs in zip(doc, page_xrefs, sets):
+        chars, words, images, image_area, page_area = measure_page(page)
+        fields["text_chars"].append(chars)
+        fields["words"].append(words)
+        fields["image_count"].append(images)
+        fields["image_area"].append(image_area)
+        fields["page_area"].append(page_area)
+
+        page_bytes = graph.size(page_xref)
+        unique = page_bytes
+        shared = 0
+        for xref in sorted(objs):
+            size = graph.size(xref)
+            if users[xref] > 1:
+                shared += size
+            else:
+                unique += size
+            slot = obj_slot.get(xref)
+            if slot is None:
+                slot = obj_slot[xref] = len(fields["obj_size"])
+                fields["obj_size"].append(size)
+            fields["obj_index"].append(slot)
+        fields["obj_offsets"].append(len(fields["obj_index"]))
+        fields["page_bytes"].append(page_bytes)
+        fields["unique_bytes"].append(unique)
+        fields["shared_bytes"].append(shared)
+
+    return PageProfile(doc.page_count, **fields)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  CACHE
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _cache_dir() -> str:
+    os.makedirs(PAGE_PROFILE_DIR, exist_ok=True)
+    return PAGE_PROFILE_DIR
+
+
+def _memory_get(content_hash: str) -> PageProfile | None:
+    with _lock:
+        profile = _memory.get(content_hash)
+        if profile is not None:
+            _memory.move_to_end(content_hash)
+        return profile
+
+
+def _memory_put(content_hash: str, profile: PageProfile) -> None:
+    with _lock:
+        _memory[content_hash] = profile
+        _memory.move_to_end(content_hash)
+        while len(_memory) > PAGE_PROFILE_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _disk_get(content_hash: str) -> PageProfile | None:
+    path = os.path.join(_cache_dir(), f"{content_hash}.prof")
+    try:
+        with open(path, "rb") as fp:
+            profile = PageProfile.from_bytes(fp.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"[page-profile] Perfil inválido {content_hash[:12]}: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    try:
+        os.utime(path)  # renova posição no LRU
+    except OSError:
+        pass
+    return profile
+
+
+def _disk_put(content_hash: str, profile: PageProfile) -> None:
+    base = _cache_dir()
+    tmp = os.path.join(base, f".tmp_{uuid.uuid4().hex[:12]}")
+    try:
+        with open(tmp, "wb") as fp:
+            fp.write(profile.to_bytes())
+        os.replace(tmp, os.path.join(base, f"{content_hash}.prof"))
+    except Exception as e:
+        logging.warning(f"[page-profile] Falha ao gravar perfil {content_hash[:12]}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return
+    _evict()
+
+
+def _evict() -> None:
+    """Remove perfis menos recentemente usados até caber em PAGE_PROFILE_CACHE_MAX_MB."""
+    limit = int(PAGE_PROFILE_CACHE_MAX_MB * 1024 * 1024)
+    base = _cache_dir()
+    entries = []
+    for name in os.listdir(base):
+        if name.startswith("."):
+            continue
+        path = os.path.join(base, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def get_page_profile(pdf_path, content_hash: str | None = None) -> PageProfile:
+    """
+    Perfil das páginas do PDF, do cache quando possível.
+
+    Args:
+        pdf_path:     Caminho do PDF.
+        content_hash: SHA-256 do conteúdo, se já conhecido (ex.: do upload);
+                      None = calculado aqui.
+    """
+    content_hash = content_hash or file_sha256(str(pdf_path))
+
+    profile = _memory_get(content_hash)
+    if profile is not None:
+        return profile
+
+    profile = _disk_get(content_hash)
+    if profile is None:
+        with fitz.open(str(pdf_path)) as doc:
+            profile = build_page_profile(doc)
+        _disk_put(content_hash, profile)
+
+    _memory_put(content_hash, profile)
+    return profile
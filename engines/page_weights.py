@@ -0,0 +1,223 @@
+"""
+Peso de cada página estimado pelo grafo de objetos do PDF, sem salvar nada.
+
+Antes, o tamanho de uma página era medido montando um PDF só com ela e
+salvando em BytesIO (e a divisão em volumes ainda salvava um PDF crescente a
+cada página: O(n²)). Aqui o documento é percorrido uma vez pelo fitz:
+
+  - para cada página, o conjunto de objetos indiretos alcançáveis a partir do
+    dicionário da página (conteúdo, recursos, fontes, imagens, anotações),
+    sem subir para a árvore de páginas nem entrar em outras páginas
+  - o tamanho de cada objeto é memoizado: texto do objeto + bytes do stream
+    + overhead fixo de "N 0 obj … endobj" e da entrada do xref. Streams com
+    /Filter contam o /Length; streams sem filtro contam o tamanho comprimido
+    (zlib nível 1), porque o pikepdf.save os grava com /FlateDecode
+  - objetos alcançados por uma única página são "únicos"; os demais
+    (fontes, logotipos, recursos herdados) são "compartilhados" e contados à
+    parte
+
+Tamanho isolado ≈ overhead do documento + página + tudo o que ela alcança —
+o mesmo que salvar a página sozinha num PDF novo.
+
+Os tamanhos por página ficam no perfil de páginas (engines.page_profile),
+que é quem percorre o grafo; VolumeSizer soma faixas a partir dele.
+"""
+
+import re
+import zlib
+
+import fitz
+
+# Overhead de um objeto no arquivo: "N 0 obj\n" … "\nendobj\n" + entrada do xref
+_OBJ_OVERHEAD = 40
+# Overhead extra de streams: "stream\n" … "\nendstream"
+_STREAM_OVERHEAD = 18
+# Documento de uma página: cabeçalho, catálogo, nó /Pages, xref e trailer
+_DOC_OVERHEAD = 400
+
+_RE_REF = re.compile(r"(\d+) (\d+) R")
+# Tipos de objeto onde a busca para: levariam a outras páginas ou à árvore
+_STOP_TYPES = ("/Page", "/Pages", "/Catalog")
+# Atributos que a página pode herdar dos nós /Pages
+_INHERITABLE = ("Resources",)
+
+
+class _Graph:
+    """Tamanhos e referências dos objetos do documento, memoizados por xref."""
+
+    def __init__(self, doc: fitz.Document):
+        self.doc = doc
+        self.xref_len = doc.xref_length()
+        self._size: dict[int, int] = {}
+        self._children: dict[int, tuple[int, ...]] = {}
+        self._stop: dict[int, bool] = {}
+
+    def _source(self, xref: int) -> str:
+        try:
+            return self.doc.xref_object(xref, compressed=True)
+        except Exception:
+            return ""
+
+    def _stream_length(self, xref: int) -> int:
+        kind, value = self.doc.xref_get_key(xref, "Length")
+        try:
+            if kind == "int":
+                return int(value)
+            if kind == "xref":
+                return int(self._source(int(value.split()[0])).strip())
+        except (TypeError, ValueError):
+            pass
+        try:
+            return len(self.doc.xref_stream_raw(xref) or b"")
+        except Exception:
+            return 0
+
+    def _stream_size(self, xref: int) -> int:
+        if self.doc.xref_get_key(xref, "Filter")[0] != "null":
+            return self._stream_length(xref)
+        # Sem filtro: o save comprime com Flate
+        try:
+            return len(zlib.compress(self.doc.xref_stream_raw(xref) or b"", 1))
+        except Exception:
+            return self._stream_length(xref)
+
+    def size(self, xref: int) -> int:
+        size = self._size.get(xref)
+        if size is None:
+            size = len(self._source(xref)) + _OBJ_OVERHEAD
+            if self.doc.xref_is_stream(xref):
+                size += self._stream_size(xref) + _STREAM_OVERHEAD
+            self._size[xref] = size
+        return size
+
+    def children(self, xref: int) -> tuple[int, ...]:
+        refs = self._children.get(xref)
+        if refs is None:
+            refs = tuple(
+                {
+                    int(m.group(1))
+                    for m in _RE_REF.finditer(self._source(xref))
+                    if 0 < int(m.group(1)) < self.xref_len
+                }
+            )
+            self._children[xref] = refs
+        return refs
+
+    def is_stop(self, xref: int) -> bool:
+        stop = self._stop.get(xref)
+        if stop is None:
+            kind, value = self.doc.xref_get_key(xref, "Type")
+            stop = kind == "name" and value in _STOP_TYPES
+            self._stop[xref] = stop
+        return stop
+
+    def inherited_roots(self, page_xref: int) -> list[int]:
+        """Objetos herdados dos nós /Pages que a página não define."""
+        roots = []
+        for key in _INHERITABLE:
+            if self.doc.xref_get_key(page_xref, key)[0] != "null":
+                continue
+            node = page_xref
+            for _ in range(64):  # árvore malformada com ciclo
+                kind, value = self.doc.xref_get_key(node, "Parent")
+                if kind != "xref":
+                    break
+                node = int(value.split()[0])
+                kind, value = self.doc.xref_get_key(node, key)
+                if kind == "xref":
+                    roots.append(int(value.split()[0]))
+                    break
+                if kind != "null":
+                    # Dicionário direto no nó pai: conta só as referências dele
+                    roots.extend(int(m.group(1)) for m in _RE_REF.finditer(value))
+                    break
+        return roots
+
+    def reachable(self, page_xref: int) -> set[int]:
+        """Objetos indiretos alcançáveis a partir da página (ela própria fora)."""
+        seen: set[int] = set()
+        stack = list(self.children(page_xref)) + self.inherited_roots(page_xref)
+        while stack:
+            xref = stack.pop()
+            if xref in seen or xref == page_xref or self.is_stop(xref):
+                continue
+            seen.add(xref)
+            stack.extend(self.children(xref))
+        return seen
+
+
+def page_object_sets(doc: fitz.Document) -> tuple[_Graph, list[int], list[set[int]]]:
+    """Grafo memoizado, xref de cada página e objetos alcançáveis por página."""
+    graph = _Graph(doc)
+    page_xrefs = [doc[i].xref for i in range(doc.page_count)]
+    return graph, page_xrefs, [graph.reachable(x) for x in page_xrefs]
+
+
+class VolumeSizer:
+    """
+    Tamanho estimado de faixas contíguas de páginas (volumes), em bytes.
+
+    Dentro de um volume cada objeto conta uma vez; um recurso compartilhado
+    volta a contar em cada volume que o usa — como no arquivo salvo.
+
+    Os tamanhos vêm do perfil de páginas (engines.page_profile.PageProfile):
+    não precisa do documento aberto.
+    """
+
+    def __init__(self, profile):
+        self.total = profile.count
+        self.sets = [frozenset(profile.objects(i)) for i in range(profile.count)]
+        self._page_size = profile.page_bytes
+        self._obj_size = profile.obj_size
+
+        # Soma prefixada dos pesos incrementais (compartilhados contam uma vez)
+        self._prefix = [0]
+        seen: set[int] = set()
+        for page_size, objs in zip(self._page_size, self.sets):
+            new = objs - seen
+            self._prefix.append(
+                self._prefix[-1] + page_size + sum(self._obj_size[x] for x in new)
+            )
+            seen |= new
+
+    def weight(self, start: int, end: int) -> int:
+        """Peso aproximado de [start, end) em O(1) (recursos contados uma vez no documento)."""
+        return _DOC_OVERHEAD + self._prefix[end] - self._prefix[start]
+
+    def sizes_from(self, start: int, end: int, cap: int) -> list[int]:
+        """
+        Tamanhos acumulados do volume que começa em `start`: o item t é o
+        tamanho de [start, start + t + 1). Para no primeiro que passaria de
+        `cap` (a primeira página entra sempre).
+        """
+        obj_size = self._obj_size
+        seen: set[int] = set()
+        size = _DOC_OVERHEAD
+        sizes = []
+        for j in range(start, end):
+            objs = self.sets[j]
+            add = self._page_size[j] + sum(obj_size[x] for x in objs if x not in seen)
+            if sizes and size + add > cap:
+                break
+            seen |= objs
+            size += add
+            sizes.append(size)
+        return sizes
+
+    def greedy(self, cap: int, start: int = 0, end: int | None = None) -> list[tuple[int, int, int]]:
+        """
+        Corta [start, end) em volumes de até `cap` bytes, enchendo cada um ao
+        máximo (número mínimo de volumes para faixas contíguas). Uma página
+        que sozinha passa de `cap` vira um volume próprio.
+
+        Returns:
+            [(início, fim_exclusivo, bytes_estimados), ...]
+        """
+        end = self.total if end is None else end
+        volumes = []
+        i = start
+        while i < end:
+            sizes = self.sizes_from(i, end, cap)
+            volumes.append((i, i + len(sizes), sizes[-1]))
+            i += len(sizes)
+        return volumes
@@ -0,0 +1,272 @@
+"""
+Cache de resultados por conteúdo (documento inteiro).
+
+Usuários reenviam o mesmo PDF com frequência (retry após timeout de download,
+reenvio para outro processo). A chave é o SHA-256 do arquivo de entrada mais
+os parâmetros de compressão já resolvidos; um acerto devolve os arquivos de
+saída armazenados sem rodar OCR + merge de novo.
+
+Layout em disco (RESULT_CACHE_DIR):
+    <chave>/manifest.json   → lista ordenada de {"file", "suffix"}
+    <chave>/000.pdf, ...    → arquivos de saída (PDF único ou volumes)
+    stats.db                → contadores de acerto/erro/gravação/evicção
+
+Os contadores ficam em SQLite porque lookup/store rodam nos processos
+worker e o /admin lê as estatísticas no processo web.
+
+Evicção LRU limitada por tamanho (RESULT_CACHE_MAX_MB): o mtime do diretório
+da entrada é atualizado a cada acerto e as entradas mais antigas são
+removidas após cada gravação.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from engines.constants import (
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_MAX_MB,
+)
+
+# Versão do formato/pipeline: incremente para invalidar entradas antigas
+CACHE_VERSION = 1
+
+_MANIFEST = "manifest.json"
+_HASH_CHUNK = 1024 * 1024
+
+_STATS_DB = "stats.db"
+_COUNTERS = ("hits", "misses", "stores", "evictions")
+_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _cache_dir() -> str:
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    return RESULT_CACHE_DIR
+
+
+def _conn() -> sqlite3.Connection:
+    """Conexão da thread atual com o banco de contadores (compartilhado entre processos)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        path = os.path.join(_cache_dir(), _STATS_DB)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_STATS_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _count(name: str, n: int = 1) -> None:
+    try:
+        _conn().execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, n),
+        )
+    except sqlite3.Error as e:
+        logging.warning(f"[cache] Falha ao atualizar contador {name}: {e}")
+
+
+def _read_counters() -> dict:
+    out = dict.fromkeys(_COUNTERS, 0)
+    try:
+        for name, value in _conn().execute("SELECT name, value FROM counters"):
+            out[name] = value
+    except sqlite3.Error as e:
+        logging.warning(f"[cache] Falha ao ler contadores: {e}")
+    return out
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 do conteúdo do arquivo (lido em blocos)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(content_hash: str, **params) -> str:
+    """
+    Chave da entrada: hash do conteúdo + parâmetros resolvidos (hp_level,
+    extra_compress_pages, modo dividir, ...). Os parâmetros são serializados
+    de forma canônica, então a ordem dos kwargs não importa.
+    """
+    canon = json.dumps(
+        {"v": CACHE_VERSION, "sha256": content_hash, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canon.encode()).hexdigest()
+
+
+def lookup(key: str) -> list[tuple[str, str]] | None:
+    """
+    Procura a entrada `key`.
+
+    Returns:
+        Lista ordenada de (caminho_no_cache, sufixo) ou None se não houver
+        entrada válida. Conta acerto/erro e renova a entrada no LRU.
+    """
+    if not RESULT_CACHE_ENABLED:
+        return None
+
+    entry = os.path.join(_cache_dir(), key)
+    try:
+        with open(os.path.join(entry, _MANIFEST), encoding="utf-8") as fp:
+            manifest = json.load(fp)
+        files = [
+            (os.path.join(entry, item["file"]), item.get("suffix", ""))
+            for item in manifest["files"]
+        ]
+        if not files or not all(os.path.isfile(p) for p, _ in files):
+            raise FileNotFoundError("entrada incompleta")
+    except FileNotFoundError:
+        _count("misses")
+        return None
+    except Exception as e:
+        logging.warning(f"[cache] Entrada corrompida {key[:12]}: {e}")
+        shutil.rmtree(entry, ignore_errors=True)
+        _count("misses")
+        return None
+
+    try:
+        os.utime(entry)  # renova posição no LRU
+    except OSError:
+        pass
+
+    _count("hits")
+    logging.info(f"[cache] Acerto {key[:12]} ({len(files)} arquivo(s))")
+    return files
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def restore(cached_path: str, dest: str) -> None:
+    """
+    Materializa um arquivo do cache em `dest` (hardlink quando possível).
+    Levanta OSError se a entrada sumiu depois do lookup (evicção por outro
+    processo): o chamador trata como erro de cache e recalcula.
+    """
+    if os.path.exists(dest):
+        os.remove(dest)
+    _link_or_copy(cached_path, dest)
+
+
+def store(key: str, files: list[tuple[str, str]]) -> None:
+    """
+    Armazena os arquivos de saída sob `key`.
+
+    Args:
+        key:   Chave de make_key().
+        files: Lista ordenada de (caminho_do_arquivo, sufixo), onde o sufixo
+               é o trecho a reanexar ao nome base na restauração
+               (ex.: "" para PDF único, "_VOL_01" para volumes).
+    """
+    if not RESULT_CACHE_ENABLED or not files:
+        return
+
+    base = _cache_dir()
+    entry = os.path.join(base, key)
+    if os.path.isdir(entry):
+        return
+
+    tmp_entry = os.path.join(base, f".tmp_{uuid.uuid4().hex[:12]}")
+    try:
+        os.makedirs(tmp_entry)
+        manifest = {"files": []}
+        for idx, (path, suffix) in enumerate(files):
+            name = f"{idx:03d}.pdf"
+            _link_or_copy(path, os.path.join(tmp_entry, name))
+            manifest["files"].append({"file": name, "suffix": suffix})
+
+        with open(os.path.join(tmp_entry, _MANIFEST), "w", encoding="utf-8") as fp:
+            json.dump(manifest, fp)
+
+        os.rename(tmp_entry, entry)
+        _count("stores")
+    except Exception as e:
+        logging.warning(f"[cache] Falha ao armazenar {key[:12]}: {e}")
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        return
+
+    _evict()
+
+
+def _entry_size(path: str) -> int:
+    total = 0
+    for name in os.listdir(path):
+        try:
+            total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return total
+
+
+def _list_entries() -> list[tuple[float, int, str]]:
+    """(mtime, bytes, caminho) de cada entrada válida no cache."""
+    base = _cache_dir()
+    entries = []
+    for name in os.listdir(base):
+        path = os.path.join(base, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        try:
+            entries.append((os.path.getmtime(path), _entry_size(path), path))
+        except OSError:
+            continue
+    return entries
+
+
+def _evict() -> None:
+    """Remove entradas menos recentemente usadas até caber em RESULT_CACHE_MAX_MB."""
+    limit = int(RESULT_CACHE_MAX_MB * 1024 * 1024)
+    with _lock:
+        entries = sorted(_list_entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+
+    if removed:
+        _count("evictions", removed)
+        logging.info(f"[cache] {removed} entrada(s) removida(s) (LRU)")
+
+
+def stats() -> dict:
+    """Contadores de acerto/erro e ocupação atual do cache."""
+    out = _read_counters()
+    try:
+        entries = _list_entries()
+    except OSError:
+        entries = []
+    lookups = out["hits"] + out["misses"]
+    out["entries"] = len(entries)
+    out["size_mb"] = round(sum(size for _, size, _ in entries) / (1024 * 1024), 2)
+    out["max_mb"] = RESULT_CACHE_MAX_MB
+    out["hit_rate_pct"] = round(out["hits"] / lookups * 100, 1) if lookups else 0.0
+    return out
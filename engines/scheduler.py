@@ -0,0 +1,336 @@
+"""
+Escalonador de páginas compartilhado por todas as tarefas do processo.
+
+Antes, cada chamada de /processar criava o próprio ProcessPoolExecutor: com
+três usuários simultâneos eram 30+ workers disputando os mesmos núcleos
+(cada um ainda disparando tesseract/gs). Agora existe um único pool por
+processo e um único limite global de tarefas em voo (WorkerGovernor de
+engines.autoscale); os motores HP-OCR e HP-GS abrem um "job" e submetem
+suas páginas a ele.
+
+O despachante intercala os jobs em round-robin: a cada vaga livre no pool,
+pega a próxima tarefa do próximo job com tarefas pendentes. Dentro do job a
+ordem é FIFO, com `priority=True` furando a fila (ex.: compressão de uma
+página cujo OCR acabou, para manter o pipeline em fluxo). Jobs grandes
+(> BIG_FILE_PAGE_THRESHOLD) ficam limitados a BIG_FILE_MAX_WORKERS em voo.
+
+As futures devolvidas por `PageJob.submit` são concurrent.futures.Future
+comuns: funcionam com wait()/as_completed() e com cancel() enquanto a
+tarefa ainda não foi despachada.
+
+Pool quente: o escalonador é criado na subida do servidor (warm_up) e vive
+enquanto o processo viver. Com WORKER_START_METHOD="forkserver", os workers
+nascem de um servidor que já importou WORKER_PRELOAD_MODULES (fitz, pikepdf,
+PIL, numpy e os motores); o initializer carrega e aquece os modelos do
+Tesseract. Cada worker é reciclado após WORKER_MAX_TASKS tarefas
+(max_tasks_per_child no Python 3.11+; em versões anteriores o pool inteiro é
+trocado após WORKER_MAX_TASKS × workers tarefas).
+"""
+
+import sys
+import logging
+import threading
+import collections
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+
+from engines.ocr_backend import init_ocr_worker, warm_up as warm_up_ocr
+from engines.source_cache import init_source_cache
+from engines.ramdisk import temp_dir
+from engines.autoscale import WorkerGovernor
+from engines.constants import (
+    AUTOSCALE_INTERVAL_S,
+    BIG_FILE_PAGE_THRESHOLD,
+    BIG_FILE_MAX_WORKERS,
+    WORKER_START_METHOD,
+    WORKER_PRELOAD_MODULES,
+    WORKER_MAX_TASKS,
+)
+
+# max_tasks_per_child existe a partir do Python 3.11 (e exige start method ≠ fork)
+_NATIVE_RECYCLING = sys.version_info >= (3, 11)
+
+
+def _mp_context():
+    """Contexto do multiprocessing para o pool (None = padrão da plataforma)."""
+    if WORKER_START_METHOD not in multiprocessing.get_all_start_methods():
+        logging.warning(
+            f"[scheduler] Start method {WORKER_START_METHOD!r} indisponível. "
+            f"Usando o padrão da plataforma."
+        )
+        return None
+
+    ctx = multiprocessing.get_context(WORKER_START_METHOD)
+    if WORKER_START_METHOD == "forkserver":
+        # Só tem efeito antes do forkserver subir (primeiro pool do processo)
+        ctx.set_forkserver_preload(list(WORKER_PRELOAD_MODULES))
+    return ctx
+
+
+def _init_scheduler_worker(log_level: int) -> None:
+    """
+    Initializer do pool compartilhado: carrega e aquece os modelos do
+    Tesseract, prepara o cache de documentos de origem (LRU por caminho, já
+    que o mesmo worker atende páginas de jobs diferentes) e faz uma
+    renderização mínima para inicializar o MuPDF.
+    """
+    # Workers do forkserver/spawn não herdam a configuração de logging do app
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=log_level)
+
+    init_ocr_worker()
+    init_source_cache()
+    warm_up_ocr()
+    try:
+        with fitz.open() as doc:
+            doc.new_page(width=72, height=72).get_pixmap()
+    except Exception as e:
+        logging.debug(f"[scheduler] Aquecimento do fitz falhou: {e}")
+
+
+def _noop(_=None) -> None:
+    """Tarefa vazia usada para subir os workers antecipadamente."""
+    return None
+
+
+class PageJob:
+    """Fila de tarefas de uma requisição dentro do escalonador."""
+
+    def __init__(self, scheduler: "PageScheduler", label: str, max_in_flight: int):
+        self._scheduler = scheduler
+        self.label = label
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.pending: collections.deque = collections.deque()
+        self.closed = False
+
+    def submit(self, fn, arg, priority: bool = False) -> concurrent.futures.Future:
+        """Enfileira `fn(arg)` e devolve a future do resultado."""
+        return self._scheduler._enqueue(self, fn, arg, priority)
+
+    def close(self) -> None:
+        """Cancela as tarefas ainda não despachadas e remove o job do rodízio."""
+        self._scheduler._close_job(self)
+
+    def __enter__(self) -> "PageJob":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PageScheduler:
+    """Pool único de processos + despacho round-robin entre jobs."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jobs: collections.deque[PageJob] = collections.deque()
+        self._in_flight = 0
+        self._governor = WorkerGovernor(
+            "ocr", None, temp_dir(), tag="[scheduler]", worker_pids=self._worker_pids
+        )
+        self._mp_context = _mp_context()
+        self._native_recycling = _NATIVE_RECYCLING and (
+            self._mp_context is None
+            or self._mp_context.get_start_method() != "fork"
+        )
+        self._pool_tasks = 0  # tarefas despachadas ao pool atual (rotação)
+        self._pool = self._new_pool()
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_loop, name="page-scheduler", daemon=True
+        )
+        self._dispatcher.start()
+
+    # ── Pool ────────────────────────────────────────────────────────────────
+
+    def _new_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        kwargs = {
+            "max_workers": self._governor.max_workers,
+            "mp_context": self._mp_context,
+            "initializer": _init_scheduler_worker,
+            "initargs": (logging.getLogger().level,),
+        }
+        if self._native_recycling:
+            kwargs["max_tasks_per_child"] = WORKER_MAX_TASKS
+        self._pool_tasks = 0
+        return concurrent.futures.ProcessPoolExecutor(**kwargs)
+
+    def _worker_pids(self) -> list[int]:
+        """PIDs dos workers vivos do pool atual (medição de RSS do governor)."""
+        processes = getattr(getattr(self, "_pool", None), "_processes", None) or {}
+        try:
+            return list(processes)
+        except RuntimeError:  # dicionário alterado pela thread do pool
+            return []
+
+    def _rotate_pool_if_due(self) -> None:
+        """
+        Sem max_tasks_per_child: troca o pool inteiro após
+        WORKER_MAX_TASKS × workers tarefas (sob self._cond). O pool antigo
+        termina as tarefas em andamento e encerra seus processos.
+        """
+        if self._native_recycling:
+            return
+        if self._pool_tasks < WORKER_MAX_TASKS * self._governor.max_workers:
+            return
+        old = self._pool
+        self._pool = self._new_pool()
+        old.shutdown(wait=False)
+        logging.info("[scheduler] Pool reciclado (limite de tarefas por worker)")
+
+    def warm_up(self) -> None:
+        """Sobe todos os workers agora (initializer incluso), sem esperar por jobs."""
+        with self._cond:
+            pool = self._pool
+        for _ in range(self._governor.max_workers):
+            pool.submit(_noop)
+        logging.info(
+            f"[scheduler] Pool aquecido | workers={self._governor.max_workers} | "
+            f"start method={self._mp_context.get_start_method() if self._mp_context else 'padrão'}"
+        )
+
+    def _replace_broken_pool(self, broken) -> None:
+        """Recria o pool se um worker morreu (ex.: OOM-kill) e o quebrou."""
+        with self._cond:
+            if self._pool is not broken:
+                return
+            logging.error("[scheduler] Pool de workers quebrado. Recriando.")
+            self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    # ── Jobs ────────────────────────────────────────────────────────────────
+
+    def open_job(self, label: str, total_pages: int | None = None) -> PageJob:
+        """
+        Abre um job. `total_pages` acima de BIG_FILE_PAGE_THRESHOLD limita o
+        job a BIG_FILE_MAX_WORKERS tarefas em voo.
+        """
+        max_in_flight = self._governor.max_workers
+        if total_pages and total_pages > BIG_FILE_PAGE_THRESHOLD:
+            max_in_flight = min(max_in_flight, BIG_FILE_MAX_WORKERS)
+
+        job = PageJob(self, label, max_in_flight)
+        with self._cond:
+            self._jobs.append(job)
+            active = len(self._jobs)
+        logging.info(
+            f"[scheduler] Job aberto: {label} | jobs ativos={active} | "
+            f"em voo global={self._in_flight}/{self._governor.limit}"
+        )
+        return job
+
+    def _enqueue(self, job: PageJob, fn, arg, priority: bool) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        with self._cond:
+            if job.closed:
+                raise RuntimeError(f"Job encerrado: {job.label}")
+            item = (fn, arg, future)
+            if priority:
+                job.pending.appendleft(item)
+            else:
+                job.pending.append(item)
+            self._cond.notify()
+        return future
+
+    def _close_job(self, job: PageJob) -> None:
+        with self._cond:
+            if job.closed:
+                return
+            job.closed = True
+            pending = list(job.pending)
+            job.pending.clear()
+            try:
+                self._jobs.remove(job)
+            except ValueError:
+                pass
+        for _, _, future in pending:
+            future.cancel()
+        if pending:
+            logging.info(f"[scheduler] Job {job.label}: {len(pending)} tarefa(s) cancelada(s)")
+
+    # ── Despacho ────────────────────────────────────────────────────────────
+
+    def _next_item(self):
+        """Próxima tarefa em round-robin entre jobs (sob self._cond)."""
+        for _ in range(len(self._jobs)):
+            job = self._jobs[0]
+            self._jobs.rotate(-1)
+            if job.pending and job.in_flight < job.max_in_flight:
+                return job, job.pending.popleft()
+        return None, None
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    limit = self._governor.update()
+                    if self._in_flight < limit:
+                        job, item = self._next_item()
+                        if job is not None:
+                            break
+                    self._cond.wait(timeout=AUTOSCALE_INTERVAL_S)
+
+                fn, arg, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue  # cancelada enquanto aguardava
+                job.in_flight += 1
+                self._in_flight += 1
+                self._rotate_pool_if_due()
+                self._pool_tasks += 1
+                pool = self._pool
+
+            try:
+                pool_future = pool.submit(fn, arg)
+            except Exception as e:  # BrokenProcessPool / shutdown
+                self._task_done(job)
+                future.set_exception(e)
+                if isinstance(e, BrokenProcessPool):
+                    self._replace_broken_pool(pool)
+                continue
+
+            pool_future.add_done_callback(
+                lambda pf, job=job, future=future, pool=pool:
+                    self._on_done(job, future, pool, pf)
+            )
+
+    def _task_done(self, job: PageJob) -> None:
+        with self._cond:
+            job.in_flight -= 1
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def _on_done(self, job: PageJob, future, pool, pool_future) -> None:
+        self._task_done(job)
+        exc = pool_future.exception()
+        if exc is not None:
+            future.set_exception(exc)
+            if isinstance(exc, BrokenProcessPool):
+                self._replace_broken_pool(pool)
+        else:
+            future.set_result(pool_future.result())
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "jobs": len(self._jobs),
+                "in_flight": self._in_flight,
+                "limit": self._governor.limit,
+                "pool": self._governor.max_workers,
+                "pending": sum(len(j.pending) for j in self._jobs),
+            }
+
+
+_scheduler: PageScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> PageScheduler:
+    """Escalonador do processo (criado no primeiro uso)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PageScheduler()
+        return _scheduler
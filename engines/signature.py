@@ -1,13 +1,124 @@
-import PyPDF2
-
-def has_signature(pdf_path):
-    with open(pdf_path, "rb") as f:
-        reader = PyPDF2.PdfReader(f)
-        for page in reader.pages:
-            if "/Annots" in page:
-                annots = page["/Annots"]
-                for annot in annots:
-                    obj = annot.get_object()
-                    if obj.get("/Subtype") == "/Widget" and obj.get("/FT") == "/Sig":
-                        return True
-    return False
\ No newline at end of file
+"""
+Detecção de assinatura digital em PDF.
+
+Ordem da verificação (pikepdf, que só resolve os objetos que consulta):
+  1) /AcroForm do catálogo: /SigFlags com o bit SignaturesExist, depois a
+     árvore de /Fields (com /Kids) procurando campo /FT /Sig
+  2) sem AcroForm (ou sem campos): varredura das /Annots das páginas atrás
+     de widgets de assinatura — o caminho antigo, só para PDFs fora do padrão
+
+O resultado fica em cache por SHA-256 do conteúdo (LRU em memória do
+processo): a segunda verificação do mesmo arquivo não abre o PDF.
+"""
+
+import threading
+import collections
+
+import pikepdf
+
+from engines.constants import SIGNATURE_CACHE_SIZE
+
+# Bit 1 de /SigFlags (PDF 32000-1, 12.7.2): o documento contém assinaturas
+_SIGNATURES_EXIST = 1
+
+_cache: collections.OrderedDict[str, bool] = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(content_hash: str) -> bool | None:
+    with _cache_lock:
+        value = _cache.get(content_hash)
+        if value is not None:
+            _cache.move_to_end(content_hash)
+        return value
+
+
+def _cache_put(content_hash: str, value: bool) -> None:
+    with _cache_lock:
+        _cache[content_hash] = value
+        _cache.move_to_end(content_hash)
+        while len(_cache) > SIGNATURE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _is_sig_field(obj) -> bool:
+    return obj.get("/FT") == pikepdf.Name.Sig
+
+
+def _fields_have_signature(fields) -> bool | None:
+    """Percorre a árvore de campos. None se não há campos para examinar."""
+    if not isinstance(fields, pikepdf.Array) or len(fields) == 0:
+        return None
+
+    stack = list(fields)
+    seen = set()
+    while stack:
+        field = stack.pop()
+        if not isinstance(field, pikepdf.Dictionary):
+            continue
+        if field.is_indirect:
+            if field.objgen in seen:
+                continue  # árvore com ciclo
+            seen.add(field.objgen)
+        if _is_sig_field(field):
+            return True
+        kids = field.get("/Kids")
+        if isinstance(kids, pikepdf.Array):
+            stack.extend(kids)
+    return False
+
+
+def _annots_have_signature(pdf: pikepdf.Pdf) -> bool:
+    for page in pdf.pages:
+        annots = page.obj.get("/Annots")
+        if not isinstance(annots, pikepdf.Array):
+            continue
+        for annot in annots:
+            if not isinstance(annot, pikepdf.Dictionary):
+                continue
+            if annot.get("/Subtype") != pikepdf.Name.Widget:
+                continue
+            # /FT pode vir herdado do campo pai
+            parent = annot.get("/Parent")
+            if _is_sig_field(annot) or (
+                isinstance(parent, pikepdf.Dictionary) and _is_sig_field(parent)
+            ):
+                return True
+    return False
+
+
+def _detect(pdf_path: str) -> bool:
+    with pikepdf.open(pdf_path) as pdf:
+        acroform = pdf.Root.get("/AcroForm")
+        if isinstance(acroform, pikepdf.Dictionary):
+            try:
+                if int(acroform.get("/SigFlags", 0)) & _SIGNATURES_EXIST:
+                    return True
+            except (TypeError, ValueError):
+                pass
+            found = _fields_have_signature(acroform.get("/Fields"))
+            if found is not None:
+                return found
+        return _annots_have_signature(pdf)
+
+
+def has_signature(pdf_path, content_hash: str | None = None, sniffed: bool | None = None) -> bool:
+    """
+    Indica se o PDF possui campo de assinatura digital.
+
+    Args:
+        pdf_path:     Caminho do PDF.
+        content_hash: SHA-256 do conteúdo (chave do cache); None = sem cache.
+        sniffed:      Resultado do farejamento do upload (engines.upload),
+                      usado como resposta quando não é None.
+    """
+    if content_hash:
+        cached = _cache_get(content_hash)
+        if cached is not None:
+            return cached
+
+    result = sniffed if sniffed is not None else _detect(pdf_path)
+
+    if content_hash:
+        _cache_put(content_hash, result)
+    return result
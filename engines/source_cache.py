@@ -0,0 +1,99 @@
+"""
+Cache por processo worker do documento de origem.
+
+Os workers de página (HP-OCR e HP-GS) abriam o PDF inteiro com pikepdf a cada
+página — num scan de 400 páginas o xref e a árvore de páginas eram
+reinterpretados 400 vezes por motor. Aqui o documento é aberto uma vez no
+initializer do pool e reaproveitado por todas as páginas que o worker
+processar; o handle é fechado quando o worker termina.
+
+Cada processo tem seu próprio handle, então não há acesso concorrente ao
+mesmo objeto pikepdf.
+
+Com o pool compartilhado (engines.scheduler), um worker alterna entre páginas
+de jobs diferentes: o cache guarda até SOURCE_CACHE_MAX_DOCS documentos em
+LRU e descarta handles de arquivos que já não existem (job concluído).
+"""
+
+import os
+import logging
+import collections
+import multiprocessing.util
+
+import pikepdf
+
+from engines.constants import SOURCE_CACHE_MAX_DOCS
+
+# Estado por processo worker: caminho absoluto → (identidade do arquivo, handle),
+# em ordem de uso (LRU)
+_sources: collections.OrderedDict[str, tuple[tuple, pikepdf.Pdf]] = collections.OrderedDict()
+_finalizer_registered = False
+
+
+def _file_identity(path: str) -> tuple:
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _close(path: str) -> None:
+    _, pdf = _sources.pop(path)
+    try:
+        pdf.close()
+    except Exception as e:
+        logging.debug(f"[source-cache] Falha ao fechar {path}: {e}")
+
+
+def close_sources() -> None:
+    """Fecha todos os documentos em cache neste processo."""
+    for path in list(_sources):
+        _close(path)
+
+
+def get_source_pdf(pdf_path: str) -> pikepdf.Pdf:
+    """
+    Retorna o handle pikepdf em cache para `pdf_path`, abrindo-o se necessário.
+
+    Mantém até SOURCE_CACHE_MAX_DOCS documentos por worker (LRU). Se o
+    arquivo mudou em disco (tamanho/mtime), é reaberto.
+    """
+    path = os.path.abspath(pdf_path)
+    identity = _file_identity(path)
+
+    cached = _sources.get(path)
+    if cached is not None and cached[0] == identity:
+        _sources.move_to_end(path)
+        return cached[1]
+
+    if cached is not None:
+        _close(path)
+
+    # Handles de jobs já concluídos (arquivo removido) saem primeiro
+    for other in [p for p in _sources if not os.path.exists(p)]:
+        _close(other)
+    while len(_sources) >= SOURCE_CACHE_MAX_DOCS:
+        _close(next(iter(_sources)))
+
+    pdf = pikepdf.open(path)
+    _sources[path] = (identity, pdf)
+    logging.debug(f"[source-cache] Worker {os.getpid()}: documento aberto {path}")
+    return pdf
+
+
+def init_source_cache(pdf_path: str | None = None) -> None:
+    """
+    Initializer do ProcessPoolExecutor: abre o documento de origem uma vez e
+    garante que o handle seja fechado quando o processo worker encerrar.
+    """
+    global _finalizer_registered
+
+    if not _finalizer_registered:
+        # Finalizers com exitpriority rodam no encerramento do processo filho
+        multiprocessing.util.Finalize(None, close_sources, exitpriority=10)
+        _finalizer_registered = True
+
+    if pdf_path:
+        try:
+            get_source_pdf(pdf_path)
+        except Exception as e:
+            # Não derruba o worker: a página tentará abrir de novo e reportará o erro
+            logging.warning(f"[source-cache] Falha ao abrir {pdf_path}: {e}")
@@ -1,16 +1,26 @@
 """
 Função para dividir PDF em volumes sem aplicar OCR.
-Usado quando o OCR já foi aplicado no PDF completo.
+Usado quando o OCR já foi aplicado no PDF completo: as páginas que o chamador
+informa como cobertas (paginas_com_ocr, ex.: o HP-OCR do mesmo job) não passam
+de novo pelo OCR. O marcador gravado no arquivo (force_ocr.marcar_ocr) vem do
+documento de entrada, então só dispensa o OCR das páginas que ele declara E
+que de fato têm camada de texto no perfil de páginas.
 """
-import io
+import os
 import pathlib
+import tempfile
+import concurrent.futures
 import pikepdf
 import logging
 import subprocess
 import shutil
 from engines.ramdisk import temp_dir
 from engines.locate_gs import localizar_gs
-from engines.force_ocr import get_paginas_necessitam_ocr, ocr
+from engines.page_weights import VolumeSizer
+from engines.scheduler import get_scheduler
+from engines.source_cache import get_source_pdf
+from engines.page_profile import get_page_profile
+from engines.force_ocr import get_paginas_com_ocr, ocr
 from engines.constants import (
     SAFETY_MARGIN,
 )
@@ -46,66 +56,82 @@ def _compress_volume_gs(input_path: str, output_path: str) -> bool:
 
 
 # ---------------------------------------------------------------------------
-# Helpers de peso
+# Planejamento dos volumes
 # ---------------------------------------------------------------------------
 
-def _pdf_to_bytes(pdf: pikepdf.Pdf) -> int:
-    """Salva PDF em BytesIO e retorna tamanho em bytes. Sem I/O em disco."""
-    buf = io.BytesIO()
-    pdf.save(buf)
-    return buf.tell()
+# Folga do planejamento para o erro da estimativa pelo grafo (<1%): evita que
+# um volume planejado rente ao limite precise ser replanejado e regravado
+_PLAN_SLACK = 0.99
 
 
-def _calcular_pesos_paginas(pdf: pikepdf.Pdf) -> list[int]:
+def _planejar_volumes(sizer: VolumeSizer, cap: int, start: int = 0, end: int | None = None):
     """
-    Calcula o custo INCREMENTAL real de cada página.
-
-    Estratégia: mede o delta do arquivo ao adicionar cada página a um PDF
-    crescente. Isso reflete como o volume final realmente cresce — recursos
-    compartilhados (fontes, imagens referenciadas em múltiplas páginas) são
-    contados apenas uma vez, assim como acontece no arquivo real.
-
-    Por que o PDF isolado por página dá valor errado:
-    • Cada PDF isolado carrega header + xref + todos os recursos da página.
-    • Quando o browser ou o SO mostra o tamanho do volume dividido, os
-      recursos compartilhados existem uma única vez → tamanho menor.
-    • Somar PDFs isolados sempre superestima o tamanho real do volume.
-
-    Complemento: para páginas com imagens únicas grandes (não compartilhadas),
-    o delta incremental pode subestimar levemente. Por isso usamos
-    max(delta_incremental, tamanho_isolado − overhead_vazio) como piso.
+    Decide todos os cortes de uma vez sobre os pesos pré-calculados.
+
+    1) O guloso com teto `cap` dá o número mínimo de volumes (k) para faixas
+       contíguas.
+    2) Busca binária pelo menor teto que ainda resulta em k volumes: o maior
+       volume fica o menor possível.
+    3) Equilíbrio: cada corte mira (peso restante / volumes restantes), sem
+       passar do teto da etapa 2 e desde que o resto ainda caiba nos volumes
+       restantes — evita o último volume minúsculo do empacotamento página a
+       página.
+
+    Returns:
+        [(início, fim_exclusivo, bytes_estimados), ...]
     """
-    total = len(pdf.pages)
-    empty_overhead = _pdf_to_bytes(pikepdf.Pdf.new())
-
-    # Pesos isolados (via BytesIO — sem disco)
-    pesos_isolados = []
-    for idx in range(total):
-        single = pikepdf.Pdf.new()
-        single.pages.append(pdf.pages[idx])
-        pesos_isolados.append(_pdf_to_bytes(single) - empty_overhead)
-
-    # Pesos incrementais
-    growing = pikepdf.Pdf.new()
-    prev_size = _pdf_to_bytes(growing)
-    pesos_incrementais = []
-    for idx in range(total):
-        growing.pages.append(pdf.pages[idx])
-        new_size = _pdf_to_bytes(growing)
-        delta = max(new_size - prev_size, 512)  # piso de 512 B por página
-        pesos_incrementais.append(delta)
-        prev_size = new_size
-
-    # Usa o máximo: conservador sem superestimar como o método isolado puro
-    pesos = [
-        max(inc, iso)
-        for inc, iso in zip(pesos_incrementais, pesos_isolados)
-    ]
+    end = sizer.total if end is None else end
+    k = len(sizer.greedy(cap, start, end))
+
+    lo, hi = 0, cap  # lo: teto insuficiente para k volumes; hi: suficiente
+    while hi - lo > max(cap // 200, 1024):  # precisão de 0,5% do teto
+        mid = (lo + hi) // 2
+        if len(sizer.greedy(mid, start, end)) <= k:
+            hi = mid
+        else:
+            lo = mid
+
+    plan = []
+    i, left = start, k
+    while i < end:
+        sizes = sizer.sizes_from(i, end, hi)
+        cut = i + len(sizes)  # enchimento máximo: o resto sempre cabe
+        if left > 1 and cut < end:
+            target = sizer.weight(i, end) / left
+            t = next((t for t, size in enumerate(sizes) if size >= target), len(sizes) - 1)
+            if t > 0 and target - sizes[t - 1] < sizes[t] - target:
+                t -= 1
+            if len(sizer.greedy(hi, i + t + 1, end)) <= left - 1:
+                cut = i + t + 1
+        plan.append((i, cut, sizes[cut - i - 1]))
+        i, left = cut, left - 1
+    return plan
+
+
+def _salvar_volume(task) -> int:
+    """
+    Worker do pool compartilhado: monta o volume [início, fim) a partir do
+    documento de origem (em cache no worker) e salva. Retorna o tamanho real.
+    """
+    pdf_path, start, end, out_path = task
+    src = get_source_pdf(pdf_path)
+    part = pikepdf.Pdf.new()
+    for idx in range(start, end):
+        part.pages.append(src.pages[idx])
+    part.save(out_path)
+    return os.path.getsize(out_path)
 
-    logging.info(
-        f"Pesos por página (KB): {[f'{w // 1024}' for w in pesos]}"
-    )
-    return pesos
+
+def _paginas_marcadas_validas(marcadas, profile) -> set:
+    """
+    Páginas do marcador de OCR confirmadas pelo próprio conteúdo: só conta a
+    página que tem camada de texto. O marcador vem do arquivo e qualquer PDF
+    enviado pode trazê-lo; um scan sem texto continua indo para o OCR.
+    """
+    return {
+        p for p in marcadas
+        if 1 <= p <= profile.count and profile.words[p - 1] > 0
+    }
 
 
 # ---------------------------------------------------------------------------
@@ -120,7 +146,16 @@ def split_pdf_only(
     on_volume=None,
     on_ocr=None,
     check_cancelled=None,
+    paginas_com_ocr=None,
 ):
+    """
+    Divide o PDF em volumes de até max_mb e aplica OCR nas páginas que precisam.
+
+    paginas_com_ocr: páginas (1-based) que já passaram pelo OCR neste job e
+        são puladas na triagem. None = nenhuma. O marcador de OCR do arquivo
+        soma páginas a esse conjunto só quando confirmado pela camada de
+        texto de cada página (_paginas_marcadas_validas).
+    """
     logging.info(f"Iniciando divisão em volumes: {pdf_path}")
     out_dir = pathlib.Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -132,88 +167,144 @@ def split_pdf_only(
         f"{max_bytes_safe / (1024*1024):.2f} MB  |  Hard: {max_mb} MB"
     )
 
-    ram_dir = pathlib.Path(temp_dir())
+    # Diretório próprio no RAM Disk: o temp_dir() é compartilhado com as
+    # outras tarefas e não pode ser apagado inteiro
+    ram_dir = pathlib.Path(tempfile.mkdtemp(prefix="split_", dir=temp_dir()))
+    source = os.path.abspath(str(pdf_path))
 
     try:
-        with pikepdf.open(pdf_path) as pdf:
-            total = len(pdf.pages)
-
-            logging.info("Pré-calculando pesos das páginas…")
-            page_weights = _calcular_pesos_paginas(pdf)
-
-            vol, i, current_page = 1, 0, 0
-
-            while i < total:
-                if check_cancelled and check_cancelled():
+        # Perfil de páginas da origem: pesos dos volumes e triagem de OCR de
+        # cada volume (as páginas do volume são cópias das da origem)
+        logging.info("Pré-calculando pesos das páginas…")
+        profile = get_page_profile(source)
+        sizer = VolumeSizer(profile)
+        total = sizer.total
+
+        paginas_com_ocr = set(paginas_com_ocr or ())
+        if paginas_com_ocr:
+            logging.info(
+                f"[split_only] OCR do job: {len(paginas_com_ocr)}/{total} "
+                f"páginas já cobertas"
+            )
+        marcadas = get_paginas_com_ocr(source)
+        if marcadas:
+            validas = _paginas_marcadas_validas(marcadas, profile)
+            logging.info(
+                f"[split_only] Marcador de OCR no arquivo: {len(validas)}/{len(marcadas)} "
+                f"página(s) confirmadas pela camada de texto"
+            )
+            paginas_com_ocr |= validas
+
+        plan = _planejar_volumes(sizer, int(max_bytes_safe * _PLAN_SLACK))
+        logging.info(
+            f"[split_only] {len(plan)} volume(s) planejado(s) (MB): "
+            f"{[round(size / (1024 * 1024), 2) for _, _, size in plan]}"
+        )
+
+        # ── Gravação em paralelo, uma única gravação por volume ──────────────
+        # O tamanho real de cada volume confirma a estimativa; se passar do
+        # limite seguro (estimativa otimista), a faixa é replanejada com o
+        # teto corrigido pelo erro observado nela e regravada.
+        def gravar(plan):
+            """Grava o plano; devolve {início: (fim, caminho, bytes, estimativa)} ou None se cancelado."""
+            saved = {}
+            pending = {}
+            pages_done = 0
+            with get_scheduler().open_job(
+                f"Split {pdf_path.stem}", total_pages=total
+            ) as job:
+                def submit(start, end, estimate):
+                    out_path = str(ram_dir / f"part_{start:05d}_{end:05d}.pdf")
+                    future = job.submit(_salvar_volume, (source, start, end, out_path))
+                    pending[future] = (start, end, estimate, out_path)
+
+                for start, end, estimate in plan:
+                    submit(start, end, estimate)
+
+                while pending:
+                    done, _ = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    if check_cancelled and check_cancelled():
+                        job.close()
+                        return None
+
+                    for future in done:
+                        start, end, estimate, out_path = pending.pop(future)
+                        size = future.result()
+                        if size > max_bytes_safe and end - start > 1:
+                            # Teto em "bytes estimados" equivalente ao limite real
+                            new_cap = int(estimate * max_bytes_safe / size * _PLAN_SLACK)
+                            logging.info(
+                                f"[split_only] Páginas {start + 1}-{end}: "
+                                f"{size / (1024 * 1024):.2f} MB acima do limite; replanejando"
+                            )
+                            os.remove(out_path)
+                            for s, e, est in _planejar_volumes(sizer, new_cap, start, end):
+                                submit(s, e, est)
+                            continue
+
+                        saved[start] = (end, out_path, size, estimate)
+                        pages_done += end - start
+                        if on_page:
+                            on_page(pages_done, total)
+            return saved
+
+        saved = gravar(plan)
+        if saved is None:
+            return {"cancelled": True, "total_pages": total}
+
+        # ── Erro sistemático da estimativa: menos volumes com ele corrigido ──
+        # Estimativa inflada deixa volumes bem abaixo do limite; otimista
+        # obriga a picar as faixas que passaram. Nos dois casos o documento é
+        # replanejado com a razão real/estimado observada e só é regravado se
+        # o novo plano tiver menos volumes.
+        if len(saved) > 1:
+            real = sum(size for _, _, size, _ in saved.values())
+            estimated = sum(est for _, _, _, est in saved.values())
+            ratio = real / estimated if estimated else 1.0
+            replan = _planejar_volumes(sizer, int(max_bytes_safe / ratio * _PLAN_SLACK))
+            if len(replan) < len(saved):
+                logging.info(
+                    f"[split_only] Volumes com {ratio:.0%} do tamanho estimado: "
+                    f"{len(saved)} → {len(replan)} volume(s); regravando"
+                )
+                for _, part_path, _, _ in saved.values():
+                    os.remove(part_path)
+                saved = gravar(replan)
+                if saved is None:
                     return {"cancelled": True, "total_pages": total}
 
-                final_out = out_dir / f"{pdf_path.stem}_VOL_{vol:02d}.pdf"
-                ram_out = ram_dir / f"{pdf_path.stem}_VOL_{vol:02d}.pdf"
-
-                part = pikepdf.Pdf.new()
-                added = 0
-                accumulated = 0  # estimativa acumulada do volume atual
-
-                while i < total:
-                    if check_cancelled and check_cancelled():
-                        return {"cancelled": True, "total_pages": total}
-
-                    next_weight = page_weights[i]
-                    projected = accumulated + next_weight
-
-                    # ── Guarda de pré-adição ──────────────────────────────────
-                    # Se a projeção já passa do limite seguro e já há páginas,
-                    # confirma com I/O real antes de decidir.
-                    if added > 0 and projected > max_bytes_safe:
-                        actual = _pdf_to_bytes(part)
-                        if actual > max_bytes_safe:
-                            # Não cabe: fecha o volume aqui.
-                            break
-                        # Estimativa estava errada; recalibra e continua.
-                        accumulated = actual
-
-                    # ── Adiciona a página ─────────────────────────────────────
-                    part.pages.append(pdf.pages[i])
-                    added += 1
-                    accumulated += next_weight
-                    i += 1
-                    current_page += 1
-                    if on_page:
-                        on_page(current_page, total)
-
-                    # ── Checagem periódica com I/O real ───────────────────────
-                    # Apenas quando estimativa > 75% do limite (evita saves
-                    # desnecessários nas páginas iniciais de cada volume).
-                    if accumulated > max_bytes_safe * 0.75:
-                        actual = _pdf_to_bytes(part)
-                        if actual > max_bytes_safe:
-                            # Passou do limite: faz backtrack de 1 página.
-                            del part.pages[-1]
-                            i -= 1
-                            current_page -= 1
-                            added -= 1
-                            accumulated -= next_weight
-                            break
-                        # Recalibra estimativa com valor real medido.
-                        accumulated = actual
-
-                # ── Salva volume em disco ─────────────────────────────────────
-                buf = io.BytesIO()
-                part.save(buf)
-                ram_out.write_bytes(buf.getvalue())
-                size_mb = len(buf.getvalue()) / (1024 * 1024)
-                logging.info(f"Volume {vol}: {added} páginas — {size_mb:.2f} MB")
-                if on_volume:
-                    on_volume(vol, added, size_mb)
-
-                # ── OCR ───────────────────────────────────────────────────────
+        # ── Pós-processamento em ordem: OCR, verificação e destino final ─────
+        for vol, start in enumerate(sorted(saved), start=1):
+            if check_cancelled and check_cancelled():
+                return {"cancelled": True, "total_pages": total}
+
+            end, part_path, size, _ = saved[start]
+            added = end - start
+            final_out = out_dir / f"{pdf_path.stem}_VOL_{vol:02d}.pdf"
+            ram_out = ram_dir / f"{pdf_path.stem}_VOL_{vol:02d}.pdf"
+            os.replace(part_path, ram_out)
+
+            size_mb = size / (1024 * 1024)
+            logging.info(f"Volume {vol}: {added} páginas — {size_mb:.2f} MB")
+            if on_volume:
+                on_volume(vol, added, size_mb)
+
+            # ── OCR ───────────────────────────────────────────────────────
+            # Páginas do volume (1-based no volume) ainda sem OCR neste job
+            pendentes = {p - start for p in range(start + 1, end + 1)
+                         if p not in paginas_com_ocr}
+            if not pendentes:
+                logging.info(f"Volume {vol}: OCR já aplicado")
+            else:
                 try:
                     if on_ocr:
                         on_ocr(vol)
-                    paginas_ocr = get_paginas_necessitam_ocr(str(ram_out))
-                    if paginas_ocr is None:
-                        ocr(str(ram_out), str(ram_out))
-                    elif paginas_ocr:
+                    paginas_ocr = sorted(
+                        p for p in pendentes if profile.needs_ocr(start + p - 1)
+                    )
+                    if paginas_ocr:
                         ocr(str(ram_out), str(ram_out), pages=paginas_ocr)
                         logging.info(
                             f"Volume {vol}: OCR em {len(paginas_ocr)}/{added} páginas"
@@ -223,41 +314,40 @@ def split_pdf_only(
                 except Exception as e:
                     logging.warning(f"Falha no OCR do volume {vol}: {e}")
 
-                # ── Verificação pós-OCR ───────────────────────────────────────
-                post_ocr_size = ram_out.stat().st_size
+            # ── Verificação pós-OCR ───────────────────────────────────────
+            post_ocr_size = ram_out.stat().st_size
+            if post_ocr_size > max_bytes_hard:
+                logging.warning(
+                    f"Volume {vol} pós-OCR: {post_ocr_size/(1024*1024):.2f} MB "
+                    f"> {max_mb} MB — aplicando compressão corretiva…"
+                )
+                compressed = ram_dir / f"{pdf_path.stem}_VOL_{vol:02d}_c.pdf"
+                if _compress_volume_gs(str(ram_out), str(compressed)):
+                    cs = compressed.stat().st_size
+                    if cs < post_ocr_size:
+                        logging.info(
+                            f"Volume {vol}: {post_ocr_size/(1024*1024):.2f} MB "
+                            f"→ {cs/(1024*1024):.2f} MB"
+                        )
+                        ram_out.unlink()
+                        compressed.rename(ram_out)
+                        post_ocr_size = cs
+                    else:
+                        compressed.unlink(missing_ok=True)
+                        logging.warning(
+                            f"Volume {vol}: compressão não reduziu tamanho"
+                        )
+
                 if post_ocr_size > max_bytes_hard:
-                    logging.warning(
-                        f"Volume {vol} pós-OCR: {post_ocr_size/(1024*1024):.2f} MB "
-                        f"> {max_mb} MB — aplicando compressão corretiva…"
+                    logging.error(
+                        f"Volume {vol}: ainda {post_ocr_size/(1024*1024):.2f} MB "
+                        f"após compressão. Reduza max_mb ou páginas por volume."
                     )
-                    compressed = ram_dir / f"{pdf_path.stem}_VOL_{vol:02d}_c.pdf"
-                    if _compress_volume_gs(str(ram_out), str(compressed)):
-                        cs = compressed.stat().st_size
-                        if cs < post_ocr_size:
-                            logging.info(
-                                f"Volume {vol}: {post_ocr_size/(1024*1024):.2f} MB "
-                                f"→ {cs/(1024*1024):.2f} MB"
-                            )
-                            ram_out.unlink()
-                            compressed.rename(ram_out)
-                            post_ocr_size = cs
-                        else:
-                            compressed.unlink(missing_ok=True)
-                            logging.warning(
-                                f"Volume {vol}: compressão não reduziu tamanho"
-                            )
-
-                    if post_ocr_size > max_bytes_hard:
-                        logging.error(
-                            f"Volume {vol}: ainda {post_ocr_size/(1024*1024):.2f} MB "
-                            f"após compressão. Reduza max_mb ou páginas por volume."
-                        )
 
-                shutil.move(str(ram_out), str(final_out))
-                vol += 1
+            shutil.move(str(ram_out), str(final_out))
 
     finally:
-        # Garante limpeza do temp dir mesmo em caso de exceção
+        # Garante limpeza do diretório de trabalho mesmo em caso de exceção
         shutil.rmtree(str(ram_dir), ignore_errors=True)
 
-    return {"cancelled": False, "total_pages": total}
\ No newline at end of file
+    return {"cancelled": False, "total_pages": total}
@@ -0,0 +1,125 @@
+"""
+Ingestão de uploads em blocos.
+
+O arquivo enviado é copiado para o disco em blocos de UPLOAD_CHUNK_BYTES, e
+na mesma passada:
+  - calcula o SHA-256 (chave do cache de resultados)
+  - soma o tamanho e para assim que o orçamento do lote é excedido
+  - fareja o PDF nos bytes brutos: número de páginas e presença de campo de
+    assinatura
+
+O orçamento não rejeita o upload cedo: o werkzeug (e antes dele o waitress)
+já recebeu o corpo multipart inteiro quando o FileStorage chega aqui. A
+rejeição antes da leitura é a do MAX_CONTENT_LENGTH no app.py; o orçamento
+evita copiar e processar o excesso e cobre o lote somado.
+
+O farejamento só enxerga objetos não comprimidos. Se o PDF usa object
+streams (/ObjStm), páginas e anotações podem estar dentro deles: nesse caso
+o resultado é None ("não sei") e quem chama decide (ex.: has_signature).
+"""
+
+import os
+import re
+import hashlib
+
+from engines.constants import UPLOAD_CHUNK_BYTES
+
+# Bytes do fim do bloco anterior reexaminados junto com o próximo, para achar
+# padrões que atravessam a fronteira entre blocos
+_OVERLAP = 256
+
+_RE_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_RE_PAGES_COUNT = re.compile(
+    rb"/Type\s*/Pages(?![a-zA-Z])[^>]{0,200}?/Count\s+(\d+)"
+    rb"|/Count\s+(\d+)[^>]{0,200}?/Type\s*/Pages(?![a-zA-Z])"
+)
+_RE_SIG_FIELD = re.compile(rb"/FT\s*/Sig(?![a-zA-Z])")
+_RE_OBJSTM = re.compile(rb"/Type\s*/ObjStm(?![a-zA-Z])")
+
+
+class UploadTooLarge(Exception):
+    """O upload excedeu o orçamento de bytes; o arquivo parcial já foi removido."""
+
+
+class _PdfSniffer:
+    """Procura marcadores de PDF bloco a bloco, sem guardar o arquivo."""
+
+    def __init__(self):
+        self._tail = b""
+        self.leaf_pages = 0
+        self.tree_count = 0  # maior /Count de um nó /Pages (a raiz)
+        self.signature_field = False
+        self.object_streams = False
+
+    def feed(self, chunk: bytes) -> None:
+        window = self._tail + chunk
+        fresh = len(self._tail)  # matches que terminam antes daqui já foram contados
+
+        for m in _RE_PAGE.finditer(window):
+            if m.end() > fresh:
+                self.leaf_pages += 1
+        for m in _RE_PAGES_COUNT.finditer(window):
+            self.tree_count = max(self.tree_count, int(m.group(1) or m.group(2)))
+        if not self.signature_field and _RE_SIG_FIELD.search(window):
+            self.signature_field = True
+        if not self.object_streams and _RE_OBJSTM.search(window):
+            self.object_streams = True
+
+        self._tail = window[-_OVERLAP:]
+
+    @property
+    def pages(self) -> int | None:
+        if self.tree_count:
+            return self.tree_count
+        if self.object_streams:
+            return None
+        return self.leaf_pages or None
+
+    @property
+    def signature(self) -> bool | None:
+        if self.signature_field:
+            return True
+        return None if self.object_streams else False
+
+
+def save_upload(stream, dest_path: str, max_bytes: int) -> dict:
+    """
+    Copia `stream` para `dest_path` em blocos.
+
+    Args:
+        stream:    Objeto com read(n) (ex.: FileStorage.stream).
+        dest_path: Caminho de destino.
+        max_bytes: Orçamento restante do lote; excedido → UploadTooLarge.
+
+    Returns:
+        {"size": bytes, "sha256": hex, "pages": int | None,
+         "signature": bool | None}
+    """
+    digest = hashlib.sha256()
+    sniffer = _PdfSniffer()
+    size = 0
+    try:
+        with open(dest_path, "wb") as fp:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(dest_path)
+                fp.write(chunk)
+                digest.update(chunk)
+                sniffer.feed(chunk)
+    except BaseException:
+        try:
+            os.remove(dest_path)
+        except OSError:
+            pass
+        raise
+
+    return {
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "pages": sniffer.pages,
+        "signature": sniffer.signature,
+    }
@@ -0,0 +1,477 @@
+"""
+Fila durável de jobs em SQLite.
+
+O servidor web (app.py) só enfileira jobs e lê o estado; o processamento
+acontece nos processos worker (worker.py), que disputam os jobs da fila.
+Como tudo fica em disco, um reinício do servidor ou de um worker não perde
+jobs em espera nem em execução:
+
+  - enfileirado → "queued"; um worker o reivindica (claim) → "running"
+  - o worker grava o estado exibido ao usuário (mesmo formato do antigo
+    progress_db: status, etapa, status por arquivo...) e envia heartbeats
+    enquanto o job roda; as linhas de log ficam na tabela job_logs, uma por
+    linha (sem reescrever um texto que só cresce)
+  - ao terminar → "done" (com o caminho do artefato final), "error" ou
+    "cancelled"
+  - job "running" sem heartbeat há JOB_STALE_S (worker morreu) volta para
+    "queued", até JOB_MAX_ATTEMPTS tentativas
+
+Cada job pertence ao worker que o reivindicou: gravações de um worker que
+perdeu o job (reenfileirado ou cancelado) são ignoradas.
+
+Toda alteração incrementa jobs.version; o canal de progresso do servidor web
+(progress_hub.py) compara versões para saber o que mudou.
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+import contextlib
+from datetime import datetime
+
+from engines.constants import JOB_QUEUE_DB, JOB_STALE_S, JOB_MAX_ATTEMPTS
+
+try:
+    from zoneinfo import ZoneInfo
+    SAO_PAULO_TZ = ZoneInfo("America/Sao_Paulo")
+except ImportError:
+    import pytz
+    SAO_PAULO_TZ = pytz.timezone("America/Sao_Paulo")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+FINISHED = (DONE, ERROR, CANCELLED)
+
+# Status exibidos ao usuário (state["status"]) que encerram o acompanhamento
+FINAL_STATUS_LABELS = ("Concluído", "Falha no processamento", "Cancelado")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id               TEXT PRIMARY KEY,
+    status           TEXT NOT NULL,
+    payload          TEXT NOT NULL,
+    state            TEXT NOT NULL,
+    final_path       TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    worker           TEXT,
+    heartbeat        REAL,
+    version          INTEGER NOT NULL DEFAULT 0,
+    created_at       REAL NOT NULL,
+    updated_at       REAL NOT NULL,
+    finished_at      REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_logs (
+    job_id TEXT NOT NULL,
+    seq    INTEGER NOT NULL,
+    line   TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def sao_paulo_time_str():
+    return datetime.now(SAO_PAULO_TZ).strftime("%H:%M:%S")
+
+
+def log_line(msg: str) -> str:
+    """Linha de log com horário, no formato exibido ao usuário."""
+    return f"[{sao_paulo_time_str()}] {msg}"
+
+
+def _conn() -> sqlite3.Connection:
+    """Conexão da thread atual (sqlite3 não compartilha conexões entre threads)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(JOB_QUEUE_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
+
+def init_db() -> None:
+    """Cria as tabelas (idempotente)."""
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _conn()
+        conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "version" not in columns:  # banco criado antes do canal de progresso
+            conn.execute("ALTER TABLE jobs ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        _initialized = True
+
+
+@contextlib.contextmanager
+def _transaction():
+    """Transação de escrita exclusiva (BEGIN IMMEDIATE) entre processos."""
+    init_db()
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _append_logs(db: sqlite3.Connection, job_id: str, lines) -> None:
+    """Acrescenta linhas de log ao job (seq contínuo a partir do último)."""
+    lines = list(lines)
+    if not lines:
+        return
+    row = db.execute(
+        "SELECT COALESCE(MAX(seq), 0) FROM job_logs WHERE job_id = ?", (job_id,)
+    ).fetchone()
+    db.executemany(
+        "INSERT INTO job_logs (job_id, seq, line) VALUES (?, ?, ?)",
+        [(job_id, row[0] + i, line) for i, line in enumerate(lines, start=1)],
+    )
+
+
+def _row_to_job(row: sqlite3.Row | None) -> dict | None:
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["state"] = json.loads(job["state"])
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+# ── Servidor web ────────────────────────────────────────────────────────────
+
+def enqueue(job_id: str, payload: dict, state: dict, logs=()) -> None:
+    """
+    Enfileira um job.
+
+    Args:
+        job_id:  Identificador (task_id exposto ao front).
+        payload: Parâmetros do processamento (JSON-serializáveis).
+        state:   Estado inicial exibido ao usuário.
+        logs:    Linhas de log iniciais (já com horário, ver log_line).
+    """
+    now = time.time()
+    with _transaction() as db:
+        db.execute(
+            "INSERT INTO jobs (id, status, payload, state, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(payload), json.dumps(state), now, now),
+        )
+        _append_logs(db, job_id, logs)
+
+
+def get(job_id: str) -> dict | None:
+    """Job completo (payload e state já decodificados) ou None."""
+    init_db()
+    row = _conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row)
+
+
+def get_state(job_id: str) -> dict | None:
+    """Só o estado exibido ao usuário (consulta leve para o polling)."""
+    init_db()
+    row = _conn().execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return json.loads(row["state"]) if row else None
+
+
+def get_logs(job_id: str, after_seq: int = 0, limit: int | None = None) -> list[tuple[int, str]]:
+    """
+    Linhas de log do job com seq > `after_seq`, em ordem. Com `limit`,
+    devolve só as `limit` mais recentes.
+    """
+    init_db()
+    if limit is None:
+        rows = _conn().execute(
+            "SELECT seq, line FROM job_logs WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, after_seq),
+        ).fetchall()
+    else:
+        rows = _conn().execute(
+            "SELECT seq, line FROM job_logs WHERE job_id = ? AND seq > ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (job_id, after_seq, limit),
+        ).fetchall()[::-1]
+    return [(row["seq"], row["line"]) for row in rows]
+
+
+def get_versions(job_ids) -> dict[str, int]:
+    """Versão atual de cada job (ausentes = removidos)."""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return {}
+    init_db()
+    rows = _conn().execute(
+        f"SELECT id, version FROM jobs WHERE id IN ({','.join('?' * len(job_ids))})",
+        job_ids,
+    ).fetchall()
+    return {row["id"]: row["version"] for row in rows}
+
+
+def request_cancel(job_id: str) -> str | None:
+    """
+    Pede o cancelamento do job. Um job ainda na fila é cancelado na hora;
+    um job em execução é interrompido pelo worker no próximo ponto de
+    verificação.
+
+    Returns:
+        None em caso de sucesso, ou a mensagem de erro.
+    """
+    with _transaction() as db:
+        row = db.execute(
+            "SELECT status, state FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return "Tarefa não encontrada"
+        state = json.loads(row["state"])
+        if row["status"] in FINISHED or state.get("status") in FINAL_STATUS_LABELS:
+            return "Tarefa já finalizada"
+
+        state.update(
+            cancelled=True,
+            status="Cancelado",
+            stage="cancelled",
+            stage_label="Cancelado",
+            stage_detail="Cancelamento solicitado",
+        )
+        _append_logs(db, job_id, [log_line("Cancelamento solicitado.")])
+
+        now = time.time()
+        if row["status"] == QUEUED:
+            db.execute(
+                "UPDATE jobs SET status = ?, state = ?, cancel_requested = 1, "
+                "version = version + 1, updated_at = ?, finished_at = ? WHERE id = ?",
+                (CANCELLED, json.dumps(state), now, now, job_id),
+            )
+        else:
+            db.execute(
+                "UPDATE jobs SET state = ?, cancel_requested = 1, "
+                "version = version + 1, updated_at = ? WHERE id = ?",
+                (json.dumps(state), now, job_id),
+            )
+    return None
+
+
+def count_active() -> int:
+    """Jobs na fila ou em execução."""
+    init_db()
+    row = _conn().execute(
+        "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+    ).fetchone()
+    return row[0]
+
+
+def purge_finished(max_age_hours: float) -> int:
+    """Remove jobs finalizados há mais de `max_age_hours`."""
+    cutoff = time.time() - max_age_hours * 3600
+    finished = ",".join("?" * len(FINISHED))
+    with _transaction() as db:
+        db.execute(
+            f"DELETE FROM job_logs WHERE job_id IN (SELECT id FROM jobs "
+            f"WHERE status IN ({finished}) AND finished_at < ?)",
+            (*FINISHED, cutoff),
+        )
+        cur = db.execute(
+            f"DELETE FROM jobs WHERE status IN ({finished}) AND finished_at < ?",
+            (*FINISHED, cutoff),
+        )
+    return cur.rowcount
+
+
+# ── Workers ─────────────────────────────────────────────────────────────────
+
+def claim(worker: str) -> dict | None:
+    """Reivindica o job mais antigo da fila (atômico entre processos)."""
+    now = time.time()
+    with _transaction() as db:
+        row = db.execute(
+            "SELECT * FROM jobs WHERE status = ? AND cancel_requested = 0 "
+            "ORDER BY created_at LIMIT 1",
+            (QUEUED,),
+        ).fetchone()
+        if row is None:
+            return None
+        db.execute(
+            "UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, "
+            "attempts = attempts + 1, version = version + 1, updated_at = ? "
+            "WHERE id = ?",
+            (RUNNING, worker, now, now, row["id"]),
+        )
+    job = _row_to_job(row)
+    job["status"] = RUNNING
+    job["worker"] = worker
+    job["attempts"] += 1
+    return job
+
+
+def save_progress(job_id: str, worker: str, state_json: str | None, logs=()) -> bool:
+    """
+    Grava numa única transação o estado do job (já serializado; None = sem
+    mudança) e novas linhas de log. Também vale como heartbeat.
+
+    Com cancelamento pedido, só os logs são gravados: o estado exibido
+    continua o do pedido de cancelamento.
+
+    Returns:
+        False se o job não pertence mais a `worker` (nada é gravado).
+    """
+    now = time.time()
+    with _transaction() as db:
+        row = db.execute(
+            "SELECT cancel_requested FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+            (job_id, worker, RUNNING),
+        ).fetchone()
+        if row is None:
+            return False
+        _append_logs(db, job_id, logs)
+        if state_json is not None and not row["cancel_requested"]:
+            db.execute(
+                "UPDATE jobs SET state = ?, heartbeat = ?, version = version + 1, "
+                "updated_at = ? WHERE id = ?",
+                (state_json, now, now, job_id),
+            )
+        else:
+            db.execute(
+                "UPDATE jobs SET heartbeat = ?, version = version + 1, updated_at = ? "
+                "WHERE id = ?",
+                (now, now, job_id),
+            )
+    return True
+
+
+def should_stop(job_id: str, worker: str) -> bool:
+    """True se o cancelamento foi pedido ou o job não pertence mais a `worker`."""
+    init_db()
+    row = _conn().execute(
+        "SELECT status, worker, cancel_requested FROM jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    return (
+        row is None
+        or bool(row["cancel_requested"])
+        or row["status"] != RUNNING
+        or row["worker"] != worker
+    )
+
+
+def finish(job_id: str, worker: str, status: str, state: dict,
+           final_path: str | None = None) -> None:
+    """
+    Encerra o job com `status` (DONE, ERROR ou CANCELLED).
+
+    Se o cancelamento foi pedido nesse meio tempo, o job termina como
+    CANCELLED e mantém o estado gravado pelo pedido de cancelamento.
+    """
+    now = time.time()
+    with _transaction() as db:
+        cur = db.execute(
+            "UPDATE jobs SET status = ?, state = ?, final_path = ?, heartbeat = ?, "
+            "version = version + 1, updated_at = ?, finished_at = ? "
+            "WHERE id = ? AND worker = ? AND status = ? AND cancel_requested = 0",
+            (status, json.dumps(state), final_path, now, now, now,
+             job_id, worker, RUNNING),
+        )
+        if cur.rowcount == 0:
+            db.execute(
+                "UPDATE jobs SET status = ?, version = version + 1, updated_at = ?, "
+                "finished_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (CANCELLED, now, now, job_id, worker, RUNNING),
+            )
+
+
+def heartbeat(worker: str) -> None:
+    """Renova o heartbeat de todos os jobs em execução de `worker`."""
+    init_db()
+    _conn().execute(
+        "UPDATE jobs SET heartbeat = ? WHERE worker = ? AND status = ?",
+        (time.time(), worker, RUNNING),
+    )
+
+
+def _cancel_requested_running(db, now: float, where: str, params: tuple) -> None:
+    """Encerra como CANCELLED os jobs em execução que já tinham cancelamento
+    pedido (em vez de devolvê-los à fila)."""
+    db.execute(
+        f"UPDATE jobs SET status = ?, version = version + 1, updated_at = ?, "
+        f"finished_at = ? WHERE status = ? AND cancel_requested = 1 AND {where}",
+        (CANCELLED, now, now, RUNNING, *params),
+    )
+
+
+def release(worker: str) -> int:
+    """Devolve à fila os jobs em execução de `worker` (parada do worker)."""
+    now = time.time()
+    with _transaction() as db:
+        _cancel_requested_running(db, now, "worker = ?", (worker,))
+        cur = db.execute(
+            "UPDATE jobs SET status = ?, worker = NULL, attempts = attempts - 1, "
+            "version = version + 1, updated_at = ? WHERE worker = ? AND status = ?",
+            (QUEUED, now, worker, RUNNING),
+        )
+    if cur.rowcount:
+        logging.info(f"[fila] {cur.rowcount} job(s) devolvido(s) à fila por {worker}")
+    return cur.rowcount
+
+
+def requeue_stale(stale_s: float = JOB_STALE_S,
+                  max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """
+    Reenfileira jobs "running" sem heartbeat há `stale_s` segundos (worker
+    morreu ou foi reiniciado). Após `max_attempts` tentativas o job é
+    marcado como falho.
+    """
+    now = time.time()
+    requeued = failed = 0
+    with _transaction() as db:
+        _cancel_requested_running(db, now, "heartbeat < ?", (now - stale_s,))
+        rows = db.execute(
+            "SELECT id, state, attempts FROM jobs WHERE status = ? AND heartbeat < ?",
+            (RUNNING, now - stale_s),
+        ).fetchall()
+        for row in rows:
+            state = json.loads(row["state"])
+            if row["attempts"] >= max_attempts:
+                state.update(
+                    status="Falha no processamento",
+                    stage="error",
+                    stage_label="Falha",
+                    stage_detail="Worker interrompido repetidas vezes",
+                )
+                _append_logs(db, row["id"], [log_line(
+                    f"ERRO: worker interrompido ({row['attempts']} tentativa(s))."
+                )])
+                db.execute(
+                    "UPDATE jobs SET status = ?, state = ?, version = version + 1, "
+                    "updated_at = ?, finished_at = ? WHERE id = ?",
+                    (ERROR, json.dumps(state), now, now, row["id"]),
+                )
+                failed += 1
+            else:
+                _append_logs(db, row["id"], [log_line(
+                    "Worker interrompido. Job devolvido à fila."
+                )])
+                db.execute(
+                    "UPDATE jobs SET status = ?, state = ?, worker = NULL, "
+                    "version = version + 1, updated_at = ? WHERE id = ?",
+                    (QUEUED, json.dumps(state), now, row["id"]),
+                )
+                requeued += 1
+
+    if requeued or failed:
+        logging.warning(
+            f"[fila] Jobs sem heartbeat: {requeued} reenfileirado(s), {failed} falho(s)"
+        )
+    return requeued
@@ -0,0 +1,139 @@
+"""
+Canal de progresso publish/subscribe por tarefa (servidor web).
+
+Antes, cada conexão de /progress acordava a cada 0,5 s, reserializava a
+tarefa inteira e recortava os logs de um texto que só crescia. Agora:
+
+  - uma única thread de observação (criada sob demanda) consulta só as
+    versões (jobs.version) das tarefas com assinantes, a cada
+    PROGRESS_POLL_S; para as que mudaram, busca o estado e as linhas de log
+    novas e acorda os assinantes daquela tarefa
+  - cada tarefa tem um anel de logs limitado (PROGRESS_LOG_RING): quem
+    assina no meio do job recebe as últimas linhas, não o histórico inteiro
+  - o assinante espera numa Condition: conexão ociosa não consulta nada e
+    só acorda quando há mudança (ou para o keepalive)
+
+O canal some quando o último assinante sai. Como o processamento roda em
+outros processos (worker.py), a origem das mudanças é o banco da fila.
+"""
+
+import time
+import logging
+import threading
+import collections
+
+import job_queue
+from engines.constants import PROGRESS_POLL_S, PROGRESS_LOG_RING
+
+
+class TaskChannel:
+    """Último estado conhecido de uma tarefa e o anel de logs recentes."""
+
+    def __init__(self, task_id: str, lock: threading.Lock):
+        self.task_id = task_id
+        self.cond = threading.Condition(lock)  # acorda só os assinantes desta tarefa
+        self.version = -1
+        self.state: dict = {}
+        self.logs: collections.deque = collections.deque(maxlen=PROGRESS_LOG_RING)
+        self.log_seq = 0  # seq da última linha recebida
+        self.gone = False  # tarefa removida do banco
+        self.subscribers = 0
+
+    def logs_after(self, seq: int) -> list[tuple[int, str]]:
+        """Linhas do anel com seq > `seq`."""
+        return [item for item in self.logs if item[0] > seq]
+
+
+class ProgressHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels: dict[str, TaskChannel] = {}
+        self._watcher: threading.Thread | None = None
+
+    def subscribe(self, task_id: str) -> TaskChannel | None:
+        """Assina a tarefa; None se ela não existe."""
+        with self._lock:
+            channel = self._channels.get(task_id)
+            if channel is not None:
+                channel.subscribers += 1
+                return channel
+
+        channel = TaskChannel(task_id, self._lock)
+        if not self._refresh(channel):
+            return None
+
+        with self._lock:
+            # Outra conexão pode ter criado o canal enquanto carregávamos
+            channel = self._channels.setdefault(task_id, channel)
+            channel.subscribers += 1
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(
+                    target=self._watch_loop, name="progress-hub", daemon=True
+                )
+                self._watcher.start()
+            return channel
+
+    def unsubscribe(self, channel: TaskChannel) -> None:
+        with self._lock:
+            channel.subscribers -= 1
+            if channel.subscribers <= 0:
+                self._channels.pop(channel.task_id, None)
+
+    def wait(self, channel: TaskChannel, version: int, timeout: float) -> bool:
+        """Bloqueia até a versão do canal mudar de `version` (ou timeout)."""
+        with channel.cond:
+            return channel.cond.wait_for(
+                lambda: channel.version != version or channel.gone, timeout
+            )
+
+    def _refresh(self, channel: TaskChannel) -> bool:
+        """Carrega estado e logs novos do banco. False se a tarefa não existe."""
+        job = job_queue.get(channel.task_id)
+        if job is None:
+            return False
+        if channel.log_seq:
+            logs = job_queue.get_logs(channel.task_id, after_seq=channel.log_seq)
+        else:
+            logs = job_queue.get_logs(channel.task_id, limit=PROGRESS_LOG_RING)
+
+        with self._lock:
+            channel.state = job["state"]
+            channel.logs.extend(logs)
+            if logs:
+                channel.log_seq = logs[-1][0]
+            channel.version = job["version"]
+        return True
+
+    def _watch_loop(self) -> None:
+        while True:
+            with self._lock:
+                if not self._channels:
+                    self._watcher = None
+                    return
+                known = {tid: ch.version for tid, ch in self._channels.items()}
+
+            try:
+                versions = job_queue.get_versions(known)
+                for task_id, version in known.items():
+                    current = versions.get(task_id)
+                    if current == version:
+                        continue
+                    with self._lock:
+                        channel = self._channels.get(task_id)
+                    if channel is None:
+                        continue
+                    if current is None or not self._refresh(channel):
+                        channel.gone = True
+                    with channel.cond:
+                        channel.cond.notify_all()
+            except Exception as e:
+                logging.warning(f"[progresso] Falha ao consultar a fila: {e}")
+
+            time.sleep(PROGRESS_POLL_S)
+
+
+_hub = ProgressHub()
+
+
+def get_hub() -> ProgressHub:
+    return _hub
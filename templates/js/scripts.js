@@ -530,6 +530,10 @@ function iniciarSSE(taskId, fileCount) {
   const isBatch = (fileCount || 1) > 1;
   let lastStatus = '';
   let lastStatusTs = Date.now();
+  // O servidor envia só os campos que mudaram: o estado completo é mantido aqui
+  const progressState = {};
+  let elapsedBase = 0;
+  let elapsedAt = Date.now();
 
   // Show/hide batch tracker
   if (batchTracker) batchTracker.style.display = isBatch ? 'block' : 'none';
@@ -612,8 +616,19 @@ function iniciarSSE(taskId, fileCount) {
     return detail || `Processando documento${dots}`;
   }
 
+  // Sem mudanças o servidor não envia eventos: tempo decorrido e mensagem
+  // rápida avançam localmente
+  const tickTimer = setInterval(() => {
+    if (finalized || !progressState.status) return;
+    const now = Date.now();
+    if (elapsedText) elapsedText.innerText = formatElapsed(elapsedBase + Math.floor((now - elapsedAt) / 1000));
+    const stalledSecs = Math.max(0, Math.floor((now - lastStatusTs) / 1000));
+    if (quickMessages) quickMessages.innerText = buildQuickMessage(progressState, stalledSecs);
+  }, 1000);
+
   function closeSSEAndPolling() {
     try { eventSource.close(); } catch (e) {}
+    clearInterval(tickTimer);
     if (pollingTimer) {
       clearInterval(pollingTimer);
       pollingTimer = null;
@@ -656,7 +671,14 @@ function iniciarSSE(taskId, fileCount) {
   }
 
   eventSource.onmessage = function(event) {
-    const data = JSON.parse(event.data);
+    const delta = JSON.parse(event.data);
+    Object.assign(progressState, delta);
+    const data = progressState;
+    data.logs = delta.logs || [];
+    if (delta.elapsed !== undefined) {
+      elapsedBase = delta.elapsed;
+      elapsedAt = Date.now();
+    }
 
     const now = Date.now();
     if (data.status !== lastStatus) {
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# Os testes importam os módulos do app (engines.*) a partir da raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def _caches_in_tmp(tmp_path, monkeypatch):
+    """Caches em disco (caminhos absolutos na raiz do app) dentro do tmp_path."""
+    from engines import page_profile, result_cache
+
+    monkeypatch.setattr(page_profile, "PAGE_PROFILE_DIR", str(tmp_path / "page_profile_cache"))
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_DIR", str(tmp_path / "result_cache"))
@@ -0,0 +1,45 @@
+import os
+import random
+
+import fitz
+
+from engines import high_performance_ocr as hp
+
+
+def _fragment(path, n):
+    """Fragmento de página única com ~200 KB (imagem de ruído) e o número da página."""
+    pix = fitz.Pixmap(fitz.csRGB, 260, 260, os.urandom(260 * 260 * 3), False)
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(fitz.Rect(50, 100, 300, 350), pixmap=pix)
+    page.insert_text((50, 60), f"pagina {n}")
+    doc.save(str(path))
+    doc.close()
+
+
+def test_memory_bounded_by_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(hp, "HP_ASSEMBLER_BUFFER_MB", 0.5)
+    total = 20
+    work = tmp_path / "work"
+    work.mkdir()
+    order = list(range(1, total + 1))
+    random.Random(7).shuffle(order)
+
+    assembler = hp._OrderedAssembler(total, str(work))
+    max_sources = 0
+    try:
+        for n in order:
+            frag = tmp_path / f"frag_{n}.pdf"
+            _fragment(frag, n)
+            assembler.add(n, str(frag))
+            max_sources = max(max_sources, len(assembler._sources))
+        out = tmp_path / "out.pdf"
+        assembler.finalize(str(out))
+    finally:
+        assembler.close()
+
+    assert max_sources <= 3  # ~200 KB cada, buffer de 0,5 MB
+    assert os.listdir(work) == []  # checkpoints removidos no close
+    with fitz.open(str(out)) as doc:
+        assert [p.get_text().strip() for p in doc] == [f"pagina {n}" for n in range(1, total + 1)]
+        assert all(len(p.get_images()) == 1 for p in doc)
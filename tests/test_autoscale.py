@@ -0,0 +1,36 @@
+import time
+
+from engines.scheduler import get_scheduler
+
+_ALLOC_MB = 200
+
+
+def _hold_memory(seconds):
+    data = b"\x01" * (_ALLOC_MB * 1024 * 1024)  # páginas tocadas: entram no RSS
+    time.sleep(seconds)
+    return len(data)
+
+
+def test_governor_observes_pool_worker_rss():
+    scheduler = get_scheduler()
+    governor = scheduler._governor
+
+    with scheduler.open_job("teste autoscale", total_pages=1) as job:
+        future = job.submit(_hold_memory, 6)
+
+        observed = 0.0
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and not future.done():
+            if scheduler._worker_pids():
+                governor.per_worker_mb = 0.0
+                for _ in range(20):
+                    governor._observe_worker_mb()
+                observed = max(observed, governor.per_worker_mb)
+                if observed > _ALLOC_MB * 0.8:
+                    break
+            time.sleep(0.2)
+
+        assert future.result(timeout=30) == _ALLOC_MB * 1024 * 1024
+
+    # forkserver/resource_tracker (~13 MB) não entram na média
+    assert observed > _ALLOC_MB * 0.8
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from engines.blank_page import pixels_blank
+
+
+def _page(paper, ink=None, channels=0):
+    shape = (1100, 850, channels) if channels else (1100, 850)
+    arr = np.full(shape, paper, dtype=np.uint8)
+    if ink is not None:
+        for y in range(100, 1000, 40):
+            arr[y:y + 4, 80:770] = ink
+    return arr
+
+
+@pytest.mark.parametrize(
+    "arr, blank",
+    [
+        (_page(255), True),
+        (_page(235), True),                       # papel acinzentado
+        (_page(255, ink=20), False),              # texto escuro em papel branco
+        (_page(0), True),                         # página toda preta, sem conteúdo
+        (_page(0, ink=255), False),               # texto branco em fundo preto
+        (_page(40, ink=200), False),              # capa escura com título claro
+        (_page(0, ink=(255, 220, 0), channels=3), False),  # texto amarelo em fundo preto
+        (_page((250, 240, 180), channels=3), True),        # papel amarelado, sem tinta
+    ],
+    ids=["branca", "cinza", "texto", "preta", "invertida", "capa-escura",
+         "invertida-cor", "papel-amarelado"],
+)
+def test_pixels_blank(arr, blank):
+    assert pixels_blank(arr) is blank
@@ -0,0 +1,73 @@
+import os
+
+import io
+
+import fitz
+import pytest
+from PIL import Image
+
+from engines import high_performance_ocr as hp
+
+# Escada de teste: cinco passadas com DPIs distintos (a largura em pixels,
+# proporcional ao DPI, identifica a passada no _build_jpeg_page_pdf substituto)
+_LADDER = [(150, 90), (120, 80), (100, 70), (80, 60), (60, 50)]
+
+
+def _noisy_page(path):
+    """Fragmento de página única acima do limite (imagem de ruído, sem compressão)."""
+    pix = fitz.Pixmap(fitz.csRGB, 700, 990, os.urandom(700 * 990 * 3), False)
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=pix)
+    doc.save(str(path))
+    doc.close()
+
+
+def _sized_build(sizes_kb):
+    """
+    _build_jpeg_page_pdf que completa cada passada até o tamanho pedido
+    (o JPEG é reduzido antes, para caber em qualquer tamanho da escada).
+    """
+    real = hp._build_jpeg_page_pdf
+
+    def build(jpg_bytes, w_px, h_px, w_pt, h_pt):
+        img = Image.open(io.BytesIO(jpg_bytes)).reduce(8)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=50)
+        data = real(buf.getvalue(), img.width, img.height, w_pt, h_pt)
+        w_px = img.width * 8
+        dpi = w_px / w_pt * 72
+        idx = min(range(len(_LADDER)), key=lambda i: abs(_LADDER[i][0] - dpi))
+        return data + b"%" * max(0, sizes_kb[idx] * 1024 - len(data))
+
+    return build
+
+
+@pytest.fixture
+def page(tmp_path, monkeypatch):
+    monkeypatch.setattr(hp, "_DPI_PASSES", _LADDER)
+    path = tmp_path / "page.pdf"
+    _noisy_page(path)
+    assert path.stat().st_size > hp.PAGE_SIZE_LIMIT
+    return path
+
+
+def test_non_monotonic_ladder_falls_back_to_linear_walk(page, monkeypatch):
+    # Só a 2ª passada cabe em 500 KB; as demais crescem a partir da 3ª,
+    # então a busca binária terminaria na 5ª sem ver a 2ª
+    monkeypatch.setattr(hp, "_build_jpeg_page_pdf", _sized_build([900, 300, 600, 700, 800]))
+    monkeypatch.setattr(hp, "_detect_blank_pdf", lambda path: False)
+    hp._compress_page_extra(str(page), {}, str(page.parent))
+    assert page.stat().st_size // 1024 == 300
+
+
+def test_tiny_candidate_is_rejected(page, monkeypatch):
+    original = page.read_bytes()
+    tiny = fitz.open()
+    tiny.new_page()
+    tiny_bytes = tiny.tobytes()
+    assert len(tiny_bytes) < 1024
+    monkeypatch.setattr(hp, "_build_jpeg_page_pdf", lambda *a: tiny_bytes)
+    monkeypatch.setattr(hp, "_detect_blank_pdf", lambda path: False)
+    hp._compress_page_extra(str(page), {}, str(page.parent))
+    assert page.read_bytes() == original
@@ -0,0 +1,32 @@
+import os
+
+import fitz
+
+from engines import high_performance_ocr as hp
+
+
+def test_failed_page_leaves_no_files_in_work_dir(tmp_path, monkeypatch):
+    src = tmp_path / "src.pdf"
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "conteúdo")
+    doc.save(str(src))
+    doc.close()
+    work = tmp_path / "work"
+    work.mkdir()
+
+    def fake_ocr(pix, output_pdf, page_num):
+        with fitz.open() as out:
+            out.new_page()
+            out.save(output_pdf)
+
+    def boom(path):
+        raise RuntimeError("falha na validação")
+
+    monkeypatch.setattr(hp, "OCR_IN_MEMORY", True)
+    monkeypatch.setattr(hp, "HP_SKIP_BLANK_PAGES", False)
+    monkeypatch.setattr(hp, "ocr_pixmap_to_pdf", fake_ocr)
+    monkeypatch.setattr(hp, "_detect_blank_pdf", boom)
+
+    result = hp._ocr_page((str(src), 1, str(work)))
+    assert result["success"] is False
+    assert os.listdir(work) == []
@@ -0,0 +1,64 @@
+import io
+
+import fitz
+import numpy as np
+import pikepdf
+import pytest
+
+from engines.page_profile import build_page_profile
+from engines.page_weights import VolumeSizer
+
+
+def _make_pdf(path, pages=12, deflate=True, images=False):
+    doc = fitz.open()
+    rng = np.random.default_rng(0)
+    logo = fitz.Pixmap(fitz.csRGB, 64, 64, (rng.random(64 * 64 * 3) * 255).astype("uint8").tobytes(), False)
+    for i in range(pages):
+        page = doc.new_page()
+        for line in range(40):
+            page.insert_text((40, 60 + line * 18), f"Página {i + 1} linha {line} " + "texto " * 12, fontsize=9)
+        if images:
+            page.insert_image(fitz.Rect(400, 20, 460, 80), pixmap=logo)  # compartilhada
+            if i % 3 == 0:
+                arr = (rng.random((300, 200, 3)) * 255).astype("uint8")
+                page.insert_image(
+                    fitz.Rect(50, 400, 350, 800),
+                    pixmap=fitz.Pixmap(fitz.csRGB, 200, 300, arr.tobytes(), False),
+                )
+    # expand=255: grava todos os streams descomprimidos, sem /Filter
+    doc.save(str(path), deflate=deflate, expand=0 if deflate else 255)
+    doc.close()
+
+
+def _real_size(path, start, end):
+    """Tamanho de [start, end) salvo como no split (pikepdf.save)."""
+    with pikepdf.open(str(path)) as src:
+        part = pikepdf.Pdf.new()
+        for idx in range(start, end):
+            part.pages.append(src.pages[idx])
+        buf = io.BytesIO()
+        part.save(buf)
+        return len(buf.getvalue())
+
+
+@pytest.mark.parametrize(
+    "deflate, images",
+    [(True, False), (False, False), (True, True), (False, True)],
+    ids=["texto", "texto-sem-filtro", "imagens", "imagens-sem-filtro"],
+)
+def test_estimates_match_real_saves(tmp_path, deflate, images):
+    path = tmp_path / "doc.pdf"
+    _make_pdf(path, deflate=deflate, images=images)
+
+    with fitz.open(str(path)) as doc:
+        profile = build_page_profile(doc)
+    sizer = VolumeSizer(profile)
+
+    for i in range(profile.count):
+        real = _real_size(path, i, i + 1)
+        assert abs(profile.isolated(i) - real) <= max(0.15 * real, 1024), (i, profile.isolated(i), real)
+
+    for start, end in [(0, 4), (3, 9), (0, profile.count)]:
+        real = _real_size(path, start, end)
+        estimate = sizer.sizes_from(start, end, 1 << 40)[-1]
+        assert abs(estimate - real) <= max(0.15 * real, 2048), (start, end, estimate, real)
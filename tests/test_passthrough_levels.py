@@ -0,0 +1,51 @@
+import io
+import shutil
+
+import fitz
+import pytest
+from PIL import Image, ImageDraw
+
+from engines import high_performance_ocr as hp
+from engines.constants import TESSERACT_DPI
+
+
+def _scanned_page(path):
+    """Página como sai do OCR: um JPEG da página inteira a TESSERACT_DPI."""
+    w_px = round(595 * TESSERACT_DPI / 72)
+    h_px = round(842 * TESSERACT_DPI / 72)
+    img = Image.new("RGB", (w_px, h_px), "white")
+    draw = ImageDraw.Draw(img)
+    for y in range(80, h_px - 80, 24):
+        draw.line((80, y, w_px - 80, y + (y % 7)), fill=(30, 30, 30), width=3)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_image(page.rect, stream=buf.getvalue())
+    doc.save(str(path))
+    doc.close()
+
+
+def test_distill_follows_selected_level(tmp_path):
+    page = tmp_path / "page.pdf"
+    _scanned_page(page)
+    assert hp._page_needs_distill(str(page), hp._resolve_gs_compression(3))
+    assert not hp._page_needs_distill(str(page), hp._resolve_gs_compression(1))
+
+
+@pytest.mark.skipif(
+    not (shutil.which("gs") or shutil.which("gswin64c")),
+    reason="Ghostscript não instalado",
+)
+def test_level_3_smaller_than_level_1(tmp_path):
+    sizes = {}
+    for level in (1, 3):
+        page = tmp_path / f"page_{level}.pdf"
+        _scanned_page(page)
+        hp._compress_page_task(
+            (str(page), 1, hp._resolve_gs_compression(level), str(tmp_path),
+             False, False, True)
+        )
+        sizes[level] = page.stat().st_size
+    assert sizes[3] < sizes[1]
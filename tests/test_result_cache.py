@@ -0,0 +1,52 @@
+import os
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+from engines import result_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_worker(cache_dir, code):
+    """Executa `code` noutro processo, como o worker.py, com o cache em `cache_dir`."""
+    script = (
+        "from engines import result_cache\n"
+        f"result_cache.RESULT_CACHE_DIR = {str(cache_dir)!r}\n" + code
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True)
+
+
+def test_stats_are_shared_between_processes(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    pdf = tmp_path / "out.pdf"
+    pdf.write_bytes(b"%PDF-1.4\n%%EOF\n")
+
+    _run_worker(
+        cache_dir,
+        "key = result_cache.make_key('abc', level=1)\n"
+        "assert result_cache.lookup(key) is None\n"
+        f"result_cache.store(key, [({str(pdf)!r}, '')])\n"
+        "assert result_cache.lookup(key)\n",
+    )
+
+    # Processo "web": nunca chamou lookup/store
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(result_cache, "_local", type(result_cache._local)())
+    stats = result_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 1, 1)
+    assert stats["entries"] == 1
+
+
+def test_restore_after_eviction_raises_oserror(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_DIR", str(tmp_path / "cache"))
+    src = tmp_path / "out.pdf"
+    src.write_bytes(b"%PDF-1.4 teste")
+    key = result_cache.make_key("abc", nivel=3)
+    result_cache.store(key, [(str(src), "")])
+    cached = result_cache.lookup(key)
+    shutil.rmtree(os.path.join(str(tmp_path / "cache"), key))  # evicção concorrente
+    with pytest.raises(OSError):
+        result_cache.restore(cached[0][0], str(tmp_path / "dest.pdf"))
@@ -0,0 +1,89 @@
+import array
+
+import fitz
+import pikepdf
+import pytest
+
+from engines import page_profile, split_only
+from engines.force_ocr import get_paginas_com_ocr, marcar_ocr
+
+
+def _scaled_profile(factor):
+    """get_page_profile com os bytes multiplicados: estimativa com erro sistemático."""
+    real = page_profile.get_page_profile
+
+    def get(path, content_hash=None):
+        p = real(path, content_hash)
+        fields = {name: getattr(p, name) for name, _ in page_profile._FIELDS}
+        for name in ("obj_size", "page_bytes"):
+            fields[name] = array.array("I", (int(v * factor) for v in fields[name]))
+        return page_profile.PageProfile(p.count, **fields)
+
+    return get
+
+
+@pytest.mark.parametrize("factor", [4.0, 0.5], ids=["estimativa-inflada", "estimativa-otimista"])
+def test_volume_count_follows_real_sizes(tmp_path, monkeypatch, factor):
+    src = tmp_path / "doc.pdf"
+    doc = fitz.open()
+    for i in range(60):
+        doc.new_page().insert_text((40, 60), f"Página {i + 1} " + "texto " * 300, fontsize=6)
+    doc.save(str(src))
+    doc.close()
+
+    max_mb = src.stat().st_size / (1024 * 1024) / 3  # ~4 volumes
+    monkeypatch.setattr(split_only, "get_page_profile", _scaled_profile(factor))
+    result = split_only.split_pdf_only(src, tmp_path / "out", max_mb)
+    volumes = sorted((tmp_path / "out").glob("doc_VOL_*.pdf"))
+
+    # Referência: o plano com a estimativa sem erro
+    monkeypatch.setattr(split_only, "get_page_profile", page_profile.get_page_profile)
+    sizer = split_only.VolumeSizer(page_profile.get_page_profile(str(src)))
+    safe = int(max_mb * 1024 * 1024 * split_only.SAFETY_MARGIN)
+    expected = len(split_only._planejar_volumes(sizer, int(safe * split_only._PLAN_SLACK)))
+
+    assert result == {"cancelled": False, "total_pages": 60}
+    assert expected > 1
+    assert len(volumes) <= expected + 1
+    assert all(v.stat().st_size <= safe for v in volumes)
+
+
+def _scanned_pdf(path, pages, text_layer=False):
+    """
+    PDF com páginas de imagem dominante (precisam de OCR). Com text_layer,
+    cada página ganha poucas palavras de texto invisível, como um OCR curto.
+    """
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 200, 280), False)
+    pix.clear_with(200)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_image(page.rect, pixmap=pix)
+        if text_layer:
+            page.insert_text((72, 72), "Ofício nº 12", render_mode=3)
+    doc.save(str(path))
+    doc.close()
+
+
+@pytest.mark.parametrize(
+    "text_layer, coverage, expected",
+    [(False, None, [1, 2, 3]), (False, {1, 2, 3}, []), (True, None, [])],
+    ids=["marcador-sem-texto", "cobertura-do-job", "marcador-confirmado"],
+)
+def test_ocr_marker_checked_against_text_layer(
+    tmp_path, monkeypatch, text_layer, coverage, expected
+):
+    src = tmp_path / "scan.pdf"
+    _scanned_pdf(src, 3, text_layer)
+    with pikepdf.open(str(src), allow_overwriting_input=True) as pdf:
+        marcar_ocr(pdf, range(1, 4))
+        pdf.save(str(src))
+
+    chamadas = []
+    monkeypatch.setattr(
+        split_only, "ocr", lambda inp, out, pages: chamadas.extend(pages)
+    )
+    split_only.split_pdf_only(src, tmp_path / "out", 50, paginas_com_ocr=coverage)
+
+    assert get_paginas_com_ocr(str(src)) == {1, 2, 3}
+    assert sorted(chamadas) == expected
@@ -0,0 +1,769 @@
+"""
+Processo worker da fila de jobs (job_queue.py).
+
+Reivindica jobs enfileirados pelo servidor web e executa o pipeline de
+processamento (HP-OCR com fallback, divisão em volumes, ZIP do lote),
+gravando o progresso no banco da fila. Cada processo atende até
+JOB_WORKER_CONCURRENCY jobs ao mesmo tempo, todos compartilhando o
+escalonador de páginas do processo (engines.scheduler).
+
+Uso:
+    python worker.py            # worker avulso (JOB_WORKERS = 0 no app.py)
+    python worker.py --parent-pid <pid>
+                                # iniciado pelo app.py; encerra junto com ele
+
+Um worker encerrado (SIGTERM/SIGINT) devolve seus jobs à fila; um worker
+que morre sem avisar tem os jobs reenfileirados pelo heartbeat vencido.
+
+O progresso (estado + linhas de log) é agrupado em memória e gravado no
+banco por uma única thread a cada PROGRESS_FLUSH_S: uma rajada de callbacks
+do HP-OCR vira uma só transação.
+"""
+
+import os
+import json
+import glob
+import time
+import socket
+import signal
+import shutil
+import logging
+import pathlib
+import zipfile
+import argparse
+import threading
+
+os.environ["OMP_THREAD_LIMIT"] = "1"
+
+import job_queue
+import analytics
+from analytics import log_uso
+from engines.execute_gs import processar_pdf_custom
+from engines.high_performance_ocr import process_pdf_high_performance
+from engines.split_only import split_pdf_only
+from engines.scheduler import get_scheduler
+from engines import result_cache
+from engines.constants import (
+    MAX_DOC_MB,
+    WORKER_POOL_WARM_START,
+    JOB_WORKER_CONCURRENCY,
+    JOB_POLL_INTERVAL_S,
+    JOB_HEARTBEAT_S,
+    PROGRESS_FLUSH_S,
+)
+
+# Publicadores de progresso ativos neste processo (gravados por _flush_loop)
+_publishers: set = set()
+_publishers_lock = threading.Lock()
+
+
+class _JobProgress:
+    """
+    Progresso de um job com gravação agrupada: `changed()` e `log()` só
+    atualizam a memória; `flush()` grava estado e logs pendentes numa única
+    transação (job_queue.save_progress).
+    """
+
+    def __init__(self, job_id: str, worker: str, state: dict):
+        self.job_id = job_id
+        self.worker = worker
+        self.state = state
+        self._lock = threading.Lock()
+        self._state_json: str | None = None
+        self._logs: list[str] = []
+        with _publishers_lock:
+            _publishers.add(self)
+
+    def changed(self) -> None:
+        """Registra o estado atual (serializado aqui, na thread do job)."""
+        snapshot = json.dumps(self.state)
+        with self._lock:
+            self._state_json = snapshot
+
+    def log(self, msg: str) -> None:
+        with self._lock:
+            self._logs.append(job_queue.log_line(msg))
+
+    def flush(self) -> None:
+        with self._lock:
+            state_json, logs = self._state_json, self._logs
+            self._state_json, self._logs = None, []
+        if state_json is None and not logs:
+            return
+        try:
+            job_queue.save_progress(self.job_id, self.worker, state_json, logs)
+        except Exception as e:
+            logging.warning(f"[worker] Falha ao gravar progresso de {self.job_id}: {e}")
+
+    def close(self) -> None:
+        """Grava o que estiver pendente e deixa de ser publicado."""
+        with _publishers_lock:
+            _publishers.discard(self)
+        self.flush()
+
+
+def _mode(values):
+    return max(set(values), key=values.count)
+
+
+def _resolve_hp_level_from_config(config_map):
+    """
+    Resolve nível de compressão para o HP-OCR com base no que veio do front.
+
+    Prioridade:
+      1) DPI direto (20..600), ex.: 150, 70
+      2) Presets 1..5 (compressão padrão do front)
+      3) Fallback 3 (média / 150dpi)
+    """
+    if not config_map:
+        return 3
+
+    values = []
+    for v in config_map.values():
+        try:
+            values.append(int(v))
+        except (TypeError, ValueError):
+            continue
+
+    if not values:
+        return 3
+
+    dpi_values = [v for v in values if 20 <= v <= 600]
+    if dpi_values:
+        return _mode(dpi_values)
+
+    preset_values = [v for v in values if v in (1, 2, 3, 4, 5)]
+    if preset_values:
+        return _mode(preset_values)
+
+    return 3
+
+
+class _BatchZip:
+    """
+    ZIP do lote montado enquanto o lote é processado: cada resultado entra
+    no arquivo assim que fica pronto, sem compressão (ZIP_STORED — os PDFs
+    já saem comprimidos e deflate só gastaria CPU). Ao fim do lote resta
+    apenas gravar o diretório central.
+    """
+
+    def __init__(self, path: str, task_id: str):
+        self.path = path
+        self.task_id = task_id
+        self.count = 0
+        self.done = False
+        self._zip: zipfile.ZipFile | None = None
+
+    def add(self, fpath: str) -> str:
+        """Acrescenta `fpath` ao ZIP (aberto no primeiro uso); devolve o nome no arquivo."""
+        if self._zip is None:
+            self._zip = zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED, allowZip64=True)
+        # Remove task_id prefix from archive name for cleaner output
+        arcname = os.path.basename(fpath)
+        clean = arcname.replace(f"opt_{self.task_id}_", "").replace(f"{self.task_id}_", "")
+        self._zip.write(fpath, clean)
+        self.count += 1
+        return clean
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+        self.done = True
+
+    def discard(self) -> None:
+        """Descarta o ZIP incompleto (job cancelado ou com erro)."""
+        if self.done:
+            return
+        if self._zip is not None:
+            try:
+                self._zip.close()
+            except Exception:
+                pass
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.done = True
+
+
+def run_job(job: dict, worker: str) -> None:
+    """
+    Executa um job reivindicado da fila e registra o resultado nela
+    (job_queue.finish). O estado exibido ao usuário é o mesmo do antigo
+    progress_db em memória.
+    """
+    task_id = job["id"]
+    task = job["state"]
+    payload = job["payload"]
+
+    saved_files = payload["saved_files"]  # [(input_path, original_name, size_mb), ...]
+    content_hashes = payload["content_hashes"]
+    config_map = payload["config_map"]
+    extra_compress_pages = payload["extra_compress_pages"]
+    reuse_text_layer = payload["reuse_text_layer"]
+    cliente_ip = payload["cliente_ip"]
+    usuario = payload["usuario"]
+    total_size_mb = payload["total_size_mb"]
+    upload_folder = payload["upload_folder"]
+
+    task.pop("logs", None)  # estado de versões anteriores (logs agora em job_logs)
+    progress = _JobProgress(task_id, worker, task)
+    batch_zip = _BatchZip(os.path.join(upload_folder, f"lote_{task_id}.zip"), task_id)
+
+    def finish(status, final_path=None):
+        progress.close()
+        job_queue.finish(task_id, worker, status, task, final_path)
+
+    def check_cancelled():
+        return job_queue.should_stop(task_id, worker)
+
+    def mark_cancelled(detail):
+        task["status"] = "Cancelado"
+        task["stage"] = "cancelled"
+        task["stage_label"] = "Cancelado"
+        task["stage_detail"] = detail
+        finish(job_queue.CANCELLED)
+
+    if job["attempts"] > 1:
+        # Retomada após queda de um worker: recomeça o lote do início
+        task["file_statuses"] = ["pending"] * len(saved_files)
+        progress.log(f"Reiniciando processamento (tentativa {job['attempts']}).")
+        progress.changed()
+
+    STAGE_RANGES = {
+        "prepare": (1, 6),
+        "ocr_pages": (6, 70),
+        "page_compress": (70, 78),
+        "merge": (78, 88),
+        "extra_compress": (88, 92),
+        "finalize": (92, 94),
+        "split": (94, 97),
+        "zip": (99, 99.7),
+        "done": (100, 100),
+    }
+
+    def update_stage(stage, label, current=0, total=0, detail="", batch_label=""):
+        c = max(0, int(current or 0))
+        t = max(0, int(total or 0))
+        start, end = STAGE_RANGES.get(stage, (0, 99))
+
+        if stage == "done":
+            stage_percent = 100.0
+        else:
+            ratio = min(1.0, (c / t)) if t > 0 else 0.0
+            stage_percent = start + ((end - start) * ratio)
+            stage_percent = min(stage_percent, 99.9)
+
+        prefix = f"{batch_label} " if batch_label else ""
+        task["stage"] = stage
+        task["stage_label"] = label
+        task["stage_detail"] = detail or ""
+        task["stage_percent"] = round(stage_percent, 2)
+        task["current"] = c
+        task["total"] = t
+        task["status"] = f"{prefix}{label}".strip()
+        progress.changed()
+
+    def add_log(msg):
+        progress.log(msg)
+        progress.changed()
+
+    start_ts = time.time()
+
+    log_uso(
+        acao="início",
+        modulo="processar",
+        ip=cliente_ip,
+        usuario=usuario,
+        descricao="Processamento iniciado",
+        observacao=(
+            f"id_tarefa={task_id};arquivos={len(saved_files)};"
+            f"in_mb={total_size_mb:.2f}"
+        ),
+    )
+
+    try:
+        # OCR agora e obrigatorio para todos os processamentos.
+        is_ocr = True
+        is_dividir = any(int(v) == 6 for v in (config_map or {}).values())
+        hp_level = _resolve_hp_level_from_config(config_map)
+        result_files = []  # [(output_path, original_name), ...]
+        zipped = 0  # quantos de result_files já estão no ZIP do lote
+
+        def zip_ready_results():
+            """Acrescenta ao ZIP os resultados prontos (só quando o lote terá ZIP)."""
+            nonlocal zipped
+            if len(saved_files) == 1 and len(result_files) == 1:
+                return  # arquivo único: baixado direto, sem ZIP
+            for fpath, _ in result_files[zipped:]:
+                clean = batch_zip.add(fpath)
+                add_log(f"ZIP {batch_zip.count}: {clean}")
+            zipped = len(result_files)
+
+        for file_idx, (input_path, original_name, file_size_mb) in enumerate(saved_files, start=1):
+            if check_cancelled():
+                add_log("Processamento cancelado pelo usuário.")
+                mark_cancelled("Cancelado pelo usuário")
+                return
+
+            batch_label = f"[{file_idx}/{len(saved_files)}]" if len(saved_files) > 1 else ""
+            task["file_index"] = file_idx
+            task["current_file"] = original_name
+            task["file_statuses"][file_idx - 1] = "processing"
+            add_log(f"{batch_label} Processando: {original_name} ({file_size_mb:.2f}MB)")
+            update_stage(
+                "prepare",
+                "Preparando OCR",
+                0,
+                1,
+                detail=f"Arquivo atual: {original_name}",
+                batch_label=batch_label,
+            )
+
+            output_filename = f"opt_{task_id}_{original_name}"
+            output_path = os.path.join(upload_folder, output_filename)
+            output_base = os.path.splitext(output_filename)[0]
+
+            # ── Cache de resultados (mesmo conteúdo + mesmos parâmetros) ──
+            # config_map inteiro na chave: o fallback por página
+            # (processar_pdf_custom) usa o nível de cada página, não só a moda
+            cache_key = result_cache.make_key(
+                content_hashes[input_path],
+                hp_level=hp_level,
+                config_map={str(k): str(v) for k, v in (config_map or {}).items()},
+                extra_compress_pages=sorted(set(extra_compress_pages)),
+                dividir=is_dividir,
+                reuse_text_layer=reuse_text_layer,
+            )
+            cached = result_cache.lookup(cache_key)
+            restored = []
+            try:
+                for cached_path, suffix in cached or ():
+                    dest = (
+                        os.path.join(upload_folder, f"{output_base}{suffix}.pdf")
+                        if suffix else output_path
+                    )
+                    result_cache.restore(cached_path, dest)
+                    restored.append((dest, os.path.basename(dest)))
+            except OSError as e:
+                # Entrada removida por outro worker (evicção) entre o lookup e
+                # a restauração: descarta o que já foi restaurado e recalcula
+                logging.warning(f"Falha ao restaurar do cache ({e}); processando de novo.")
+                for dest, _ in restored:
+                    try: os.remove(dest)
+                    except OSError: pass
+                cached = None
+            if cached:
+                result_files.extend(restored)
+                add_log(f"{batch_label} Resultado reaproveitado do cache ({len(cached)} arquivo(s)).")
+                task["file_statuses"][file_idx - 1] = "done"
+                add_log(f"{batch_label} OK ✔")
+                zip_ready_results()
+                continue
+            results_before = len(result_files)
+            # Resultado de fallback (OCR tradicional) não vai para o cache
+            cacheable = True
+
+            if is_ocr:
+                update_stage(
+                    "prepare",
+                    "OCR Alta Performance",
+                    0,
+                    1,
+                    detail="Inicializando motor OCR",
+                    batch_label=batch_label,
+                )
+
+                add_log(f"{batch_label} HP-OCR nível de compressão: {hp_level}")
+
+                last_hp_log = {"stage": None, "tick": 0}
+
+                def hp_callback(progress_payload, total_pages=None, _lbl=batch_label):
+                    if isinstance(progress_payload, dict):
+                        stage = progress_payload.get("stage") or "ocr_pages"
+                        label = progress_payload.get("label") or "OCR"
+                        current_page = int(progress_payload.get("current", 0) or 0)
+                        total_pages_local = int(progress_payload.get("total", 0) or 0)
+                        detail = progress_payload.get("detail", "")
+
+                        if stage == "done":
+                            stage = "finalize"
+                            label = "Pós-processamento OCR"
+                            current_page = 1
+                            total_pages_local = 1
+
+                        update_stage(
+                            stage,
+                            label,
+                            current_page,
+                            total_pages_local,
+                            detail=detail,
+                            batch_label=_lbl,
+                        )
+
+                        last_hp_log["tick"] += 1
+                        if stage != last_hp_log["stage"]:
+                            add_log(f"{_lbl} {label}: {detail or 'etapa iniciada'}")
+                            last_hp_log["stage"] = stage
+                        elif last_hp_log["tick"] % 20 == 0 and detail:
+                            add_log(f"{_lbl} {label}: {detail}")
+                        return
+
+                    current_page = int(progress_payload or 0)
+                    total_pages_local = int(total_pages or 0)
+                    update_stage(
+                        "ocr_pages",
+                        "OCR por página",
+                        current_page,
+                        total_pages_local,
+                        detail=f"{current_page}/{total_pages_local} páginas processadas",
+                        batch_label=_lbl,
+                    )
+                    if total_pages_local and (current_page % 5 == 0 or current_page == total_pages_local):
+                        add_log(f"{_lbl} OCR: {current_page}/{total_pages_local} páginas processadas.")
+
+                ocr_success = False
+                # Páginas com OCR feito neste job (o split não repete o OCR delas)
+                paginas_com_ocr = set()
+                try:
+                    result_path = process_pdf_high_performance(
+                        input_path,
+                        callback=hp_callback,
+                        compression_level=hp_level,
+                        extra_compress_pages=extra_compress_pages,
+                        skip_extra_compression=is_dividir,
+                        reuse_text_layer=reuse_text_layer or None,
+                        ocr_coverage=paginas_com_ocr,
+                    )
+                    if os.path.abspath(result_path) != os.path.abspath(output_path):
+                        shutil.move(result_path, output_path)
+                    add_log(f"{batch_label} HP-OCR concluído com sucesso.")
+                    ocr_success = True
+
+                except Exception as hp_error:
+                    paginas_com_ocr.clear()
+                    cacheable = False
+                    add_log(f"{batch_label} HP-OCR falhou: {hp_error}. Tentando OCR tradicional...")
+                    logging.warning(f"Fallback OCR tradicional: {hp_error}")
+                    try:
+                        update_stage(
+                            "prepare",
+                            "OCR tradicional",
+                            0,
+                            1,
+                            detail="HP-OCR falhou, aplicando fallback",
+                            batch_label=batch_label,
+                        )
+
+                        def callback(processed_count, total_pages, _lbl=batch_label):
+                            update_stage(
+                                "ocr_pages",
+                                "OCR tradicional",
+                                processed_count + 1,
+                                total_pages,
+                                detail=f"{processed_count + 1}/{total_pages} páginas",
+                                batch_label=_lbl,
+                            )
+                            add_log(f"{_lbl} OCR tradicional: {processed_count + 1}/{total_pages} páginas.")
+
+                        processar_pdf_custom(
+                            input_path,
+                            output_path,
+                            config_map,
+                            callback,
+                            check_cancelled,
+                            extra_compress_pages=extra_compress_pages,
+                        )
+                        add_log(f"{batch_label} OCR tradicional concluído.")
+                        ocr_success = True
+                    except Exception as trad_error:
+                        add_log(f"{batch_label} OCR tradicional também falhou: {trad_error}")
+                        raise Exception(f"Falha em ambos motores OCR para {original_name}")
+
+                if not ocr_success or not os.path.exists(output_path):
+                    raise Exception(f"Nenhum motor OCR conseguiu processar {original_name}.")
+
+                # Divisão posterior se necessário
+                out_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+                add_log(f"{batch_label} PDF processado: {out_size_mb:.2f} MB")
+
+                if is_dividir or out_size_mb > MAX_DOC_MB:
+                    if is_dividir:
+                        add_log(f"{batch_label} Aplicando OCR + DIVIDIR (nível 6). Dividindo em volumes...")
+                    else:
+                        add_log(f"{batch_label} Arquivo grande ({out_size_mb:.2f} MB). Dividindo em volumes...")
+                    update_stage(
+                        "split",
+                        "Dividindo volumes",
+                        0,
+                        1,
+                        detail="Calculando cortes por volume",
+                        batch_label=batch_label,
+                    )
+
+                    last_logged_page = 0
+
+                    def on_page(current_page, total_pages, _lbl=batch_label):
+                        update_stage(
+                            "split",
+                            "Dividindo volumes",
+                            current_page,
+                            total_pages,
+                            detail=f"{current_page}/{total_pages} páginas analisadas",
+                            batch_label=_lbl,
+                        )
+                        nonlocal last_logged_page
+                        if current_page - last_logged_page >= 10 or current_page == total_pages:
+                            add_log(f"{_lbl} Dividindo: {current_page}/{total_pages} páginas")
+                            last_logged_page = current_page
+
+                    def on_volume(vol, added, size_mb, _lbl=batch_label):
+                        add_log(f"{_lbl} Volume {vol}: {added} páginas ({size_mb:.2f} MB)")
+
+                    result = split_pdf_only(
+                        pathlib.Path(output_path),
+                        pathlib.Path(upload_folder),
+                        MAX_DOC_MB,
+                        on_page=on_page,
+                        on_volume=on_volume,
+                        check_cancelled=check_cancelled,
+                        paginas_com_ocr=paginas_com_ocr,
+                    )
+
+                    if result.get("cancelled"):
+                        add_log("Divisão cancelada pelo usuário.")
+                        mark_cancelled("Cancelado durante divisão")
+                        return
+
+                    base_name = os.path.splitext(os.path.basename(output_path))[0]
+                    volume_pattern = os.path.join(upload_folder, f"{base_name}_VOL_*.pdf")
+                    dividir_files = sorted(glob.glob(volume_pattern))
+
+                    if dividir_files:
+                        try: os.remove(output_path)
+                        except: pass
+
+                        # Não recomprime volumes aqui: eles já passaram por OCR + compressão antes da divisão.
+                        for vol_idx, vf in enumerate(dividir_files, 1):
+                            if check_cancelled():
+                                mark_cancelled("Cancelado após divisão")
+                                return
+
+                            result_files.append((vf, os.path.basename(vf)))
+
+                        update_stage(
+                            "split",
+                            "Divisão concluída",
+                            len(dividir_files),
+                            len(dividir_files),
+                            detail=f"{len(dividir_files)} volume(s) gerado(s)",
+                            batch_label=batch_label,
+                        )
+                        add_log(f"{batch_label} {len(dividir_files)} volume(s) gerado(s). Compressão de volumes ignorada.")
+                    else:
+                        result_files.append((output_path, output_filename))
+                else:
+                    result_files.append((output_path, output_filename))
+
+            else:
+                # Compressão sem OCR
+                add_log(f"{batch_label} Iniciando compressão...")
+                update_stage(
+                    "prepare",
+                    "Compressão HP",
+                    0,
+                    1,
+                    detail="Inicializando compressão sem OCR",
+                    batch_label=batch_label,
+                )
+
+                def callback(processed_count, total_pages, _lbl=batch_label):
+                    update_stage(
+                        "ocr_pages",
+                        "Compressão por página",
+                        processed_count + 1,
+                        total_pages,
+                        detail=f"{processed_count + 1}/{total_pages} páginas",
+                        batch_label=_lbl,
+                    )
+                    if (processed_count + 1) % 5 == 0 or (processed_count + 1) == total_pages:
+                        add_log(f"{_lbl} Compressão: {processed_count + 1}/{total_pages} páginas.")
+
+                processar_pdf_custom(
+                    input_path,
+                    output_path,
+                    config_map,
+                    callback,
+                    check_cancelled,
+                    extra_compress_pages=extra_compress_pages,
+                )
+                result_files.append((output_path, output_filename))
+
+            if cacheable:
+                result_cache.store(
+                    cache_key,
+                    [
+                        (path, os.path.splitext(os.path.basename(path))[0][len(output_base):])
+                        for path, _ in result_files[results_before:]
+                    ],
+                )
+            task["file_statuses"][file_idx - 1] = "done"
+            add_log(f"{batch_label} OK ✔")
+            zip_ready_results()
+
+        def _safe_size_mb(path):
+            try:
+                return os.path.getsize(path) / (1024 * 1024)
+            except Exception:
+                return 0.0
+
+        # --- Resultado final ---
+        if len(result_files) == 1:
+            final_path = result_files[0][0]
+            task["final_file"] = os.path.basename(final_path)
+        else:
+            total_items = len(result_files)
+            update_stage("zip", "Finalizando ZIP", 0, 1, detail=f"{total_items} itens")
+            batch_zip.close()
+            add_log(f"ZIP concluído: {total_items} arquivo(s).")
+            task["final_file"] = os.path.basename(batch_zip.path)
+            final_path = batch_zip.path
+
+        elapsed = int(time.time() - task["start_time"])
+        add_log(f"Processo concluído com sucesso em {elapsed}s.")
+        update_stage("done", "Concluído", 1, 1, detail=f"Tempo total: {elapsed}s")
+        task["status"] = "Concluído"
+        finish(job_queue.DONE, os.path.abspath(final_path))
+
+        secs = round(time.time() - start_ts, 2)
+        out_mb = round(_safe_size_mb(final_path), 2)
+        ratio_pct = round((out_mb / total_size_mb) * 100, 1) if total_size_mb else 0.0
+        log_uso(
+            acao="concluído",
+            modulo="processar",
+            ip=cliente_ip,
+            usuario=usuario,
+            descricao="Processamento concluído",
+            observacao=(
+                f"id_tarefa={task_id};secs={secs};in_mb={total_size_mb:.2f};"
+                f"out_mb={out_mb:.2f};ratio_pct={ratio_pct}"
+            ),
+            tempo=secs,
+        )
+
+    except Exception as e:
+        elapsed = int(time.time() - task["start_time"])
+        add_log(f"ERRO após {elapsed}s: {str(e)}")
+        task["status"] = "Falha no processamento"
+        task["stage"] = "error"
+        task["stage_label"] = "Falha"
+        task["stage_detail"] = str(e)
+        task["stage_percent"] = min(99.0, float(task.get("stage_percent", 0) or 0))
+        finish(job_queue.ERROR)
+
+    finally:
+        batch_zip.discard()
+
+
+
+def _job_loop(worker: str, stop: threading.Event) -> None:
+    """Thread consumidora: reivindica e executa jobs até `stop`."""
+    while not stop.is_set():
+        try:
+            job = job_queue.claim(worker)
+        except Exception as e:
+            logging.warning(f"[worker] Falha ao consultar a fila: {e}")
+            job = None
+        if job is None:
+            stop.wait(JOB_POLL_INTERVAL_S)
+            continue
+
+        logging.info(f"[worker] Job {job['id']} iniciado (tentativa {job['attempts']})")
+        try:
+            run_job(job, worker)
+        except Exception as e:
+            logging.exception(f"[worker] Job {job['id']} terminou com erro inesperado")
+            state = job["state"]
+            state.update(status="Falha no processamento", stage="error",
+                         stage_label="Falha", stage_detail=str(e))
+            try:
+                job_queue.finish(job["id"], worker, job_queue.ERROR, state)
+            except Exception:
+                pass
+        logging.info(f"[worker] Job {job['id']} finalizado")
+
+
+def _flush_loop(stop: threading.Event) -> None:
+    """Grava o progresso agrupado de todos os jobs deste processo."""
+    while not stop.wait(PROGRESS_FLUSH_S):
+        with _publishers_lock:
+            publishers = list(_publishers)
+        for publisher in publishers:
+            publisher.flush()
+
+
+def _housekeeping(worker: str, stop: threading.Event, parent_pid: int | None) -> None:
+    """Heartbeat dos jobs deste worker, reenfileiramento de jobs órfãos e
+    encerramento junto com o processo pai."""
+    while not stop.wait(JOB_HEARTBEAT_S):
+        if parent_pid and os.getppid() != parent_pid:
+            logging.warning("[worker] Processo pai encerrado. Parando.")
+            stop.set()
+            break
+        try:
+            job_queue.heartbeat(worker)
+            job_queue.requeue_stale()
+        except Exception as e:
+            logging.warning(f"[worker] Falha no heartbeat: {e}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Worker da fila de jobs do PDF Optimizer")
+    parser.add_argument("--parent-pid", type=int, default=None,
+                        help="Encerra quando este processo (app.py) terminar")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY,
+                        help="Jobs simultâneos neste processo")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    job_queue.init_db()
+    job_queue.requeue_stale()
+
+    # Pool de workers quente: sobe (e aquece os modelos do OCR) antes do
+    # primeiro job, em vez de cada requisição pagar a inicialização
+    if WORKER_POOL_WARM_START:
+        get_scheduler().warm_up()
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    for n in range(max(1, args.concurrency)):
+        threading.Thread(
+            target=_job_loop, args=(worker, stop), name=f"job-{n}", daemon=True
+        ).start()
+    threading.Thread(
+        target=_flush_loop, args=(stop,), name="job-progress", daemon=True
+    ).start()
+    threading.Thread(
+        target=_housekeeping, args=(worker, stop, args.parent_pid),
+        name="job-housekeeping", daemon=True,
+    ).start()
+
+    logging.info(f"[worker] {worker} pronto | jobs simultâneos={max(1, args.concurrency)}")
+    while not stop.wait(1.0):
+        pass
+
+    # Jobs em andamento voltam para a fila e são retomados por outro worker
+    # (ou por este, após reiniciar). Sai sem esperar as tarefas do pool.
+    job_queue.release(worker)
+    analytics.flush()  # os._exit não roda os handlers do atexit
+    logging.info(f"[worker] {worker} encerrado")
+    logging.shutdown()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()